@@ -21,6 +21,7 @@ from django.views.generic.base import RedirectView
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from listings.metrics import metrics_view
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -40,6 +41,7 @@ urlpatterns = [
     path('', RedirectView.as_view(pattern_name='schema-swagger-ui', permanent=False)),
     path('api/', include("listings.urls")),
     path('api/auth/', include("users.urls")),
+    path('metrics', metrics_view, name='metrics'),
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
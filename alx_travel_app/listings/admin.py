@@ -1,16 +1,70 @@
-from django.contrib import admin
-from .models import Listing, Booking, Payment
+import io
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .importers import ListingImporter, read_rows
+from .models import ExportJob, Listing, Booking, Payment
+
+
+class ListingImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSON Lines.")
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')])
+    default_host = forms.ModelChoiceField(
+        queryset=get_user_model().objects.filter(role='host'),
+        required=False,
+        help_text="Host for rows without a host_email.",
+    )
+    dry_run = forms.BooleanField(required=False, help_text="Validate only, write nothing.")
+
 
 class ListingAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/listings/listing/change_list.html'
+
     list_display=('name','location', 'pricepernight', 'created_at', 'updated_at')
-    list_filter=('name','location', 'pricepernight', 'created_at', 'updated_at')
-    search_fields=('name','location', 'pricepernight', 'created_at', 'updated_at')
+    list_filter=('created_at', 'updated_at')
+    search_fields=('name','location')
     odering=('name','location', 'pricepernight', 'created_at', 'updated_at')
 
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='listings_listing_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:listings_listing_changelist')
+
+        form = ListingImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            # Decoded as it is read, so large uploads are never held in memory whole
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            importer = ListingImporter(form.cleaned_data['default_host'], dry_run=form.cleaned_data['dry_run'])
+            report = importer.run(read_rows(stream, form.cleaned_data['format']))
+
+            level = messages.WARNING if report.invalid else messages.SUCCESS
+            prefix = "[dry run] " if form.cleaned_data['dry_run'] else ""
+            self.message_user(request, prefix + report.summary(), level)
+            for line_number, message in report.errors[:20]:
+                self.message_user(request, f"line {line_number}: {message}", messages.ERROR)
+            return redirect('admin:listings_listing_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import listings",
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/listings/listing/import.html', context)
+
 class BookingAdmin(admin.ModelAdmin):
     list_display=('property','user', 'start_date', 'total_price', 'status', 'created_at')
-    list_filter=('property','user', 'start_date', 'total_price', 'status', 'created_at')
-    search_fields=('property','user', 'start_date', 'total_price', 'status', 'created_at')
+    list_filter=('status', 'start_date', 'created_at')
+    search_fields=('property__name', 'user__email')
+    # For the property and user columns
+    list_select_related=('property', 'user')
     odering=('property','user', 'start_date', 'total_price', 'status', 'created_at')
 
 class PaymentAdmin(admin.ModelAdmin):
@@ -18,8 +72,18 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at', 'updated_at')
     search_fields = ('tx_ref', 'chapa_transaction_id', 'booking__booking_id', 'booking__user__email')
     readonly_fields = ('payment_id', 'created_at', 'updated_at', 'chapa_transaction_id')
+    # Booking.__str__ needs no related rows
+    list_select_related = ('booking',)
+    ordering = ('-created_at',)
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('export_id', 'requested_by', 'dataset', 'file_format', 'status', 'row_count', 'created_at', 'finished_at')
+    list_filter = ('dataset', 'file_format', 'status')
+    readonly_fields = ('export_id', 'file', 'row_count', 'error', 'created_at', 'started_at', 'finished_at')
+    list_select_related = ('requested_by',)
     ordering = ('-created_at',)
 
 admin.site.register(Listing, ListingAdmin)
 admin.site.register(Booking, BookingAdmin)
-admin.site.register(Payment, PaymentAdmin)
\ No newline at end of file
+admin.site.register(Payment, PaymentAdmin)
+admin.site.register(ExportJob, ExportJobAdmin)
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Per-listing occupancy and revenue summaries (ListingDailyStats and
+ListingMonthlyStats), so host dashboards read a handful of summary rows
+instead of aggregating the booking and payment history on every load.
+
+Writes that change a listing's nights or paid bookings call queue_refresh()
+inside their transaction. That records a refresh_listing_stats task in the
+outbox, which recomputes only the affected listing-months from BookedNight.
+`manage.py rebuild_listing_stats` recomputes everything for backfills.
+Deletes that cascade over many bookings run inside batched_refresh(), so the
+signal handlers queue one set of refreshes instead of one per row.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import ROUND_DOWN, Decimal
+from django.db import transaction
+from django.db.models import Q
+from .models import BookedNight, Listing, ListingDailyStats, ListingMonthlyStats
+
+CENT = Decimal('0.01')
+
+_batch = threading.local()
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def nightly_share(total_price, nights, index):
+    """
+    The part of `total_price` earned on night `index` of `nights`. Shares are
+    rounded down to the cent and the last night takes the remainder, so the
+    shares of a booking always add up to its price.
+    """
+    share = (total_price / nights).quantize(CENT, rounding=ROUND_DOWN)
+    if index == nights - 1:
+        return total_price - share * (nights - 1)
+    return share
+
+
+def queue_refresh(pairs):
+    """
+    Queues a summary refresh for every listing-month touched by `pairs` of
+    (listing_id, night). Call it inside the transaction making the change.
+    """
+    from . import outbox
+    from .tasks import refresh_listing_stats
+
+    batch = getattr(_batch, 'current', None)
+    if batch is not None:
+        batch['pairs'].update(pairs)
+        return
+
+    months = defaultdict(set)
+    for listing_id, night in pairs:
+        months[listing_id].add(month_start(night).isoformat())
+    outbox.enqueue_many(refresh_listing_stats, [
+        (str(listing_id), sorted(listing_months)) for listing_id, listing_months in months.items()
+    ])
+
+
+def queue_refresh_for_bookings(booking_ids):
+    batch = getattr(_batch, 'current', None)
+    if batch is not None:
+        # Bookings released in this batch already queued their nights
+        batch['bookings'].update(set(booking_ids) - batch['released'])
+        return
+    queue_refresh(BookedNight.objects.filter(booking_id__in=booking_ids).values_list('property_id', 'night'))
+
+
+def queue_refresh_for_release(booking):
+    """
+    Queues a refresh for the nights a booking about to be deleted holds,
+    worked out from its dates so no query is needed.
+    """
+    batch = getattr(_batch, 'current', None)
+    if batch is not None:
+        batch['released'].add(booking.pk)
+    if booking.status != 'canceled':
+        queue_refresh([(booking.property_id, night) for night in booking.night_dates()])
+
+
+@contextmanager
+def batched_refresh():
+    """
+    Collects the refreshes queued inside the block and queues them together
+    when it exits. Wrap deletes that cascade over many bookings and payments in
+    it (inside their transaction), otherwise every row costs queries of its own.
+    """
+    if getattr(_batch, 'current', None) is not None:
+        yield
+        return
+
+    batch = _batch.current = {'pairs': set(), 'bookings': set(), 'released': set()}
+    try:
+        yield
+    finally:
+        _batch.current = None
+    pairs = batch['pairs']
+    if batch['bookings']:
+        pairs |= set(
+            BookedNight.objects.filter(booking_id__in=batch['bookings']).values_list('property_id', 'night')
+        )
+    queue_refresh(pairs)
+
+
+def refresh_listing_stats(listing_id, months=None):
+    """
+    Recomputes the daily and monthly rows of one listing for `months` (first
+    days of months), or for its whole history if None. Refreshes of the same
+    listing are serialized on the listing row, and the nights are read after
+    taking that lock, so the last refresh to run always sees the latest state.
+    """
+    with transaction.atomic():
+        if not Listing.objects.select_for_update().filter(pk=listing_id).exists():
+            return 0
+
+        nights = BookedNight.objects.filter(property_id=listing_id)
+        daily_rows = ListingDailyStats.objects.filter(listing_id=listing_id)
+        monthly_rows = ListingMonthlyStats.objects.filter(listing_id=listing_id)
+        if months is not None:
+            months = sorted({month_start(month) for month in months})
+            if not months:
+                return 0
+            nights_in_months, days_in_months = Q(), Q()
+            for month in months:
+                nights_in_months |= Q(night__gte=month, night__lt=next_month(month))
+                days_in_months |= Q(day__gte=month, day__lt=next_month(month))
+            nights = nights.filter(nights_in_months)
+            daily_rows = daily_rows.filter(days_in_months)
+            monthly_rows = monthly_rows.filter(month__in=months)
+
+        daily = []
+        monthly = {}
+        for night, start_date, end_date, total_price, payment_status in nights.values_list(
+            'night', 'booking__start_date', 'booking__end_date', 'booking__total_price', 'booking__payment__status'
+        ):
+            count = max((end_date - start_date).days, 1)
+            share = nightly_share(total_price, count, (night - start_date).days)
+            paid = share if payment_status == 'completed' else Decimal('0')
+            daily.append(ListingDailyStats(
+                listing_id=listing_id, day=night, booked_nights=1, booked_revenue=share, paid_revenue=paid
+            ))
+
+            month = monthly.setdefault(month_start(night), ListingMonthlyStats(
+                listing_id=listing_id, month=month_start(night), booked_nights=0,
+                booked_revenue=Decimal('0'), paid_revenue=Decimal('0'),
+            ))
+            month.booked_nights += 1
+            month.booked_revenue += share
+            month.paid_revenue += paid
+
+        daily_rows.delete()
+        monthly_rows.delete()
+        ListingDailyStats.objects.bulk_create(daily, batch_size=1000)
+        ListingMonthlyStats.objects.bulk_create(monthly.values())
+    return len(daily)
+
+
+def nights_in_period(period, granularity):
+    if granularity == 'day':
+        return 1
+    return (next_month(period) - period).days
+
+
+def default_range(today=None):
+    # The last twelve months, including the current one
+    today = today or date.today()
+    start = month_start(today)
+    for _ in range(11):
+        start = month_start(start - timedelta(days=1))
+    return start, next_month(today) - timedelta(days=1)
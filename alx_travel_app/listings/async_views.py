@@ -0,0 +1,65 @@
+"""
+DRF views whose handlers are coroutines, for endpoints that spend most of
+their time waiting (on Chapa, on the password hasher, on the cache) rather
+than computing. Under ASGI they run on the event loop instead of holding a
+thread each; under WSGI Django runs them with async_to_sync.
+
+Authentication, permissions and throttles stay sync (they may query the
+database) and run in a thread through sync_to_async before the handler, as do
+handlers that are plain methods, so an async viewset can override just its
+read actions.
+"""
+import asyncio
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from rest_framework import views
+
+
+class AsyncDispatchMixin:
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncDispatchMixin, views.APIView):
+    # Django checks every handler for this, and APIView.options is sync
+    view_is_async = True
+
+
+class AsyncViewSetMixin(AsyncDispatchMixin):
+    """
+    Put first in the bases of a viewset to dispatch it asynchronously.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        # ViewSetMixin.as_view builds a plain function; tell Django it returns a coroutine
+        return markcoroutinefunction(super().as_view(actions, **initkwargs))
+
+
+def documented_like(handler):
+    # Async overrides keep the Swagger docs of the sync handler they replace
+    def decorate(async_handler):
+        async_handler._swagger_auto_schema = handler._swagger_auto_schema
+        return async_handler
+    return decorate
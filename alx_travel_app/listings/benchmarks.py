@@ -0,0 +1,410 @@
+"""
+Load benchmarks for the API (`manage.py run_benchmarks`). Each scenario
+drives one endpoint through the full Django stack (middleware, auth,
+serializers, ORM). Chapa is replaced by listings.fake_chapa and SMTP by
+listings.smtp_sink, both with configurable latency. Each scenario reports
+throughput and p50/p95/p99 latency.
+
+Two ways to serve the requests, for comparing capacity at the same
+concurrency:
+- wsgi: the WSGI handler from `concurrency` threads, like a threaded WSGI
+  worker with that many threads.
+- asgi: the ASGI handler on one event loop with `concurrency` requests in
+  flight, like a single ASGI worker. Each request runs its sync code in a
+  thread of its own, as under a real ASGI server. Set ASYNC_VIEWS for the
+  async listing and payment views.
+
+Run it against a seeded, disposable database (`manage.py seed_data`): the
+booking and payment scenarios write rows. Fixed --seed, --requests and
+--concurrency make runs comparable.
+"""
+import asyncio
+import json
+import queue
+import random
+import threading
+import time
+from datetime import date, timedelta
+from asgiref.sync import ThreadSensitiveContext, async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.test import AsyncClient, Client
+from .models import BookedNight, Booking, Listing, Payment
+from .search import tokenize
+from .tasks import send_booking_confirmation_email
+
+User = get_user_model()
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ScenarioResult:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.error_samples = []
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok, detail=None):
+        with self._lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(detail)
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'throughput': round(count / self.seconds, 1) if self.seconds else 0.0,
+            'mean_ms': round(sum(ordered) / count * 1000, 2) if count else 0.0,
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        }
+
+
+class Call:
+    """
+    One HTTP request of a scenario, made with whichever client the server mode uses.
+    """
+
+    def __init__(self, method, path, ok_statuses=(200,), **kwargs):
+        self.method = method
+        self.path = path
+        self.ok_statuses = ok_statuses
+        self.kwargs = kwargs
+
+
+class BenchmarkSuite:
+    """
+    Scenarios are the `scenario_<name>` methods: each takes the worker's
+    random generator and index and returns the Call to time, or does the
+    work itself and returns (ok, detail). An optional `prepare_<name>(count)`
+    creates the data the scenario consumes, outside the timed section.
+    """
+    SERVERS = ('wsgi', 'asgi')
+    # Scenarios that are not requests; they run from threads whatever the server
+    TASK_SCENARIOS = {'booking_email'}
+    SCENARIOS = [
+        'auth_login',
+        'listings_list_anonymous',
+        'listings_list',
+        'listings_price_range',
+        'listings_search',
+        'listings_available',
+        'listing_detail',
+        'bookings_list',
+        'booking_create',
+        'payment_initiate',
+        'payment_verify',
+        'booking_email',
+    ]
+
+    def __init__(self, requests=200, concurrency=4, warmup=10, seed=1, password='password123', stdout=None,
+                 server='wsgi'):
+        self.server = server
+        self.requests = requests
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.seed = seed
+        self.password = password
+        self.stdout = stdout
+        self.today = date.today()
+
+        self.guests = list(
+            User.objects.filter(role='guest', is_active=True, bookings__isnull=False)
+            .distinct().values_list('email', flat=True)[:max(concurrency, 20)]
+        )
+        self.listing_ids = [str(pk) for pk in Listing.objects.values_list('pk', flat=True)[:2000]]
+        if not self.guests or not self.listing_ids:
+            raise ValueError("No seeded data found; run `manage.py seed_data` first.")
+        self.search_terms = sorted({
+            token for name in Listing.objects.values_list('location', flat=True)[:200] for token in tokenize(name)
+        }) or ['house']
+        self.tokens = []
+        self.work = queue.Queue()
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def login(self, email):
+        response = Client().post('/api/auth/login/', {'email': email, 'password': self.password},
+                                 content_type='application/json')
+        if response.status_code != 200:
+            raise ValueError(f"Could not log in as {email}: {response.content[:200]!r}")
+        return response.json()['access']
+
+    def auth(self, worker):
+        return {'Authorization': f"Bearer {self.tokens[worker % len(self.tokens)][1]}"}
+
+    def run(self, names=None):
+        # Logged-in guests shared by the workers; logins are timed separately by auth_login
+        self.tokens = [(email, self.login(email)) for email in self.guests[:self.concurrency]]
+        results = {}
+        for name in names or self.SCENARIOS:
+            self.log(f"{name}...")
+            results[name] = self.run_scenario(name).summary()
+        return results
+
+    def shares(self):
+        return [self.requests // self.concurrency + (1 if i < self.requests % self.concurrency else 0)
+                for i in range(self.concurrency)]
+
+    def run_scenario(self, name):
+        operation = getattr(self, f'scenario_{name}')
+        prepare = getattr(self, f'prepare_{name}', None)
+        if prepare is not None:
+            prepare(self.warmup + self.requests)
+        if self.server == 'asgi' and name not in self.TASK_SCENARIOS:
+            return async_to_sync(self.run_scenario_asgi)(name, operation)
+
+        client = Client()
+        rng = random.Random(self.seed)
+        for _ in range(self.warmup):
+            self.perform(client, operation(rng, 0))
+
+        result = ScenarioResult(name)
+        barrier = threading.Barrier(self.concurrency + 1)
+
+        def worker(index, count):
+            worker_client = Client()
+            worker_rng = random.Random(f"{self.seed}-{name}-{index}")
+            barrier.wait()
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    try:
+                        ok, detail = self.perform(worker_client, operation(worker_rng, index))
+                    except Exception as error:
+                        ok, detail = False, repr(error)
+                    result.record(time.perf_counter() - started, ok, detail)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i, share)) for i, share in enumerate(self.shares())]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        result.seconds = time.perf_counter() - started
+        return result
+
+    async def run_scenario_asgi(self, name, operation):
+        rng = random.Random(self.seed)
+        for _ in range(self.warmup):
+            await self.aperform(AsyncClient(), operation(rng, 0))
+
+        result = ScenarioResult(name)
+
+        async def worker(index, count):
+            worker_client = AsyncClient()
+            worker_rng = random.Random(f"{self.seed}-{name}-{index}")
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    ok, detail = await self.aperform(worker_client, operation(worker_rng, index))
+                except Exception as error:
+                    ok, detail = False, repr(error)
+                result.record(time.perf_counter() - started, ok, detail)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i, share) for i, share in enumerate(self.shares())))
+        result.seconds = time.perf_counter() - started
+        return result
+
+    def perform(self, client, call):
+        if not isinstance(call, Call):
+            return call
+        try:
+            response = getattr(client, call.method)(call.path, **call.kwargs)
+        finally:
+            # The test client skips request_finished's close_old_connections; run it
+            # as the handlers do, so both modes follow CONN_MAX_AGE alike
+            close_old_connections()
+        return self.check(response, *call.ok_statuses)
+
+    async def aperform(self, client, call):
+        if not isinstance(call, Call):
+            return call
+        # What the ASGI handler does per request: a thread of its own for the
+        # request's sync code, with close_old_connections run there at the end
+        async with ThreadSensitiveContext():
+            try:
+                response = await getattr(client, call.method)(call.path, **call.kwargs)
+            finally:
+                await sync_to_async(close_old_connections)()
+        return self.check(response, *call.ok_statuses)
+
+    @staticmethod
+    def check(response, *ok_statuses):
+        ok = response.status_code in (ok_statuses or (200,))
+        return ok, None if ok else f"HTTP {response.status_code}: {response.content[:200]!r}"
+
+    # Auth
+
+    def scenario_auth_login(self, rng, worker):
+        return Call('post', '/api/auth/login/', data={'email': rng.choice(self.guests), 'password': self.password},
+                    content_type='application/json')
+
+    # Listings
+
+    def scenario_listings_list_anonymous(self, rng, worker):
+        return Call('get', '/api/listings/', (200, 304))
+
+    def scenario_listings_list(self, rng, worker):
+        return Call('get', '/api/listings/', headers=self.auth(worker))
+
+    def scenario_listings_price_range(self, rng, worker):
+        low = rng.choice([20, 40, 60, 80, 120])
+        return Call('get', f'/api/listings/?price_min={low}&price_max={low * 2}', headers=self.auth(worker))
+
+    def scenario_listings_search(self, rng, worker):
+        return Call('get', f'/api/listings/?q={rng.choice(self.search_terms)}', headers=self.auth(worker))
+
+    def scenario_listings_available(self, rng, worker):
+        start = self.today + timedelta(days=rng.randint(1, 120))
+        end = start + timedelta(days=rng.randint(1, 7))
+        return Call('get', f'/api/listings/?available_from={start}&available_to={end}', headers=self.auth(worker))
+
+    def scenario_listing_detail(self, rng, worker):
+        return Call('get', f'/api/listings/{rng.choice(self.listing_ids)}/', headers=self.auth(worker))
+
+    # Bookings
+
+    def scenario_bookings_list(self, rng, worker):
+        return Call('get', '/api/bookings/', headers=self.auth(worker))
+
+    def scenario_booking_create(self, rng, worker):
+        # Far enough ahead to miss the seeded timeline; a 400 is a lost race for the dates
+        start = self.today + timedelta(days=rng.randint(200, 900))
+        payload = {
+            'property': rng.choice(self.listing_ids),
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=rng.randint(1, 4))).isoformat(),
+            'total_price': '100.00',
+        }
+        return Call('post', '/api/bookings/', (201, 400), data=payload, content_type='application/json',
+                    headers=self.auth(worker))
+
+    # Payments
+
+    def unpaid_bookings(self, count):
+        """
+        Creates `count` bookings without payments for the logged-in guests,
+        one per night after the last booked night, so they never collide.
+        Returns [(worker index, booking id)].
+        """
+        users = {user.email: user for user in User.objects.filter(email__in=[email for email, _ in self.tokens])}
+        last_night = BookedNight.objects.aggregate(last=Max('night'))['last'] or self.today
+        created = []
+        for i in range(count):
+            worker = i % len(self.tokens)
+            day = last_night + timedelta(days=i + 1)
+            booking = Booking.objects.create(
+                property_id=self.listing_ids[i % len(self.listing_ids)],
+                user=users[self.tokens[worker][0]],
+                start_date=day,
+                end_date=day + timedelta(days=1),
+                total_price=100,
+            )
+            created.append((worker, str(booking.pk)))
+        return created
+
+    def prepare_payment_initiate(self, count):
+        self.work = queue.Queue()
+        for item in self.unpaid_bookings(count):
+            self.work.put(item)
+
+    def scenario_payment_initiate(self, rng, worker):
+        owner, booking_id = self.work.get_nowait()
+        return Call('post', f'/api/payments/{booking_id}/initiate/', headers=self.auth(owner))
+
+    def prepare_payment_verify(self, count):
+        self.work = queue.Queue()
+        payments = [
+            Payment(booking_id=booking_id, amount=100, tx_ref=f"bench-{booking_id}")
+            for _, booking_id in self.unpaid_bookings(count)
+        ]
+        for payment in Payment.objects.bulk_create(payments):
+            self.work.put(payment.tx_ref)
+
+    def scenario_payment_verify(self, rng, worker):
+        return Call('get', f'/api/payments/verify/{self.work.get_nowait()}/')
+
+    # Email
+
+    def prepare_booking_email(self, count):
+        self.work = queue.Queue()
+        bookings = Booking.objects.select_related('user').order_by()[:count]
+        for booking in bookings:
+            self.work.put((booking.user.email, str(booking.pk)))
+
+    def scenario_booking_email(self, rng, worker):
+        try:
+            email, booking_id = self.work.get_nowait()
+        except queue.Empty:
+            return False, "Not enough bookings to email"
+        send_booking_confirmation_email(email, booking_id)
+        return True, None
+
+
+def compare(results, baseline):
+    """
+    Lines describing how each scenario moved against a previous run's JSON.
+    """
+    lines = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if previous[key]:
+                changes.append(f"{key} {(current[key] - previous[key]) / previous[key] * 100:+.1f}%")
+        lines.append(f"{name}: " + ", ".join(changes))
+    return lines
+
+
+def load_baseline(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def benchmark_settings(chapa_url, smtp_host, smtp_port):
+    """
+    Settings overrides pointing the app at the fake Chapa server and SMTP sink.
+    """
+    return {
+        'ALLOWED_HOSTS': ['*'],
+        'CHAPA_BASE_URL': chapa_url,
+        'CHAPA_SECRET_KEY': 'benchmark',
+        'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+        'EMAIL_HOST': smtp_host,
+        'EMAIL_PORT': smtp_port,
+        'EMAIL_USE_TLS': False,
+        'EMAIL_USE_SSL': False,
+        'EMAIL_HOST_USER': '',
+        'EMAIL_HOST_PASSWORD': '',
+        'DEFAULT_FROM_EMAIL': settings.DEFAULT_FROM_EMAIL or 'bookings@example.com',
+        'SLOW_REQUEST_MS': 0,
+        # Every benchmark login comes from one IP; measure hashing, not the throttle
+        'AUTH_THROTTLES': {'auth_ip': (10 ** 9, 10 ** 9), 'login_account': (10 ** 9, 10 ** 9)},
+    }
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from .replicas import read_may_be_stale
+
+LISTINGS_VERSION_KEY = "listings:version"
+
+
+def listing_version_key(pk):
+    return f"listings:version:{pk}"
+
+
+def get_version(key):
+    """
+    Current data version stored under `key`: LISTINGS_VERSION_KEY for all
+    listing and booking data, listing_version_key() for one listing and its
+    bookings.
+
+    Versions are nanosecond timestamps of the last change (or of the moment the
+    key was found missing), so a version lost to eviction is never reused and
+    the version doubles as a conservative last-modified time.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def get_listings_version():
+    """
+    Version of all listing and booking data. Every cached listing response is
+    keyed on it, so bumping the version invalidates all of them at once.
+    """
+    return get_version(LISTINGS_VERSION_KEY)
+
+
+async def aget_listings_version():
+    return await aget_version(LISTINGS_VERSION_KEY)
+
+
+def bump_listings_version(*listing_ids):
+    """
+    Moves the version of all listing data and of each listing in `listing_ids`.
+    """
+    now = time.time_ns()
+    cache.set_many({LISTINGS_VERSION_KEY: now, **{listing_version_key(pk): now for pk in listing_ids}}, None)
+
+
+def version_modified(version):
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc)
+
+
+def get_listings_modified():
+    return version_modified(get_listings_version())
+
+
+async def aget_listings_modified():
+    return version_modified(await aget_listings_version())
+
+
+def request_digest(request):
+    # Sort parameters so equivalent query strings share one entry. The host is part
+    # of the key because pagination links in the body are absolute URLs.
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return hashlib.md5(f"{request.get_host()}{request.path}?{query}".encode()).hexdigest()
+
+
+def response_cache_key(request, version):
+    return f"listings:response:{version}:{request_digest(request)}"
+
+
+def latest_response_key(request):
+    # The last response cached for the request under any version
+    return f"listings:response:latest:{request_digest(request)}"
+
+
+@contextmanager
+def single_flight(key):
+    """
+    Yields True to exactly one caller at a time for `key` (the one that should
+    rebuild the value) and False to everyone else.
+    """
+    lock_key = f"{key}:lock"
+    leader = cache.add(lock_key, 1, settings.LISTING_CACHE_LOCK_TIMEOUT)
+    try:
+        yield leader
+    finally:
+        if leader:
+            cache.delete(lock_key)
+
+
+@asynccontextmanager
+async def asingle_flight(key):
+    lock_key = f"{key}:lock"
+    leader = await cache.aadd(lock_key, 1, settings.LISTING_CACHE_LOCK_TIMEOUT)
+    try:
+        yield leader
+    finally:
+        if leader:
+            await cache.adelete(lock_key)
+
+
+def wait_for(key):
+    """
+    Polls for the leader's result for up to LISTING_CACHE_LOCK_TIMEOUT seconds;
+    None if it does not arrive.
+    """
+    deadline = time.monotonic() + settings.LISTING_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+async def await_value(key):
+    # wait_for without blocking the event loop
+    deadline = time.monotonic() + settings.LISTING_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+    return None
+
+
+class CachedReadMixin:
+    """
+    Serves anonymous reads from the versioned response cache. Wrap a read
+    handler with `self.cached_read(super().list, request, ...)`.
+
+    One request at a time rebuilds a missing entry. The others answer from the
+    last copy cached for the same request, marked `X-Cache: STALE`, rather
+    than hold a worker while the rebuild runs. When there is no copy (a cold
+    key, after a deploy or a cache flush) they wait for the rebuild, and only
+    build the response themselves if it takes longer than
+    LISTING_CACHE_LOCK_TIMEOUT.
+    """
+
+    def cached_read(self, handler, request, *args, **kwargs):
+        if request.user and request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        version = get_listings_version()
+        key = response_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            return self.cache_hit(data)
+
+        with single_flight(key) as leader:
+            if not leader:
+                data = cache.get(latest_response_key(request))
+                if data is not None:
+                    return self.cache_hit(data, stale=True)
+                data = wait_for(key)
+                if data is not None:
+                    return self.cache_hit(data)
+
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200 and not read_may_be_stale(version):
+                cache.set_many(
+                    {key: response.data, latest_response_key(request): response.data}, settings.LISTING_CACHE_TIMEOUT
+                )
+            response["X-Cache"] = "MISS"
+            return response
+
+    async def acached_read(self, handler, request, *args, **kwargs):
+        """
+        cached_read for an async handler, using the async cache API.
+        """
+        if request.user and request.user.is_authenticated:
+            return await handler(request, *args, **kwargs)
+
+        version = await aget_listings_version()
+        key = response_cache_key(request, version)
+        data = await cache.aget(key)
+        if data is not None:
+            return self.cache_hit(data)
+
+        async with asingle_flight(key) as leader:
+            if not leader:
+                data = await cache.aget(latest_response_key(request))
+                if data is not None:
+                    return self.cache_hit(data, stale=True)
+                data = await await_value(key)
+                if data is not None:
+                    return self.cache_hit(data)
+
+            response = await handler(request, *args, **kwargs)
+            if response.status_code == 200 and not read_may_be_stale(version):
+                await cache.aset_many(
+                    {key: response.data, latest_response_key(request): response.data}, settings.LISTING_CACHE_TIMEOUT
+                )
+            response["X-Cache"] = "MISS"
+            return response
+
+    def cache_hit(self, data, stale=False):
+        response = Response(data)
+        response["X-Cache"] = "STALE" if stale else "HIT"
+        return response
@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import hmac
+import threading
+import time
+import httpx
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Gateway errors worth retrying an idempotent call for
+RETRY_STATUSES = (502, 503, 504)
+
+
+class ChapaError(Exception):
+    """
+    Chapa answered, but not with something we can use (e.g. a non-JSON body).
+    """
+
+
+class ChapaUnavailable(ChapaError):
+    """
+    Chapa could not be reached in time, is failing, or we are already waiting on
+    as many Chapa calls as we allow. Callers should fail fast and let the user retry.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds. After that a single trial call is let through:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_call(self):
+        """
+        Raises ChapaUnavailable while open. Returns True if the caller is the trial call.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                raise ChapaUnavailable("Payment gateway is temporarily unavailable.")
+            self.trial_in_flight = True
+            return True
+
+    def cancel_trial(self):
+        # The trial call never reached Chapa; let the next caller try instead
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ChapaClient:
+    """
+    Chapa API client for use from request handlers and workers.
+
+    - One keep-alive connection pool per process (requests.Session)
+    - Connect/read timeouts on every call
+    - A bulkhead capping concurrent calls, so a slow Chapa cannot tie up every worker thread
+    - Retries with exponential backoff for idempotent calls (verify) only
+    - A circuit breaker that fails fast while Chapa is down
+    """
+
+    def __init__(self, base_url, secret_key, connect_timeout=3.05, read_timeout=10, pool_size=10,
+                 max_concurrency=10, bulkhead_timeout=0.5, retries=2, backoff_factor=0.3,
+                 failure_threshold=5, reset_timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.secret_key = secret_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.bulkhead_timeout = bulkhead_timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._bulkhead = threading.BoundedSemaphore(max_concurrency)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=pool_size, max_retries=retry))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=pool_size, max_retries=retry))
+        self.session.headers.update({"Authorization": f"Bearer {secret_key}"})
+
+    def initialize(self, payload):
+        """
+        Starts a transaction. Returns (status_code, data). Never retried, since
+        Chapa may have accepted a request whose response we did not receive.
+        """
+        return self._request("POST", "/v1/transaction/initialize", json=payload)
+
+    def verify(self, tx_ref):
+        """
+        Looks up a transaction. Returns (status_code, data).
+        """
+        return self._request("GET", f"/v1/transaction/verify/{tx_ref}")
+
+    def _request(self, method, path, **kwargs):
+        is_trial = self.breaker.before_call()
+
+        if not self._bulkhead.acquire(timeout=self.bulkhead_timeout):
+            # Not a Chapa failure, so the breaker is left alone
+            if is_trial:
+                self.breaker.cancel_trial()
+            raise ChapaUnavailable("Too many payment requests in progress, please retry.")
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as error:
+            self.breaker.record_failure()
+            raise ChapaUnavailable(f"Payment gateway request failed: {error}") from error
+        finally:
+            self._bulkhead.release()
+
+        return read_response(self.breaker, response)
+
+
+class AsyncChapaClient:
+    """
+    ChapaClient for async views, on httpx.AsyncClient. A waiting call holds no
+    thread, so one ASGI worker can have up to `max_concurrency` Chapa calls in
+    flight. Same timeouts, retries (verify only) and bulkhead as ChapaClient;
+    the circuit breaker is passed in so both clients of a process share it.
+
+    httpx connections belong to the event loop that opened them: use
+    get_async_chapa_client(), which keeps one client per loop and closes it
+    with the loop.
+    """
+
+    def __init__(self, base_url, secret_key, breaker, connect_timeout=3.05, read_timeout=10, max_concurrency=100,
+                 bulkhead_timeout=0.5, retries=2, backoff_factor=0.3):
+        self.breaker = breaker
+        self.bulkhead_timeout = bulkhead_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._bulkhead = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {secret_key}"},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def initialize(self, payload):
+        """
+        Starts a transaction. Returns (status_code, data). Never retried.
+        """
+        return await self._request("POST", "/v1/transaction/initialize", json=payload)
+
+    async def verify(self, tx_ref):
+        """
+        Looks up a transaction. Returns (status_code, data).
+        """
+        return await self._request("GET", f"/v1/transaction/verify/{tx_ref}", retries=self.retries)
+
+    async def _request(self, method, path, retries=0, **kwargs):
+        is_trial = self.breaker.before_call()
+
+        try:
+            await asyncio.wait_for(self._bulkhead.acquire(), self.bulkhead_timeout)
+        except asyncio.TimeoutError:
+            if is_trial:
+                self.breaker.cancel_trial()
+            raise ChapaUnavailable("Too many payment requests in progress, please retry.")
+        try:
+            response = await self._send(method, path, retries, **kwargs)
+        except httpx.HTTPError as error:
+            self.breaker.record_failure()
+            raise ChapaUnavailable(f"Payment gateway request failed: {error}") from error
+        finally:
+            self._bulkhead.release()
+
+        return read_response(self.breaker, response)
+
+    async def _send(self, method, path, retries, **kwargs):
+        # Retries transport errors and RETRY_STATUSES with exponential backoff, like urllib3's Retry
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if attempt == retries:
+                    raise
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+
+
+def read_response(breaker, response):
+    """
+    (status_code, data) from a requests or httpx response, recording the
+    outcome on the circuit breaker.
+    """
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise ChapaUnavailable(f"Payment gateway returned HTTP {response.status_code}.")
+    breaker.record_success()
+
+    try:
+        return response.status_code, response.json()
+    except ValueError as error:
+        raise ChapaError("Payment gateway returned an invalid response.") from error
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = {}
+
+
+def get_chapa_client():
+    """
+    The process-wide client, built from the CHAPA_* settings on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ChapaClient(
+                    base_url=settings.CHAPA_BASE_URL,
+                    secret_key=settings.CHAPA_SECRET_KEY,
+                    connect_timeout=settings.CHAPA_CONNECT_TIMEOUT,
+                    read_timeout=settings.CHAPA_READ_TIMEOUT,
+                    pool_size=settings.CHAPA_POOL_SIZE,
+                    max_concurrency=settings.CHAPA_MAX_CONCURRENCY,
+                    retries=settings.CHAPA_RETRIES,
+                    failure_threshold=settings.CHAPA_BREAKER_THRESHOLD,
+                    reset_timeout=settings.CHAPA_BREAKER_RESET_TIMEOUT,
+                )
+    return _client
+
+
+def get_async_chapa_client():
+    """
+    The async client for the running event loop, built from the CHAPA_*
+    settings on first use.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        # async_to_sync (WSGI, tests) runs each call on a new loop; forget the finished ones
+        for finished in [other for other in list(_async_clients) if other.is_closed()]:
+            _async_clients.pop(finished, None)
+        client = AsyncChapaClient(
+            base_url=settings.CHAPA_BASE_URL,
+            secret_key=settings.CHAPA_SECRET_KEY,
+            breaker=get_chapa_client().breaker,
+            connect_timeout=settings.CHAPA_CONNECT_TIMEOUT,
+            read_timeout=settings.CHAPA_READ_TIMEOUT,
+            max_concurrency=settings.CHAPA_ASYNC_MAX_CONCURRENCY,
+            retries=settings.CHAPA_RETRIES,
+        )
+        entry = _async_clients[loop] = (client, loop.create_task(close_on_shutdown(client)))
+    return entry[0]
+
+
+async def close_on_shutdown(client):
+    # Waits until cancelled: asyncio.run(), async_to_sync and ASGI servers cancel
+    # the tasks left on a loop before closing it, while it can still run aclose()
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+@receiver(setting_changed)
+def reset_chapa_client(setting, **kwargs):
+    global _client
+    if setting.startswith("CHAPA_"):
+        _client = None
+        for loop, (_, closer) in list(_async_clients.items()):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(closer.cancel)
+        _async_clients.clear()
+
+
+def webhook_dedup_key(tx_ref):
+    return f"chapa:webhook:{tx_ref}"
+
+
+def release_webhook(tx_ref):
+    """
+    Lets the next notification for `tx_ref` queue a verification again. Call
+    when a verification ends without settling the payment.
+    """
+    cache.delete(webhook_dedup_key(tx_ref))
+
+
+def webhook_signature_is_valid(request):
+    """
+    Chapa signs webhook bodies with HMAC-SHA256 keyed by the webhook secret and
+    sends the hex digest in `x-chapa-signature` (or `Chapa-Signature`).
+    """
+    secret = settings.CHAPA_WEBHOOK_SECRET
+    signature = request.headers.get("x-chapa-signature") or request.headers.get("chapa-signature")
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
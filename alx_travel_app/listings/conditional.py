@@ -0,0 +1,105 @@
+import hashlib
+import json
+from datetime import date, datetime, time
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.utils.encoders import JSONEncoder
+from .cache import aget_version, get_version, version_modified
+from .replicas import read_may_be_stale
+
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong ETags to list/retrieve responses and answers If-None-Match
+    (and If-Modified-Since, where there is a Last-Modified) with 304.
+
+    A view whose response depends on one object can name the cache key of
+    that object's data version (listings.cache) in get_version_key(). Its
+    validators then come from that version, so revalidating costs one cache
+    read and no query, and only changes to that object give a new ETag. Such
+    responses also depend on the date (next and upcoming bookings), so the
+    ETag covers today's date and Last-Modified is never before midnight.
+
+    Every other response (lists, bookings) gets an ETag hashed from its data
+    after it is built. A list's rows can change with any listing or booking,
+    so no single version scopes it without a query; hashing the data lets
+    clients keep their copy until the rows they were sent actually change,
+    and costs no query when the response comes from the response cache.
+    """
+
+    def get_version_key(self, request, **kwargs):
+        return None
+
+    def conditional_read(self, handler, request, *args, **kwargs):
+        version_key = self.get_version_key(request, **kwargs)
+        if version_key is None:
+            return self.validate_content(request, handler(request, *args, **kwargs))
+
+        version = get_version(version_key)
+        etag, last_modified, not_modified = self.evaluate_conditions(request, version)
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        if read_may_be_stale(version) or response.get('X-Cache') == 'STALE':
+            # Rows that may predate this version must not be revalidated under it
+            return response
+        return self.add_validators(response, etag, last_modified)
+
+    async def aconditional_read(self, handler, request, *args, **kwargs):
+        """
+        conditional_read for an async handler, using the async cache API.
+        """
+        version_key = self.get_version_key(request, **kwargs)
+        if version_key is None:
+            return self.validate_content(request, await handler(request, *args, **kwargs))
+
+        version = await aget_version(version_key)
+        etag, last_modified, not_modified = self.evaluate_conditions(request, version)
+        if not_modified is not None:
+            return not_modified
+        response = await handler(request, *args, **kwargs)
+        if read_may_be_stale(version) or response.get('X-Cache') == 'STALE':
+            return response
+        return self.add_validators(response, etag, last_modified)
+
+    def evaluate_conditions(self, request, version):
+        """
+        (etag, last_modified, a 304 response or None).
+        """
+        today = date.today()
+        # date.today() is local time, so midnight is too
+        midnight = datetime.combine(today, time.min).astimezone()
+        last_modified = max(version_modified(version), midnight)
+        etag = self.make_etag(request, version, today)
+        not_modified = None
+        if any(header in request.META for header in CONDITIONAL_HEADERS):
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=int(last_modified.timestamp())
+            )
+        return etag, last_modified, not_modified
+
+    def validate_content(self, request, response):
+        if response.status_code != 200:
+            return response
+        digest = hashlib.sha1(json.dumps(response.data, cls=JSONEncoder).encode()).hexdigest()
+        etag = self.make_etag(request, digest)
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+        response['ETag'] = etag
+        return response
+
+    @staticmethod
+    def add_validators(response, etag, last_modified):
+        if response.status_code == 200:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def make_etag(self, request, *validators):
+        query = sorted(request.query_params.lists())
+        parts = [request.user.pk, request.path, query, request.META.get('HTTP_ACCEPT'), *validators]
+        return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
@@ -0,0 +1,138 @@
+import logging
+import smtplib
+import threading
+import time
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+
+class EmailTemplate:
+    """
+    A subject plus plain-text and HTML bodies. The templates are compiled on
+    first use and reused for every message after that.
+    """
+
+    def __init__(self, subject, name):
+        self.subject = subject
+        self.name = name
+        self._text = None
+        self._html = None
+
+    def render(self, to, context):
+        if self._text is None:
+            self._text = get_template(f"listings/emails/{self.name}.txt")
+            self._html = get_template(f"listings/emails/{self.name}.html")
+        message = EmailMultiAlternatives(
+            self.subject, self._text.render(context), settings.DEFAULT_FROM_EMAIL, [to]
+        )
+        message.attach_alternative(self._html.render(context), "text/html")
+        return message
+
+
+PAYMENT_CONFIRMATION = EmailTemplate("Payment Confirmation", "payment_confirmation")
+BOOKING_CONFIRMATION = EmailTemplate("Booking Confirmation", "booking_confirmation")
+
+
+def payment_confirmation(payment, to=None):
+    # Expects payment.booking.user to be select_related
+    user = payment.booking.user
+    return PAYMENT_CONFIRMATION.render(to or user.email, {"payment": payment, "user": user})
+
+
+def booking_confirmation(to, booking_id):
+    return BOOKING_CONFIRMATION.render(to, {"booking_id": booking_id})
+
+
+class Mailer:
+    """
+    Sends messages over one SMTP connection per process, reused across calls
+    (and across Celery tasks) instead of a new connection and TLS handshake per
+    message. Messages go out in batches of EMAIL_BATCH_SIZE; a connection idle
+    for longer than EMAIL_CONNECTION_MAX_IDLE is replaced, since servers drop
+    idle clients.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        sent = 0
+        batch_size = settings.EMAIL_BATCH_SIZE
+        with self._lock:
+            for start in range(0, len(messages), batch_size):
+                sent += self._send_batch(messages[start:start + batch_size])
+        return sent
+
+    def _send_batch(self, batch):
+        try:
+            sent = self._connection().send_messages(batch)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped the kept-alive connection; reconnect once
+            logger.info("SMTP connection lost, reconnecting")
+            self.close()
+            sent = self._connection().send_messages(batch)
+        self.last_used = time.monotonic()
+        return sent or 0
+
+    def _connection(self):
+        if self.connection is not None and time.monotonic() - self.last_used > settings.EMAIL_CONNECTION_MAX_IDLE:
+            self.close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+mailer = Mailer()
+
+
+class EmailBuffer:
+    """
+    Collects messages and hands them to the mailer in batches; whatever is
+    left is sent when the block exits.
+
+        with EmailBuffer() as buffer:
+            for payment in payments:
+                buffer.add(payment_confirmation(payment))
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.messages = []
+        self.sent = 0
+
+    def add(self, message):
+        self.messages.append(message)
+        if len(self.messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.messages:
+            messages, self.messages = self.messages, []
+            self.sent += mailer.send(messages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+@worker_process_shutdown.connect
+def close_mailer_connection(**kwargs):
+    mailer.close()
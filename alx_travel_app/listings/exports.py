@@ -0,0 +1,169 @@
+import csv
+import json
+import logging
+import os
+from operator import attrgetter
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+from .models import Booking, ExportJob, Payment
+from .permissions import is_finance
+from .replicas import replica_alias
+
+logger = logging.getLogger(__name__)
+
+# (column, attribute path) per dataset, in output order
+COLUMNS = {
+    'bookings': [
+        ('booking_id', 'booking_id'),
+        ('listing_id', 'property.property_id'),
+        ('listing_name', 'property.name'),
+        ('host_email', 'property.host.email'),
+        ('guest_email', 'user.email'),
+        ('start_date', 'start_date'),
+        ('end_date', 'end_date'),
+        ('total_price', 'total_price'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ],
+    'payments': [
+        ('payment_id', 'payment_id'),
+        ('booking_id', 'booking.booking_id'),
+        ('listing_id', 'booking.property.property_id'),
+        ('listing_name', 'booking.property.name'),
+        ('guest_email', 'booking.user.email'),
+        ('amount', 'amount'),
+        ('tx_ref', 'tx_ref'),
+        ('chapa_transaction_id', 'chapa_transaction_id'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ],
+}
+
+
+def export_queryset(job):
+    """
+    The rows a job may export: everything for staff (finance), otherwise only
+    bookings and payments on listings the requester hosts. Related rows are
+    joined in and only the exported columns are loaded.
+    """
+    if job.dataset == 'bookings':
+        queryset = Booking.objects.select_related('property__host', 'user').only(
+            'booking_id', 'start_date', 'end_date', 'total_price', 'status', 'created_at', 'updated_at',
+            'property__property_id', 'property__name', 'property__host__email', 'user__email',
+        )
+        host_filter = 'property__host'
+    else:
+        queryset = Payment.objects.select_related('booking__property', 'booking__user').only(
+            'payment_id', 'amount', 'tx_ref', 'chapa_transaction_id', 'status', 'created_at', 'updated_at',
+            'booking__booking_id', 'booking__property__property_id', 'booking__property__name',
+            'booking__user__email',
+        )
+        host_filter = 'booking__property__host'
+
+    if not is_finance(job.requested_by):
+        queryset = queryset.filter(**{host_filter: job.requested_by})
+    # The scan runs on a replica even for a pinned requester: requesting the export is
+    # itself a write, and a queued job's rows are a snapshot from whenever it runs anyway
+    return queryset.using(replica_alias())
+
+
+def stream_rows(queryset, chunk_size):
+    """
+    Yields every row of `queryset` while holding at most one chunk in memory.
+    Where the driver streams results (server-side cursors on PostgreSQL,
+    SQLite's lazy fetch) this is a plain `.iterator(chunk_size=...)`. MySQL
+    client libraries buffer the whole result set regardless, so there the
+    rows are read in primary-key keyset batches instead.
+    """
+    pk = queryset.model._meta.pk.name
+    queryset = queryset.order_by(pk)
+    if connections[queryset.db].vendor != 'mysql':
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(**{f'{pk}__gt': last_pk})
+        rows = list(batch[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = getattr(rows[-1], pk)
+
+
+def export_path(job):
+    return f"exports/{job.export_id}.{job.file_format}"
+
+
+def write_rows(job, stream, rows):
+    """
+    Writes rows as CSV (with a header) or NDJSON, one object per line, and
+    returns how many were written. The job's row_count is updated as it goes
+    so clients polling the job can show progress.
+    """
+    names = [name for name, _ in COLUMNS[job.dataset]]
+    getters = [attrgetter(path) for _, path in COLUMNS[job.dataset]]
+
+    if job.file_format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(names)
+
+        def write(values):
+            writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    else:
+        def write(values):
+            stream.write(json.dumps(dict(zip(names, values)), cls=DjangoJSONEncoder) + "\n")
+
+    progress_every = settings.EXPORT_CHUNK_SIZE * 10
+    count = 0
+    for row in rows:
+        write([getter(row) for getter in getters])
+        count += 1
+        if count % progress_every == 0:
+            ExportJob.objects.filter(pk=job.pk).update(row_count=count)
+    return count
+
+
+def run_export(export_id):
+    """
+    Writes one export job's file. Rows are streamed from the database into a
+    temporary file that is renamed into place when complete, so a download
+    never sees a partial file. Returns the job.
+    """
+    job = ExportJob.objects.select_related('requested_by').get(pk=export_id)
+    if job.status == 'completed':
+        return job
+
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    name = export_path(job)
+    path = Path(settings.MEDIA_ROOT) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.part')
+
+    try:
+        rows = stream_rows(export_queryset(job), settings.EXPORT_CHUNK_SIZE)
+        with open(partial, 'w', newline='', encoding='utf-8') as stream:
+            job.row_count = write_rows(job, stream, rows)
+        os.replace(partial, path)
+    except Exception as error:
+        logger.exception("Export %s failed", job.pk)
+        partial.unlink(missing_ok=True)
+        job.status = 'failed'
+        job.error = str(error)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+
+    job.file.name = name
+    job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'row_count', 'finished_at'])
+    return job
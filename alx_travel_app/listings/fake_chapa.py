@@ -0,0 +1,127 @@
+"""
+A local stand-in for the Chapa API, for tests and benchmarks. Implements
+transaction initialize and verify with configurable latency and failure rate.
+
+    with FakeChapaServer(latency=0.2) as chapa:
+        with override_settings(CHAPA_BASE_URL=chapa.url):
+            ...
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VERIFY_PATH = re.compile(r"^/v1/transaction/verify/(?P<tx_ref>[^/]+)/?$")
+
+
+class FakeChapaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.rstrip("/") != "/v1/transaction/initialize":
+            return self.respond(404, {"status": "failed", "message": "Not found"})
+        if self.server.should_fail():
+            return self.respond(503, {"status": "failed", "message": "Service unavailable"})
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return self.respond(400, {"status": "failed", "message": "Invalid JSON"})
+        tx_ref = payload.get("tx_ref")
+        if not tx_ref or not payload.get("amount"):
+            return self.respond(400, {"status": "failed", "message": "tx_ref and amount are required"})
+
+        self.server.transactions[tx_ref] = payload
+        self.respond(200, {
+            "status": "success",
+            "message": "Hosted Link",
+            "data": {"checkout_url": f"{self.server.url}/checkout/{tx_ref}"},
+        })
+
+    def do_GET(self):
+        match = VERIFY_PATH.match(self.path)
+        if not match:
+            return self.respond(404, {"status": "failed", "message": "Not found"})
+        if self.server.should_fail():
+            return self.respond(503, {"status": "failed", "message": "Service unavailable"})
+
+        tx_ref = match.group("tx_ref")
+        transaction = self.server.transactions.get(tx_ref)
+        if transaction is None and not self.server.verify_unknown:
+            return self.respond(404, {"status": "failed", "message": "Invalid transaction or Transaction not found"})
+
+        self.respond(200, {
+            "status": "success",
+            "message": "Payment details",
+            "data": {
+                "status": self.server.payment_status,
+                "tx_ref": tx_ref,
+                "reference": f"fake-{tx_ref}",
+                "amount": (transaction or {}).get("amount"),
+            },
+        })
+
+    def respond(self, status_code, data):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = json.dumps(data).encode()
+        # Counted before the client can see the response, so it can rely on the count
+        with self.server.lock:
+            self.server.requests_served += 1
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeChapaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for every connection an async client opens at once; past the listen
+    # backlog, connects stall for a SYN retransmit
+    request_queue_size = 256
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0, failure_rate=0, payment_status="success",
+                 verify_unknown=True, verbose=False):
+        super().__init__((host, port), FakeChapaHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # What verify reports for every transaction: "success" or "failed"
+        self.payment_status = payment_status
+        # Verify tx_refs that were never initialized here (e.g. rows from the seeder)
+        self.verify_unknown = verify_unknown
+        self.verbose = verbose
+        self.transactions = {}
+        self.requests_served = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def should_fail(self):
+        return self.failure_rate and random.random() < self.failure_rate
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,118 @@
+from django import forms
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+from .models import Booking, Listing
+
+
+def check_ranges(cleaned_data, ranges):
+    for low, high in ranges:
+        if cleaned_data.get(low) is not None and cleaned_data.get(high) is not None \
+                and cleaned_data[high] < cleaned_data[low]:
+            raise forms.ValidationError(f"{high} cannot be less than {low}!")
+
+
+class ListingFilterForm(forms.Form):
+    def clean(self):
+        cleaned_data = super().clean()
+        available_from = cleaned_data.get("available_from")
+        available_to = cleaned_data.get("available_to")
+
+        if bool(available_from) != bool(available_to):
+            raise forms.ValidationError("available_from and available_to must be given together!")
+
+        if available_from and available_to <= available_from:
+            raise forms.ValidationError("available_to must be after available_from!")
+
+        check_ranges(cleaned_data, [("price_min", "price_max"), ("created_after", "created_before")])
+        return cleaned_data
+
+
+class BookingFilterForm(forms.Form):
+    def clean(self):
+        cleaned_data = super().clean()
+        check_ranges(cleaned_data, [
+            ("price_min", "price_max"),
+            ("start_date_after", "start_date_before"),
+            ("end_date_after", "end_date_before"),
+            ("created_after", "created_before"),
+        ])
+        return cleaned_data
+
+
+# Range filters compare the column itself (price >= x, created_at < y), so the
+# database can answer them from an index; nothing is cast to text.
+
+class ListingFilter(filters.FilterSet):
+    # Check-in and check-out dates of the stay; filtered together in filter_queryset
+    available_from = filters.DateFilter(method="filter_availability")
+    available_to = filters.DateFilter(method="filter_availability")
+    price_min = filters.NumberFilter(field_name="pricepernight", lookup_expr="gte")
+    price_max = filters.NumberFilter(field_name="pricepernight", lookup_expr="lte")
+    created_after = filters.DateTimeFilter(field_name="created_at", lookup_expr="gte")
+    created_before = filters.DateTimeFilter(field_name="created_at", lookup_expr="lt")
+
+    class Meta:
+        model = Listing
+        form = ListingFilterForm
+        fields = ["name", "description", "location", "pricepernight", "created_at"]
+
+    def filter_availability(self, queryset, name, value):
+        # Needs both dates, so the work happens once in filter_queryset
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        available_from = self.form.cleaned_data.get("available_from")
+        available_to = self.form.cleaned_data.get("available_to")
+        if available_from and available_to:
+            queryset = queryset.available_between(available_from, available_to)
+        return queryset
+
+
+class BookingFilter(filters.FilterSet):
+    # Repeat the parameter for a set of statuses: ?status=pending&status=confirmed
+    # distinct=False: the OR of equalities can never repeat a row, and DISTINCT would wrap the page query
+    status = filters.MultipleChoiceFilter(choices=Booking.STATUS_CHOICES, distinct=False)
+    price_min = filters.NumberFilter(field_name="total_price", lookup_expr="gte")
+    price_max = filters.NumberFilter(field_name="total_price", lookup_expr="lte")
+    start_date_after = filters.DateFilter(field_name="start_date", lookup_expr="gte")
+    start_date_before = filters.DateFilter(field_name="start_date", lookup_expr="lte")
+    end_date_after = filters.DateFilter(field_name="end_date", lookup_expr="gte")
+    end_date_before = filters.DateFilter(field_name="end_date", lookup_expr="lte")
+    created_after = filters.DateTimeFilter(field_name="created_at", lookup_expr="gte")
+    created_before = filters.DateTimeFilter(field_name="created_at", lookup_expr="lt")
+
+    class Meta:
+        model = Booking
+        form = BookingFilterForm
+        fields = ["property", "start_date", "end_date", "total_price", "created_at"]
+
+
+class ListingSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over the listing token index via `?q=`. Unless the client
+    asks for an explicit `?ordering=`, results come back most relevant first.
+    Must run after OrderingFilter so the relevance ordering is not overridden.
+    """
+    search_param = "q"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+
+        queryset = queryset.search(query)
+        if not request.query_params.get("ordering"):
+            queryset = queryset.order_by("-search_rank", *getattr(view, "ordering", []))
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Search terms; results are ranked by relevance.",
+                "schema": {"type": "string"},
+            }
+        ]
@@ -0,0 +1,159 @@
+import csv
+import json
+import time
+from functools import partial
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from .cache import bump_listings_version
+from .models import Listing, ListingSearchToken
+from .serializers import ListingImportSerializer
+
+User = get_user_model()
+
+IMPORT_FIELDS = ['name', 'description', 'location', 'pricepernight']
+
+# Errors kept for the report; the rest are only counted, so memory stays flat
+MAX_REPORTED_ERRORS = 100
+
+
+def read_rows(stream, file_format):
+    """
+    Yields (line_number, row) from a text stream of CSV (with a header row) or
+    JSON Lines, one row at a time. Unparseable lines are yielded as (line_number, None).
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.invalid = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.seconds = 0
+
+    def error(self, line_number, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+    def summary(self):
+        return (
+            f"{self.rows} rows in {self.seconds:.1f}s ({self.rows_per_second:.0f} rows/s): "
+            f"{self.created} created, {self.updated} updated, {self.invalid} invalid"
+        )
+
+
+class ListingImporter:
+    """
+    Creates or updates listings keyed on `external_id` from an iterator of rows,
+    one chunk at a time: each chunk is validated with ListingImportSerializer,
+    matched against existing listings and hosts with one query each, written
+    with bulk_create/bulk_update and re-indexed for search in one transaction.
+    Memory use depends on the chunk size, not the input size.
+    """
+
+    def __init__(self, default_host=None, chunk_size=1000, dry_run=False):
+        self.default_host = default_host
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.report = ImportReport()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        self.report.seconds = time.monotonic() - self.report.started
+        return self.report
+
+    def import_chunk(self, chunk):
+        valid = {}
+        for line_number, row in chunk:
+            self.report.rows += 1
+            if row is None:
+                self.report.error(line_number, "Could not parse row")
+                continue
+            serializer = ListingImportSerializer(data=row)
+            if not serializer.is_valid():
+                self.report.error(line_number, json.dumps(serializer.errors))
+                continue
+            # A later row for the same external_id wins
+            valid[serializer.validated_data['external_id']] = (line_number, serializer.validated_data)
+
+        hosts = self.resolve_hosts(valid)
+        existing = Listing.objects.in_bulk(list(valid), field_name='external_id')
+        now = timezone.now()
+        to_create, to_update = [], []
+
+        for external_id, (line_number, data) in valid.items():
+            host_email = data.get('host_email')
+            if host_email and host_email not in hosts:
+                self.report.error(line_number, f"Unknown host_email {host_email}")
+                continue
+            host = hosts[host_email] if host_email else None
+            listing = existing.get(external_id)
+            if listing is None:
+                host = host or self.default_host
+                if host is None:
+                    self.report.error(line_number, "No host_email and no default host given")
+                    continue
+                listing = Listing(external_id=external_id, host=host)
+                to_create.append(listing)
+            else:
+                if host is not None:
+                    listing.host = host
+                listing.updated_at = now
+                to_update.append(listing)
+            for field in IMPORT_FIELDS:
+                setattr(listing, field, data[field])
+
+        if not self.dry_run:
+            self.save(to_create, to_update)
+        self.report.created += len(to_create)
+        self.report.updated += len(to_update)
+
+    def resolve_hosts(self, valid):
+        emails = {data['host_email'] for _, data in valid.values() if data.get('host_email')}
+        if not emails:
+            return {}
+        return {user.email: user for user in User.objects.filter(email__in=emails)}
+
+    def save(self, to_create, to_update):
+        with transaction.atomic():
+            Listing.objects.bulk_create(to_create)
+            Listing.objects.bulk_update(to_update, IMPORT_FIELDS + ['host', 'updated_at'])
+
+            # bulk writes skip Listing.save(), so re-index search here
+            ListingSearchToken.objects.filter(listing__in=to_update).delete()
+            ListingSearchToken.objects.bulk_create(
+                [token for listing in to_create + to_update for token in listing.build_search_tokens()],
+                batch_size=5000,
+            )
+            # bulk writes send no signals either; a dry run never gets here
+            if to_create or to_update:
+                transaction.on_commit(partial(bump_listings_version, *(listing.pk for listing in to_update)))
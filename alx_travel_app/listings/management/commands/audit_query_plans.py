@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from listings.models import Booking, Listing, OutboxMessage, Payment
+from listings.query_plans import capture_selects, explain
+from listings.reconciliation import next_batch
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the representative queries of each API endpoint, the admin lists and the "
+        "background jobs through EXPLAIN and flags full table scans. Plans depend on table "
+        "sizes and statistics, so run it against production-sized data (e.g. a seeded database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true', help="Exit with an error if any full scan is found.")
+        parser.add_argument('--ignore-table', action='append', default=[],
+                            help="Do not flag full scans of this table (repeatable).")
+
+    def handle(self, *args, **options):
+        listing = Listing.objects.order_by().first()
+        booking = Booking.objects.select_related('user').order_by().first()
+        payment = Payment.objects.order_by().first()
+        if listing is None or booking is None:
+            raise CommandError("Needs at least one listing and one booking to build representative queries.")
+
+        tables = set(connection.introspection.table_names())
+        flagged = []
+        # Everything runs in a transaction that is rolled back, and over the test client,
+        # so nothing the endpoints might write is kept
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            for name, probe in self.probes(listing, booking, payment):
+                statements = capture_selects(probe)
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({len(statements)} queries)"))
+                for sql in statements:
+                    lines, scans = explain(sql)
+                    # Derived tables and CTEs are reported by name too; only real tables count
+                    scans = [table for table in scans if table in tables and table not in options['ignore_table']]
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"  {sql}")
+                        for line in lines:
+                            self.stdout.write(f"    {line}")
+                    for table in scans:
+                        flagged.append((name, table))
+                        self.stdout.write(self.style.WARNING(f"  FULL SCAN of {table}: {sql[:200]}"))
+            transaction.set_rollback(True)
+
+        if flagged:
+            message = f"{len(flagged)} full table scans found."
+            if options['fail_on_scan']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No full table scans."))
+
+    def probes(self, listing, booking, payment):
+        today = date.today()
+        guest = booking.user
+        host = listing.host
+        staff = User(email='audit@example.com', role='admin', is_staff=True, is_superuser=True, is_active=True)
+
+        def get(path, user=None):
+            client = APIClient()
+            if user is not None:
+                # Authenticated, so listing reads skip the anonymous response cache
+                client.force_authenticate(user)
+
+            def run():
+                response = client.get(path)
+                # An error response stops before the queries worth auditing
+                if response.status_code != 200:
+                    raise CommandError(f"GET {path} returned {response.status_code}.")
+            return run
+
+        def admin_changelist(model):
+            def run():
+                request = RequestFactory().get(f'/admin/{model._meta.app_label}/{model._meta.model_name}/')
+                request.user = staff
+                admin.site._registry[model].changelist_view(request).render()
+            return run
+
+        yield "GET /api/listings/", get('/api/listings/', guest)
+        yield "GET /api/listings/?price_min&price_max", get('/api/listings/?price_min=50&price_max=150', guest)
+        yield "GET /api/listings/?ordering=pricepernight", get('/api/listings/?ordering=pricepernight', guest)
+        yield "GET /api/listings/?available_from&available_to", get(
+            f'/api/listings/?available_from={today + timedelta(days=7)}&available_to={today + timedelta(days=10)}', guest
+        )
+        yield "GET /api/listings/?q", get(f'/api/listings/?q={listing.name.split()[0] if listing.name else "home"}', guest)
+        yield "GET /api/listings/<id>/?expand=bookings", get(f'/api/listings/{listing.pk}/?expand=bookings', guest)
+        yield "GET /api/bookings/", get('/api/bookings/', guest)
+        yield "GET /api/bookings/?status&start_date_after", get(
+            f'/api/bookings/?status=pending&status=confirmed&start_date_after={today}', guest
+        )
+        yield "GET /api/bookings/<id>/", get(f'/api/bookings/{booking.pk}/', guest)
+        yield "GET /api/exports/", get('/api/exports/', host)
+        yield "GET /api/analytics/listings/", get('/api/analytics/listings/', host)
+
+        if payment is not None:
+            yield "Payment lookup by tx_ref (verify, webhook)", lambda: Payment.objects.select_related(
+                'booking__user').get(tx_ref=payment.tx_ref)
+        yield "Login lookup by email", lambda: User.objects.filter(email=guest.email).first()
+        yield "Payment reconciliation batch", lambda: next_batch({}, timezone.now(), 200)
+        yield "Outbox relay batch", lambda: list(
+            OutboxMessage.objects.filter(sent_at__isnull=True).order_by('id')[:100]
+        )
+
+        yield "Admin listing list", admin_changelist(Listing)
+        yield "Admin booking list", admin_changelist(Booking)
+        yield "Admin payment list", admin_changelist(Payment)
@@ -0,0 +1,46 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from listings.importers import ListingImporter, read_rows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or updates listings from a CSV or JSON Lines file, keyed on external_id. "
+        "Columns: external_id, name, description, location, pricepernight and optionally host_email."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--host', help="Email of the host for rows without host_email.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        default_host = None
+        if options['host']:
+            try:
+                default_host = User.objects.get(email=options['host'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['host']}")
+
+        importer = ListingImporter(default_host, options['chunk_size'], options['dry_run'])
+        if path == '-':
+            report = importer.run(read_rows(sys.stdin, file_format))
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                report = importer.run(read_rows(stream, file_format))
+
+        for line_number, message in report.errors:
+            self.stderr.write(f"line {line_number}: {message}")
+        if report.invalid > len(report.errors):
+            self.stderr.write(f"... and {report.invalid - len(report.errors)} more invalid rows")
+
+        style = self.style.WARNING if report.invalid else self.style.SUCCESS
+        self.stdout.write(style(("[dry run] " if options['dry_run'] else "") + report.summary()))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from listings.analytics import refresh_listing_stats
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the listing analytics summaries (daily and monthly stats) from bookings and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listing', action='append', dest='listings', help="Only this listing id (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Listing ids read per query.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        rebuilt = nights = 0
+        last_pk = None
+
+        while True:
+            listings = Listing.objects.order_by('pk')
+            if options['listings']:
+                listings = listings.filter(pk__in=options['listings'])
+            if last_pk is not None:
+                listings = listings.filter(pk__gt=last_pk)
+            chunk = list(listings.values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                break
+
+            # One transaction per listing, so the rebuild never holds locks for long
+            for listing_id in chunk:
+                nights += refresh_listing_stats(listing_id)
+            rebuilt += len(chunk)
+            last_pk = chunk[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} listings ({nights} booked nights)."))
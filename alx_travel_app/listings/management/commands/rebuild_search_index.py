@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from listings.models import Listing, ListingSearchToken
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the listing search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Listings indexed per transaction.")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        indexed = 0
+        last_pk = None
+
+        while True:
+            listings = Listing.objects.order_by('pk')
+            if last_pk is not None:
+                listings = listings.filter(pk__gt=last_pk)
+            chunk = list(listings[:chunk_size])
+            if not chunk:
+                break
+
+            with transaction.atomic():
+                ListingSearchToken.objects.filter(listing__in=chunk).delete()
+                ListingSearchToken.objects.bulk_create(
+                    [token for listing in chunk for token in listing.build_search_tokens()]
+                )
+
+            indexed += len(chunk)
+            last_pk = chunk[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} listings."))
@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from listings.outbox import purge_sent, relay_batch
+
+
+class Command(BaseCommand):
+    help = "Publishes tasks recorded in the outbox to Celery. Runs until stopped unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=0.5, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--keep-days', type=int, default=7, help="Days sent messages are kept before being purged.")
+        parser.add_argument('--once', action='store_true', help="Relay everything currently pending, then exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        keep = timedelta(days=options['keep_days'])
+        total = 0
+        last_purge = 0
+
+        try:
+            while True:
+                sent = relay_batch(batch_size)
+                total += sent
+
+                if time.monotonic() - last_purge > 3600:
+                    purge_sent(keep)
+                    last_purge = time.monotonic()
+
+                if sent < batch_size:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Relayed {total} outbox messages."))
@@ -0,0 +1,84 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from listings.benchmarks import BenchmarkSuite, benchmark_settings, compare, load_baseline
+from listings.emails import mailer
+from listings.fake_chapa import FakeChapaServer
+from listings.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the listing, booking, auth and payment endpoints against a local fake Chapa "
+        "server and SMTP sink, reporting throughput and p50/p95/p99 latency per scenario. "
+        "Writes bookings and payments: run it on a seeded, disposable database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=BenchmarkSuite.SCENARIOS,
+                            help="Run only this scenario (repeatable). Default: all.")
+        parser.add_argument('--requests', type=int, default=200, help="Timed operations per scenario.")
+        parser.add_argument('--server', choices=BenchmarkSuite.SERVERS, default='wsgi',
+                            help="wsgi: one thread per concurrent request. asgi: one event loop holding them all "
+                                 "(set ASYNC_VIEWS=True for the async views).")
+        parser.add_argument('--concurrency', type=int, default=4, help="Requests in flight at once.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed operations before each scenario.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--password', default='password123', help="Password of the seeded users.")
+        parser.add_argument('--chapa-latency', type=float, default=0.05, help="Seconds the fake Chapa waits per call.")
+        parser.add_argument('--smtp-latency', type=float, default=0.0, help="Seconds the SMTP sink waits per message.")
+        parser.add_argument('--json', help="Write the results to this file.")
+        parser.add_argument('--baseline', help="Compare against the JSON of an earlier run.")
+
+    def handle(self, *args, **options):
+        baseline = load_baseline(options['baseline']) if options['baseline'] else None
+
+        with FakeChapaServer(latency=options['chapa_latency']) as chapa, \
+                SMTPSink(latency=options['smtp_latency']) as sink, \
+                override_settings(**benchmark_settings(chapa.url, sink.host, sink.port)):
+            mailer.close()  # reconnect to the sink, not whatever SMTP server was used before
+            try:
+                suite = BenchmarkSuite(
+                    requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    warmup=options['warmup'],
+                    seed=options['seed'],
+                    password=options['password'],
+                    stdout=self.stdout if options['verbosity'] > 1 else None,
+                    server=options['server'],
+                )
+                results = suite.run(options['scenarios'])
+            except ValueError as error:
+                raise CommandError(str(error))
+            finally:
+                mailer.close()
+
+        self.stdout.write(f"Server: {options['server']}, async views: {'on' if settings.ASYNC_VIEWS else 'off'}")
+        header = f"{'scenario':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<26}{result['requests']:>9}{result['errors']:>8}{result['throughput']:>9}"
+                f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+            )
+
+        if baseline is not None:
+            self.stdout.write("\nChange against baseline (positive throughput and negative latency are better):")
+            for line in compare(results, baseline):
+                self.stdout.write(f"  {line}")
+
+        if options['json']:
+            report = {
+                'options': {
+                    **{key: options[key] for key in (
+                        'server', 'requests', 'concurrency', 'warmup', 'seed', 'chapa_latency', 'smtp_latency'
+                    )},
+                    'async_views': settings.ASYNC_VIEWS,
+                },
+                'results': results,
+            }
+            with open(options['json'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json']}"))
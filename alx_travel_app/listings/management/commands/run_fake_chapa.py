@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from listings.fake_chapa import FakeChapaServer
+
+
+class Command(BaseCommand):
+    help = "Runs a local fake Chapa API. Point CHAPA_BASE_URL at it for development and benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0, help="Seconds to wait before every response.")
+        parser.add_argument('--failure-rate', type=float, default=0, help="Fraction of requests answered with HTTP 503.")
+        parser.add_argument('--payment-status', choices=['success', 'failed'], default='success')
+
+    def handle(self, *args, **options):
+        server = FakeChapaServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+            payment_status=options['payment_status'],
+            verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Fake Chapa listening on {server.url} (Ctrl+C to stop)"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,144 @@
+"""
+Per-route request metrics kept in process memory and exposed in the
+Prometheus text format on /metrics (see listings.middleware.MetricsMiddleware).
+
+Memory is bounded: every series is a fixed set of histogram buckets, routes
+are URL pattern names rather than raw paths, and once METRICS_MAX_SERIES
+label sets exist, new ones are folded into route="other". Each worker process
+keeps its own numbers, so scrape every process (or every pod) separately.
+"""
+import hmac
+import re
+import threading
+from bisect import bisect_left
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+IN_LIST = re.compile(r"IN \(\?(?:, ?\?)*\)")
+NUMBER = re.compile(r"\b\d+\b")
+STRING = re.compile(r"'(?:[^']|'')*'")
+WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Normalises a statement so queries that differ only in their values (or in
+    the length of an IN list) compare equal.
+    """
+    sql = STRING.sub("?", sql.replace("%s", "?"))
+    sql = NUMBER.sub("?", sql)
+    sql = IN_LIST.sub("IN (...)", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        index = bisect_left(buckets, value)
+        if index < len(buckets):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+
+
+REQUEST_DURATION = Metric('http_request_duration_seconds', "Request latency by route.", DURATION_BUCKETS)
+DB_QUERIES = Metric('http_request_db_queries', "SQL queries per request by route.", QUERY_COUNT_BUCKETS)
+DB_DURATION = Metric('http_request_db_duration_seconds', "Time spent in SQL per request by route.", DURATION_BUCKETS)
+RESPONSE_SIZE = Metric('http_response_size_bytes', "Response body size by route.", SIZE_BUCKETS)
+METRICS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION, RESPONSE_SIZE)
+
+
+class Registry:
+    def __init__(self, max_series):
+        self.max_series = max_series
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, values):
+        """
+        Records one request. `labels` is (method, route, status class) and
+        `values` maps a Metric to the observed value (None to skip it).
+        """
+        with self._lock:
+            histograms = self.series.get(labels)
+            if histograms is None:
+                if len(self.series) >= self.max_series:
+                    labels = (labels[0], 'other', labels[2])
+                histograms = self.series.setdefault(
+                    labels, {metric: Histogram(metric.buckets) for metric in METRICS}
+                )
+            for metric, value in values.items():
+                if value is not None:
+                    histograms[metric].observe(metric.buckets, value)
+
+    def render(self):
+        with self._lock:
+            snapshot = [
+                (labels, {metric: (list(h.counts), h.sum, h.count) for metric, h in histograms.items()})
+                for labels, histograms in sorted(self.series.items())
+            ]
+
+        lines = []
+        for metric in METRICS:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} histogram")
+            for (method, route, status), histograms in snapshot:
+                counts, total, count = histograms[metric]
+                if not count:
+                    continue
+                labels = f'method="{escape(method)}",route="{escape(route)}",status="{status}"'
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f"{metric.name}_sum{{{labels}}} {total:.6g}")
+                lines.append(f"{metric.name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.series.clear()
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry(getattr(settings, 'METRICS_MAX_SERIES', 1000))
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Scrapers must send METRICS_TOKEN as a bearer
+    token; with no token configured the endpoint is hidden (404) unless DEBUG
+    is on, so a deployment never publishes its metrics by accident.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    else:
+        sent = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(sent, token):
+            response = HttpResponse(status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,204 @@
+import logging
+from collections import defaultdict
+from contextlib import ExitStack
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+from . import replicas
+from .metrics import DB_DURATION, DB_QUERIES, REQUEST_DURATION, RESPONSE_SIZE, fingerprint, registry
+
+logger = logging.getLogger(__name__)
+
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+# Distinct statements remembered per request for the slow-request log
+MAX_STATEMENTS = 200
+
+
+class QueryRecorder:
+    """
+    A database execute wrapper that counts and times every query of a request,
+    without relying on DEBUG's connection.queries.
+    """
+
+    def __init__(self, keep_statements):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {} if keep_statements else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.statements is not None and (sql in self.statements or len(self.statements) < MAX_STATEMENTS):
+                entry = self.statements.setdefault(sql, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def fingerprints(self, limit=10):
+        """
+        (fingerprint, count, seconds) for the statements that took the most time.
+        """
+        totals = defaultdict(lambda: [0, 0.0])
+        for sql, (count, seconds) in (self.statements or {}).items():
+            total = totals[fingerprint(sql)]
+            total[0] += count
+            total[1] += seconds
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, seconds) for sql, (count, seconds) in ranked[:limit]]
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count and time, and response size per route
+    (the URL pattern name) into listings.metrics, and logs requests slower than
+    SLOW_REQUEST_MS with the fingerprints of their costliest queries.
+    Put it first in MIDDLEWARE so the whole stack is timed.
+
+    Works in both modes, so ASGI requests stay on the event loop. The ASGI
+    handler runs all of a request's sync code (including async ORM calls) in
+    one thread of its own, and the query recorder is installed on that
+    thread's connections.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = settings.SLOW_REQUEST_MS / 1000 if settings.SLOW_REQUEST_MS else None
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        recorder = QueryRecorder(keep_statements=self.slow_seconds is not None)
+        started = perf_counter()
+        with ExitStack() as stack:
+            self.record_queries(stack, recorder)
+            response = self.get_response(request)
+        self.observe(request, response, recorder, perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(keep_statements=self.slow_seconds is not None)
+        started = perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.record_queries)(stack, recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.observe(request, response, recorder, perf_counter() - started)
+        return response
+
+    @staticmethod
+    def record_queries(stack, recorder):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+
+    def observe(self, request, response, recorder, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else 'unmatched'
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        if response.streaming:
+            size = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            size = len(response.content)
+
+        registry.observe((method, route, f"{response.status_code // 100}xx"), {
+            REQUEST_DURATION: elapsed,
+            DB_QUERIES: recorder.count,
+            DB_DURATION: recorder.duration,
+            RESPONSE_SIZE: size,
+        })
+
+        if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+            queries = "".join(
+                f"\n  {count}x {seconds * 1000:.1f}ms {sql}" for sql, count, seconds in recorder.fingerprints()
+            )
+            logger.warning(
+                "Slow request %s %s (%s): %.0fms, %d queries in %.0fms%s",
+                request.method, request.path, route, elapsed * 1000, recorder.count, recorder.duration * 1000, queries,
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scopes replica routing (listings.replicas) to the request, and pins the
+    user to the primary database for READ_YOUR_WRITES_SECONDS when the
+    request wrote anything.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = replicas.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            state = replicas.end(token)
+        self.pin_writer(request, state)
+        return response
+
+    async def __acall__(self, request):
+        token = replicas.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = replicas.end(token)
+        if state.wrote:
+            await sync_to_async(self.pin_writer)(request, state)
+        return response
+
+    @staticmethod
+    def pin_writer(request, state):
+        # DRF sets request.user on the underlying request once it authenticates
+        user = getattr(request, 'user', None)
+        if state.wrote and user is not None and user.is_authenticated:
+            replicas.pin_to_primary(user.pk)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, made async-capable: as the last middleware, a sync-only one
+    would make Django run every async view through async_to_sync in a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def backfill_booked_nights(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    batch = []
+    for booking in Booking.objects.exclude(status='canceled').iterator(chunk_size=2000):
+        nights = max((booking.end_date - booking.start_date).days, 1)
+        batch.extend(
+            BookedNight(property_id=booking.property_id, booking_id=booking.pk,
+                        night=booking.start_date + timedelta(days=offset))
+            for offset in range(nights)
+        )
+        if len(batch) >= 5000:
+            BookedNight.objects.bulk_create(batch)
+            batch = []
+    BookedNight.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_alter_booking_status_payment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nights', to='listings.booking')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['property', 'night'], name='bookednight_property_night')],
+            },
+        ),
+        migrations.RunPython(backfill_booked_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_bookednight'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='bookednight',
+            constraint=models.UniqueConstraint(fields=('property', 'night'), name='unique_bookednight_property_night'),
+        ),
+        migrations.RemoveIndex(
+            model_name='bookednight',
+            name='bookednight_property_night',
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:25
+
+import django.db.models.deletion
+import re
+from collections import Counter
+from django.db import migrations, models
+
+# The tokenizer as of this migration, copied so later changes to listings.search
+# cannot change what it does (rebuild_search_index re-indexes with the current one)
+FIELD_WEIGHTS = {'name': 5, 'location': 3, 'description': 1}
+MAX_TERM_FREQUENCY = 5
+MAX_TOKEN_LENGTH = 64
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has in is it its of on or that the to with
+""".split())
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in TOKEN_RE.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def listing_token_weights(listing):
+    weights = Counter()
+    for field, field_weight in FIELD_WEIGHTS.items():
+        for token, frequency in Counter(tokenize(getattr(listing, field))).items():
+            weights[token] += field_weight * min(frequency, MAX_TERM_FREQUENCY)
+    return weights
+
+
+def index_listings(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    ListingSearchToken = apps.get_model('listings', 'ListingSearchToken')
+    batch = []
+    for listing in Listing.objects.iterator(chunk_size=1000):
+        batch.extend(
+            ListingSearchToken(listing_id=listing.pk, token=token, weight=weight)
+            for token, weight in listing_token_weights(listing).items()
+        )
+        if len(batch) >= 5000:
+            ListingSearchToken.objects.bulk_create(batch)
+            batch = []
+    ListingSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_unique_booked_night'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'listing'], name='searchtoken_token_listing')],
+            },
+        ),
+        migrations.RunPython(index_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listingsearchtoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'start_date', 'booking_id'], name='booking_user_start_date_pk'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['created_at', 'property_id'], name='listing_created_at_pk'),
+        ),
+    ]
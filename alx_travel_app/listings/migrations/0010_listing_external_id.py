@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('booked_nights', models.PositiveSmallIntegerField(default=0)),
+                ('booked_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listing', 'day'), name='unique_listingdailystats_listing_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ListingMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('booked_nights', models.PositiveIntegerField(default=0)),
+                ('booked_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='listings.listing')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('listing', 'month'), name='unique_listingmonthlystats_listing_month')],
+            },
+        ),
+    ]
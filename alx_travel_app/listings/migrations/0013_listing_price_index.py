@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_listing_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['pricepernight', 'property_id'], name='listing_price_pk'),
+        ),
+    ]
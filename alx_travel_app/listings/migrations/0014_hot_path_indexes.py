@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_listing_price_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['property', 'start_date', 'status'], name='booking_property_start_status'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['updated_at', 'property_id'], name='listing_updated_at_pk'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at', 'payment_id'], name='payment_created_pk'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_updated_at_pk',
+        ),
+    ]
@@ -1,9 +1,70 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 import uuid
+from datetime import date, timedelta
+from functools import partial
 from django.contrib.auth import get_user_model
+from .cache import bump_listings_version
+from .search import listing_token_weights, tokenize
 
 User = get_user_model()
 
+class ListingQuerySet(models.QuerySet):
+    def with_booking_summary(self, window_days=30):
+        """
+        Annotates each listing with a compact summary of its non-canceled bookings
+        (total count, next check-in date and bookings starting within `window_days`)
+        using correlated subqueries, so the query count does not depend on how many
+        listings or bookings there are.
+        """
+        today = date.today()
+        active = Booking.objects.filter(property=OuterRef('pk')).exclude(status='canceled')
+
+        def count_of(bookings):
+            counted = bookings.order_by().values('property').annotate(total=Count('pk')).values('total')
+            return Coalesce(Subquery(counted), 0)
+
+        return self.annotate(
+            booking_count=count_of(active),
+            next_booked_date=Subquery(
+                active.filter(start_date__gte=today).order_by('start_date').values('start_date')[:1]
+            ),
+            upcoming_booking_count=count_of(
+                active.filter(start_date__gte=today, start_date__lt=today + timedelta(days=window_days))
+            ),
+        )
+
+    def available_between(self, start_date, end_date):
+        """
+        Listings with no booked night in [start_date, end_date). Each listing is
+        checked with an index range probe on BookedNight, so the cost depends on
+        the length of the stay rather than on the listing's booking history.
+        """
+        booked = BookedNight.objects.filter(
+            property=OuterRef('pk'), night__gte=start_date, night__lt=end_date
+        )
+        return self.filter(~Exists(booked))
+
+    def search(self, query):
+        """
+        Listings matching any term of `query`, annotated with `search_rank` (the
+        summed weight of the matched terms). Candidates come from the token index,
+        never from a scan of the listing text.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return self.annotate(search_rank=Value(0)).none()
+
+        matches = ListingSearchToken.objects.filter(token__in=terms)
+        rank = (
+            matches.filter(listing=OuterRef('pk'))
+            .order_by().values('listing').annotate(total=Sum('weight')).values('total')
+        )
+        return self.filter(pk__in=matches.values('listing')).annotate(search_rank=Subquery(rank))
+
+
 class Listing(models.Model):
     property_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     host = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hosted_properties')
@@ -13,10 +74,52 @@ class Listing(models.Model):
     pricepernight = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # The host's own identifier for the property, used as the key for bulk imports
+    external_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+
+    objects = ListingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'property_id'], name='listing_created_at_pk'),
+            # price_min/price_max range scans, and ?ordering=pricepernight pages
+            models.Index(fields=['pricepernight', 'property_id'], name='listing_price_pk'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.index_search_tokens()
+
+    def index_search_tokens(self):
+        self.search_tokens.all().delete()
+        ListingSearchToken.objects.bulk_create(self.build_search_tokens())
+
+    def build_search_tokens(self):
+        return [
+            ListingSearchToken(listing_id=self.pk, token=token, weight=weight)
+            for token, weight in listing_token_weights(self).items()
+        ]
+
+
+class ListingSearchToken(models.Model):
+    """
+    Inverted index for listing search: one row per (listing, term), rebuilt
+    whenever the listing is saved.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'listing'], name='searchtoken_token_listing')]
+
+    def __str__(self):
+        return f"{self.token} -> {self.listing_id}"
+
 
 class Booking(models.Model):
     STATUS_CHOICES = [('pending', 'Pending'), ('confirmed', 'Confirmed'), ('canceled', 'Canceled')]
@@ -29,9 +132,77 @@ class Booking(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # BookingViewSet: a user's bookings in (start_date, booking_id) cursor order
+            models.Index(fields=['user', 'start_date', 'booking_id'], name='booking_user_start_date_pk'),
+            # Per-listing booking summaries, the expanded listing bookings and date-range lookups
+            models.Index(fields=['property', 'start_date', 'status'], name='booking_property_start_status'),
+        ]
 
     def __str__(self):
-        return f"Booking by {self.user.email} for {self.property.name}"
+        # IDs only, so listing bookings (or payments) never loads the user and listing rows
+        return f"{self.user_id} booked {self.property_id} from {self.start_date} to {self.end_date}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.book_nights()
+
+    def night_dates(self):
+        # end_date is the check-out day; a same-day booking still holds its start night
+        nights = max((self.end_date - self.start_date).days, 1)
+        return [self.start_date + timedelta(days=offset) for offset in range(nights)]
+
+    def book_nights(self):
+        """
+        Rewrites the occupancy rows for this booking. Canceled bookings hold no nights.
+        Raises IntegrityError if another booking already holds one of the nights;
+        save() runs this in the same transaction so the booking is rolled back too.
+        Nights released or taken queue a refresh of the listing's summaries.
+        """
+        from .analytics import queue_refresh
+
+        released = list(self.nights.values_list('property_id', 'night'))
+        moved_from = {property_id for property_id, _ in released} - {self.property_id}
+        if moved_from:
+            # The post_save signal only knows the listing the booking is on now
+            transaction.on_commit(partial(bump_listings_version, *moved_from))
+        self.nights.all().delete()
+        taken = []
+        if self.status != 'canceled':
+            taken = [(self.property_id, night) for night in self.night_dates()]
+            BookedNight.objects.bulk_create([
+                BookedNight(property_id=property_id, booking=self, night=night)
+                for property_id, night in taken
+            ])
+        queue_refresh(released + taken)
+
+
+class BookedNight(models.Model):
+    """
+    One row per night held by a non-canceled booking; the occupancy index used
+    for availability searches. The unique constraint makes the database reject
+    a second booking for the same night, however many checkouts run in parallel.
+    """
+    property = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='booked_nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='nights')
+    night = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'night'], name='unique_bookednight_property_night')
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} booked on {self.night}"
+
+# Chapa transaction statuses that settle a payment, and what they settle it as.
+# Any other status (pending, ...) leaves the payment pending to be verified again.
+CHAPA_PAYMENT_STATUSES = {'success': 'completed', 'failed': 'failed', 'cancelled': 'failed'}
+
 
 class Payment(models.Model):
     STATUS_CHOICES = [
@@ -49,5 +220,148 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Reconciliation sweeps pending payments in (created_at, payment_id) order
+            models.Index(fields=['status', 'created_at', 'payment_id'], name='payment_status_created_pk'),
+            # The admin payment list, newest first
+            models.Index(fields=['created_at', 'payment_id'], name='payment_created_pk'),
+        ]
+
+    def __str__(self):
+        return f"Payment for booking {self.booking_id} - {self.status}"
+
+    def record_verification(self, chapa_status, chapa_transaction_id=None):
+        """
+        Stores the outcome of a Chapa verify call. Returns True only for the one
+        call that moved the payment to completed, so callers can send the
+        confirmation email exactly once however many times a payment is verified.
+        A status Chapa has not settled yet changes nothing.
+        """
+        new_status = CHAPA_PAYMENT_STATUSES.get(chapa_status)
+        if new_status is None:
+            return False
+        changes = {'status': new_status, 'updated_at': timezone.now()}
+        if chapa_transaction_id:
+            changes['chapa_transaction_id'] = chapa_transaction_id
+
+        from .analytics import queue_refresh_for_bookings
+
+        with transaction.atomic():
+            # A conditional UPDATE, so concurrent verifications cannot both win
+            updated = Payment.objects.filter(pk=self.pk).exclude(status='completed').update(**changes)
+            completed = bool(updated) and new_status == 'completed'
+            if completed:
+                queue_refresh_for_bookings([self.booking_id])
+        self.refresh_from_db(fields=['status', 'chapa_transaction_id', 'updated_at'])
+        return completed
+
+
+class TaskCheckpoint(models.Model):
+    """
+    Where a long-running periodic job got to, so an interrupted run resumes
+    instead of starting over.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+
+class OutboxMessage(models.Model):
+    """
+    A Celery task recorded in the same transaction as the write that triggers
+    it. The outbox relay publishes unsent rows to the broker, so request
+    handlers never wait on the broker and tasks are never sent for rolled-back
+    writes.
+    """
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['sent_at', 'id'], name='outbox_sent_at_id')]
+
+    def __str__(self):
+        return f"{self.task_name} ({'sent' if self.sent_at else 'pending'})"
+
+
+class ExportJob(models.Model):
+    """
+    A Booking or Payment history export, written to a file under MEDIA_ROOT by
+    a Celery worker (see listings.exports) and downloaded once completed.
+    """
+    DATASET_CHOICES = [('bookings', 'Bookings'), ('payments', 'Payments')]
+    FORMAT_CHOICES = [('csv', 'CSV'), ('ndjson', 'NDJSON')]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+
+    export_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    dataset = models.CharField(max_length=20, choices=DATASET_CHOICES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='exports/', blank=True)
+    row_count = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['requested_by', 'created_at'], name='exportjob_user_created')]
+
+    def __str__(self):
+        return f"{self.dataset} export ({self.file_format}) - {self.status}"
+
+
+class ListingDailyStats(models.Model):
+    """
+    Occupancy and revenue of one listing on one night, derived from BookedNight,
+    Booking and Payment by listings.analytics. Only booked nights have a row.
+    A booking's price is spread evenly over its nights; `paid_revenue` counts
+    the share of bookings whose payment is completed.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    booked_nights = models.PositiveSmallIntegerField(default=0)
+    booked_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'day'], name='unique_listingdailystats_listing_day')
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} on {self.day}"
+
+
+class ListingMonthlyStats(models.Model):
+    """
+    ListingDailyStats rolled up per calendar month (`month` is its first day).
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='monthly_stats')
+    month = models.DateField()
+    booked_nights = models.PositiveIntegerField(default=0)
+    booked_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'month'], name='unique_listingmonthlystats_listing_month')
+        ]
+
     def __str__(self):
-        return f"Payment for booking {self.booking.booking_id} - {self.status}"
+        return f"{self.listing_id} in {self.month:%Y-%m}"
@@ -0,0 +1,62 @@
+import logging
+from datetime import timedelta
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, *args, **kwargs):
+    """
+    Records `task(*args, **kwargs)` in the outbox. Call it inside the
+    transaction.atomic() block that makes the write the task depends on: the
+    task is then published if and only if that transaction commits.
+    """
+    return OutboxMessage.objects.create(task_name=task.name, args=list(args), kwargs=kwargs)
+
+
+def enqueue_many(task, calls):
+    """
+    Records `task(*args)` for every tuple of args in `calls` with one INSERT.
+    Same transaction rules as enqueue().
+    """
+    return OutboxMessage.objects.bulk_create(
+        [OutboxMessage(task_name=task.name, args=list(args), kwargs={}) for args in calls]
+    )
+
+
+def relay_batch(batch_size=100):
+    """
+    Publishes up to `batch_size` unsent messages in creation order and marks
+    them sent. Rows are locked with SKIP LOCKED, so several relays can run side
+    by side without publishing a message twice. A message that cannot be
+    published has the attempt and error recorded and is retried by later
+    batches; the messages after it still go out. After OUTBOX_MAX_ATTEMPTS
+    failures it is left alone for someone to look at. Returns how many were sent.
+    """
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, attempts__lt=settings.OUTBOX_MAX_ATTEMPTS).order_by('id')[:batch_size]
+        )
+        sent_ids = []
+        for message in messages:
+            try:
+                current_app.send_task(message.task_name, args=message.args, kwargs=message.kwargs)
+            except Exception as error:
+                logger.warning("Outbox relay could not publish %s: %s", message.task_name, error)
+                OutboxMessage.objects.filter(pk=message.pk).update(
+                    attempts=message.attempts + 1, last_error=str(error)
+                )
+                continue
+            sent_ids.append(message.pk)
+
+        OutboxMessage.objects.filter(pk__in=sent_ids).update(sent_at=timezone.now())
+    return len(sent_ids)
+
+
+def purge_sent(older_than=timedelta(days=7)):
+    return OutboxMessage.objects.filter(sent_at__lt=timezone.now() - older_than).delete()[0]
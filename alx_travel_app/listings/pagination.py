@@ -1,6 +1,157 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+from rest_framework.utils.urls import replace_query_param
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = 'page_size'
     max_page_size = 1000
+
+class CursorResultsSetPagination(CursorPagination):
+    """
+    Keyset pagination with opaque `cursor` links. The ordering always ends
+    with the primary key, and a cursor holds the values of every ordering
+    field for the row it points at; the next page is the rows past that tuple
+    in the ordering. Rows sharing a non-unique sort key (a price, a date) are
+    told apart by the key, so no OFFSET is needed and no page repeats or
+    skips rows. There is no COUNT(*).
+
+    Clients that need page numbers can still opt in with `?page=`, which
+    switches to `StandardResultsSetPagination` for that request.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    # Query parameters that make a request page-number based
+    page_number_params = ('page',)
+    page_number_class = StandardResultsSetPagination
+
+    page_number_paginator = None
+
+    def uses_page_numbers(self, request):
+        return any(param in request.query_params for param in self.page_number_params)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Always end on the primary key so every position is unique
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not pk_names & {field.lstrip('-') for field in ordering}:
+            ordering += ('-pk',) if ordering[0].startswith('-') else ('pk',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_page_numbers(request):
+            self.page_number_paginator = self.page_number_class()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        self.page_number_paginator = None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        # A previous-page cursor walks back from its row in the reversed ordering
+        reverse = self.cursor is not None and self.cursor['reverse']
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.past_position(ordering, self.cursor['position']))
+
+        # One extra row tells whether there is a page beyond this one
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    @staticmethod
+    def past_position(ordering, position):
+        """
+        Rows after `position` (values of the `ordering` fields) in that
+        ordering: (a > x) OR (a = x AND b > y) OR ...
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            equal = {name.lstrip('-'): value for name, value in zip(ordering[:index], position[:index])}
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            conditions.append(Q(**equal, **{f"{field.lstrip('-')}__{lookup}": position[index]}))
+        return reduce(or_, conditions)
+
+    def get_position(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            # Full precision: DjangoJSONEncoder would cut datetimes to milliseconds
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            ordering = tuple(cursor['o'])
+            cursor = {'reverse': bool(cursor['r']), 'position': [str(value) for value in cursor['p']]}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # Positions only make sense in the ordering they were taken in
+        if ordering != self.ordering or len(cursor['position']) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, reverse, position):
+        cursor = {'o': self.ordering, 'r': int(reverse), 'p': position}
+        encoded = urlsafe_b64encode(json.dumps(cursor).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.get_position(self.page[-1]) if self.page else self.cursor['position']
+        return self.encode_cursor(False, position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.get_position(self.page[0]) if self.page else self.cursor['position']
+        return self.encode_cursor(True, position)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': 'page',
+                'required': False,
+                'in': 'query',
+                'description': 'Opt in to page-number pagination instead of cursors.',
+                'schema': {'type': 'integer'},
+            }
+        ]
+
+class ListingCursorPagination(CursorResultsSetPagination):
+    ordering = ('-created_at', '-property_id')
+    # Relevance-ranked search results have no stable cursor key, so they are page-numbered
+    page_number_params = ('page', 'q')
+
+class BookingCursorPagination(CursorResultsSetPagination):
+    ordering = ('start_date', 'booking_id')
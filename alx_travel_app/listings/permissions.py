@@ -12,7 +12,9 @@ class IsAuthenticatedIsOwnerOrReadOnlyListing(permissions.BasePermission):
         return request.user and request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        return obj.host == request.user
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return obj.host_id == request.user.pk
 
 class IsAuthenticatedIsOwnerBooking(permissions.BasePermission):
     message = (
@@ -24,4 +26,21 @@ class IsAuthenticatedIsOwnerBooking(permissions.BasePermission):
         return request.user and request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
\ No newline at end of file
+        return obj.user_id == request.user.pk
+
+def is_finance(user):
+    # Staff and admins see bookings and payments across every host
+    return user.is_staff or user.role == 'admin'
+
+class IsHostOrStaff(permissions.BasePermission):
+    message = "Only hosts and staff can access host reporting."
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.role == 'host' or is_finance(user)))
+
+class CanExportBookings(IsHostOrStaff):
+    message = "Only hosts and staff can export bookings and payments, and only their own exports are visible."
+
+    def has_object_permission(self, request, view, obj):
+        return obj.requested_by_id == request.user.pk
@@ -0,0 +1,56 @@
+"""
+EXPLAIN helpers for the query plan audit (`manage.py audit_query_plans`):
+capture the SQL a piece of code runs, ask the database how it would execute
+each SELECT, and pick out full table scans.
+"""
+import re
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def capture_selects(func):
+    """
+    Runs `func()` and returns the distinct SELECT statements it executed, in
+    order, with their parameters inlined.
+    """
+    with CaptureQueriesContext(connection) as captured:
+        func()
+    statements = []
+    for query in captured.captured_queries:
+        sql = query['sql']
+        if sql.lstrip().upper().startswith('SELECT') and sql not in statements:
+            statements.append(sql)
+    return statements
+
+
+def explain(sql):
+    """
+    Returns (plan lines, tables read with a full scan) for one SELECT.
+    Supports SQLite, MySQL/MariaDB and PostgreSQL.
+    """
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            lines = [row[-1] for row in cursor.fetchall()]
+            # "SCAN t" reads the whole table; "SCAN t USING INDEX i" walks an index in order
+            scans = [match.group(1) for match in map(SQLITE_SCAN.match, lines) if match]
+        elif vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            lines = [
+                f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row.get('Extra') or ''}".strip()
+                for row in rows
+            ]
+            scans = [row['table'] for row in rows if row['type'] == 'ALL' and row['table']]
+        elif vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql)
+            lines = [row[0] for row in cursor.fetchall()]
+            scans = [match.group(1) for line in lines for match in POSTGRES_SCAN.finditer(line)]
+        else:
+            raise NotImplementedError(f"EXPLAIN parsing is not implemented for {vendor}")
+    return lines, scans
@@ -0,0 +1,142 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .analytics import queue_refresh_for_bookings
+from .chapa import ChapaError, ChapaUnavailable, get_chapa_client
+from .models import CHAPA_PAYMENT_STATUSES, Payment, TaskCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'reconcile_pending_payments'
+
+
+def fetch_chapa_status(tx_ref):
+    """
+    Returns (chapa_status, reference) for a transaction, or None if Chapa does
+    not know it. ChapaUnavailable propagates so the sweep can stop early.
+    """
+    try:
+        _, data = get_chapa_client().verify(tx_ref)
+    except ChapaUnavailable:
+        raise
+    except ChapaError:
+        return None
+    if data.get('status') != 'success':
+        return None
+    return data['data']['status'], data['data'].get('reference')
+
+
+def next_batch(position, cutoff, batch_size):
+    pending = Payment.objects.filter(status='pending', created_at__lt=cutoff)
+    if position:
+        created_at = parse_datetime(position['created_at'])
+        pending = pending.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, payment_id__gt=position['payment_id'])
+        )
+    return list(pending.order_by('created_at', 'payment_id')[:batch_size])
+
+
+def apply_results(batch, results, expire_before):
+    """
+    Writes the verification results for one batch with a single bulk UPDATE.
+    Rows are re-read under lock and skipped if something else (the webhook,
+    the callback view) resolved them while Chapa was being asked.
+    Returns (changed payments, payments that became completed).
+    """
+    by_pk = {payment.pk: payment for payment in batch}
+    now = timezone.now()
+    changed, completed = [], []
+
+    with transaction.atomic():
+        still_pending = Payment.objects.select_for_update().filter(pk__in=by_pk, status='pending')
+        for payment in still_pending.only('payment_id', 'status', 'created_at'):
+            result = results.get(payment.pk)
+            if result is not None:
+                chapa_status, reference = result
+                if chapa_status not in CHAPA_PAYMENT_STATUSES:
+                    # Still in progress at Chapa; the next sweep asks again
+                    continue
+                payment.status = CHAPA_PAYMENT_STATUSES[chapa_status]
+                payment.chapa_transaction_id = reference or by_pk[payment.pk].chapa_transaction_id
+            elif payment.created_at < expire_before:
+                # Chapa never saw it and the user is long gone
+                payment.status = 'failed'
+                payment.chapa_transaction_id = by_pk[payment.pk].chapa_transaction_id
+            else:
+                continue
+            payment.updated_at = now
+            changed.append(payment)
+            if payment.status == 'completed':
+                completed.append(by_pk[payment.pk])
+
+        Payment.objects.bulk_update(changed, ['status', 'chapa_transaction_id', 'updated_at'])
+        if completed:
+            queue_refresh_for_bookings([payment.booking_id for payment in completed])
+
+    return changed, completed
+
+
+def reconcile_pending_payments(batch_size=None, concurrency=None, max_seconds=None):
+    """
+    Sweeps pending payments in (created_at, payment_id) order, verifying each
+    batch against Chapa with bounded parallelism and saving the position after
+    every batch. A run that is interrupted or runs out of time resumes from the
+    saved position; a run that reaches the end resets it for the next sweep.
+    Returns throughput metrics.
+    """
+    from .tasks import send_payment_confirmation_emails
+
+    batch_size = batch_size or settings.PAYMENT_RECONCILE_BATCH_SIZE
+    concurrency = concurrency or settings.PAYMENT_RECONCILE_CONCURRENCY
+    max_seconds = max_seconds or settings.PAYMENT_RECONCILE_MAX_SECONDS
+
+    started = time.monotonic()
+    now = timezone.now()
+    # Leave payments the user may still be completing to the callback and webhook
+    cutoff = now - timedelta(seconds=settings.PAYMENT_RECONCILE_MIN_AGE)
+    expire_before = now - timedelta(seconds=settings.PAYMENT_PENDING_EXPIRY)
+
+    checkpoint, _ = TaskCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    metrics = {'checked': 0, 'completed': 0, 'failed': 0, 'unresolved': 0, 'batches': 0, 'finished': False}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while time.monotonic() - started < max_seconds:
+            batch = next_batch(checkpoint.position, cutoff, batch_size)
+            if not batch:
+                checkpoint.position = {}
+                checkpoint.save(update_fields=['position', 'updated_at'])
+                metrics['finished'] = True
+                break
+
+            try:
+                statuses = list(pool.map(fetch_chapa_status, [payment.tx_ref for payment in batch]))
+            except ChapaUnavailable as error:
+                logger.warning("Stopping payment reconciliation, Chapa unavailable: %s", error)
+                break
+
+            results = {payment.pk: result for payment, result in zip(batch, statuses) if result is not None}
+            changed, completed = apply_results(batch, results, expire_before)
+            if completed:
+                send_payment_confirmation_emails.delay([str(payment.pk) for payment in completed])
+
+            last = batch[-1]
+            checkpoint.position = {'created_at': last.created_at.isoformat(), 'payment_id': str(last.pk)}
+            checkpoint.save(update_fields=['position', 'updated_at'])
+
+            metrics['batches'] += 1
+            metrics['checked'] += len(batch)
+            metrics['completed'] += len(completed)
+            metrics['failed'] += len(changed) - len(completed)
+            metrics['unresolved'] += len(batch) - len(changed)
+
+    elapsed = time.monotonic() - started
+    metrics['seconds'] = round(elapsed, 3)
+    metrics['per_second'] = round(metrics['checked'] / elapsed, 1) if elapsed else 0.0
+    logger.info("Payment reconciliation: %s", metrics)
+    return metrics
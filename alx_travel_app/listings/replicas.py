@@ -0,0 +1,140 @@
+"""
+Read replicas: a database router that sends chosen reads to a replica of
+`default` while every write, and every other read, stays on the primary.
+
+Reads only move when asked to. Views opt in with ReplicaReadMixin (listing
+list/retrieve, the host dashboard), which routes the safe requests of users
+who are not pinned; the export task reads its rows through replica_alias().
+Each request sticks to one replica picked at random from DATABASE_REPLICAS,
+so a page and its count come from the same snapshot.
+
+Read-your-writes: ReplicaRoutingMiddleware notes when a request writes (the
+router sees every save, update and delete) and pins its user to the primary
+for READ_YOUR_WRITES_SECONDS, longer than the replicas are expected to lag.
+The pin is a key in the default cache, so it holds on every worker when the
+cache is shared. Reads after a write within the same request or task also
+stay on the primary.
+
+Other users may read rows a little older than the latest change. Responses
+built from a replica within READ_YOUR_WRITES_SECONDS of a change are
+therefore not stored in the response cache nor given a version-based ETag
+(see read_may_be_stale), so a lagging replica's rows are never cached or
+revalidated under the new version.
+"""
+import random
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+_state = ContextVar('listings_replica_state', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def pin_key(user_id):
+    return f"db:pinned:{user_id}"
+
+
+def pin_to_primary(user_id):
+    cache.set(pin_key(user_id), 1, settings.READ_YOUR_WRITES_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id)) is not None
+
+
+def replica_alias(user_id=None):
+    """
+    A replica to read from, or `default` when there are none or the user with
+    primary key `user_id` wrote recently.
+    """
+    if not settings.DATABASE_REPLICAS or (user_id is not None and is_pinned(user_id)):
+        return DEFAULT_DB_ALIAS
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def begin():
+    """
+    Starts routing state for a request; pass the token to end().
+    """
+    return _state.set(RoutingState())
+
+
+def end(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def route_reads_to_replica(user_id=None):
+    """
+    Sends the rest of the current request's reads to a replica, unless the
+    user is pinned or the request has already written.
+    """
+    state = _state.get()
+    if state is None or state.wrote:
+        return
+    alias = replica_alias(user_id)
+    state.replica = None if alias == DEFAULT_DB_ALIAS else alias
+
+
+def read_may_be_stale(version):
+    """
+    True if the current request reads from a replica and the data changed at
+    `version` (a nanosecond timestamp, as listings.cache versions are) too
+    recently for the replica to be sure to have it. Such responses must not
+    be cached under that version.
+    """
+    state = _state.get()
+    if state is None or not state.replica or state.wrote:
+        return False
+    return time.time_ns() - version < settings.READ_YOUR_WRITES_SECONDS * 1_000_000_000
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.replica and not state.wrote:
+            return state.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        # Explicitly, or a row read from a replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serves a view's safe requests (GET, HEAD, OPTIONS) from a replica. Put it
+    before the view class in the bases.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.reads_from_replica(request):
+            user = request.user
+            route_reads_to_replica(user.pk if user and user.is_authenticated else None)
+
+    def reads_from_replica(self, request):
+        return bool(settings.DATABASE_REPLICAS) and request.method in ('GET', 'HEAD', 'OPTIONS')
@@ -0,0 +1,42 @@
+import re
+from collections import Counter
+
+# How much a term counts towards a listing's rank, depending on where it appears
+FIELD_WEIGHTS = {
+    'name': 5,
+    'location': 3,
+    'description': 1,
+}
+
+# Repeats of a term beyond this stop raising the rank, so keyword stuffing does not pay
+MAX_TERM_FREQUENCY = 5
+
+MAX_TOKEN_LENGTH = 64
+
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has in is it its of on or that the to with
+""".split())
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase search terms, dropping stopwords and one-letter terms.
+    """
+    return [
+        token[:MAX_TOKEN_LENGTH]
+        for token in TOKEN_RE.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def listing_token_weights(listing):
+    """
+    Returns {term: weight} for a listing, as stored in the search index.
+    """
+    weights = Counter()
+    for field, field_weight in FIELD_WEIGHTS.items():
+        for token, frequency in Counter(tokenize(getattr(listing, field))).items():
+            weights[token] += field_weight * min(frequency, MAX_TERM_FREQUENCY)
+    return weights
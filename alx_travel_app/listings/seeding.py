@@ -0,0 +1,250 @@
+"""
+Synthetic data for benchmarks and query-plan audits (`manage.py seed_data`).
+
+Everything is written with bulk_create in batches, so memory depends on the
+batch size rather than the amount of data. Distributions are skewed the way
+real marketplaces are: a few hosts own many listings, a few cities hold most
+of them, nightly prices are log-normal, stays are mostly short and most past
+bookings are paid. A given --seed always produces the same data.
+"""
+import math
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from .models import BookedNight, Booking, Listing, ListingSearchToken, Payment
+
+User = get_user_model()
+
+CITIES = [
+    "Addis Ababa", "Nairobi", "Kigali", "Mombasa", "Zanzibar", "Cape Town", "Lagos", "Accra",
+    "Dar es Salaam", "Kampala", "Marrakesh", "Cairo", "Dakar", "Lusaka", "Windhoek", "Gondar",
+    "Bahir Dar", "Lalibela", "Arusha", "Musanze", "Entebbe", "Durban", "Victoria Falls", "Hawassa",
+]
+ADJECTIVES = ["Cozy", "Sunny", "Quiet", "Modern", "Rustic", "Spacious", "Charming", "Bright", "Luxury", "Family"]
+KINDS = ["apartment", "studio", "villa", "cottage", "loft", "guesthouse", "bungalow", "cabin", "suite", "townhouse"]
+FEATURES = [
+    "close to the city centre", "with a garden", "with a sea view", "near the market", "with fast wifi",
+    "with a rooftop terrace", "near the lake", "with free parking", "with a fully equipped kitchen",
+    "near the airport", "with a pool", "in a quiet neighbourhood",
+]
+FIRST_NAMES = ["Abebe", "Amina", "Kwame", "Zawadi", "Nia", "Tesfaye", "Imani", "Jabari", "Lulu", "Sefu", "Ayana", "Kofi"]
+LAST_NAMES = ["Bekele", "Mwangi", "Okafor", "Mensah", "Uwase", "Haile", "Ndlovu", "Kamau", "Diallo", "Abebe"]
+# Nights per stay and how common each length is
+STAY_LENGTHS = [1, 2, 3, 4, 5, 6, 7, 10, 14, 21]
+STAY_WEIGHTS = [10, 22, 20, 14, 9, 6, 9, 5, 4, 1]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Lets bulk_create store the created_at/updated_at values given on the
+    instances instead of "now", so seeded history is spread over time.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Seeder:
+    def __init__(self, users, listings, host_ratio=0.1, bookings_per_listing=8, batch_size=2000,
+                 seed=1, password='password123', history_days=365, horizon_days=180, stdout=None):
+        self.users = users
+        self.hosts = max(1, int(users * host_ratio))
+        self.guests = max(1, users - self.hosts)
+        self.listings = listings
+        self.bookings_per_listing = bookings_per_listing
+        self.batch_size = batch_size
+        self.seed = seed
+        self.password = password
+        self.today = date.today()
+        self.history_days = history_days
+        self.horizon_days = horizon_days
+        self.stdout = stdout
+        self.random = random.Random(seed)
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_DNS, f"seed-{seed}.alx-travel-app")
+        # Zipf-like: the n-th city is 1/n as popular as the first
+        self.city_weights = [1 / rank for rank in range(1, len(CITIES) + 1)]
+        self.counts = {'users': 0, 'listings': 0, 'bookings': 0, 'nights': 0, 'payments': 0}
+
+    # Users are addressed by index, so their ids can be recomputed instead of kept in memory
+    def user_id(self, index):
+        return uuid.uuid5(self.namespace, f"user-{index}")
+
+    def email(self, index):
+        return f"user{index}@seed{self.seed}.example.com"
+
+    def new_id(self):
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def moment(self, day):
+        # A timezone-aware time on `day`, never in the future
+        value = timezone.make_aware(datetime.combine(day, time(self.random.randrange(24), self.random.randrange(60))))
+        return min(value, timezone.now())
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def run(self):
+        with explicit_timestamps(User, Listing, Booking, Payment):
+            self.seed_users()
+            self.seed_listings()
+        return self.counts
+
+    def seed_users(self):
+        password = make_password(self.password)  # hashed once; every seeded user shares it
+        for start in range(0, self.users, self.batch_size):
+            batch = []
+            for index in range(start, min(start + self.batch_size, self.users)):
+                joined = self.moment(self.today - timedelta(days=self.random.randrange(3 * 365)))
+                batch.append(User(
+                    user_id=self.user_id(index),
+                    email=self.email(index),
+                    username=f"user{index}",
+                    first_name=self.random.choice(FIRST_NAMES),
+                    last_name=self.random.choice(LAST_NAMES),
+                    role='host' if index < self.hosts else 'guest',
+                    password=password,
+                    date_joined=joined,
+                    created_at=joined,
+                    updated_at=joined,
+                ))
+            User.objects.bulk_create(batch)
+            self.counts['users'] += len(batch)
+            self.log(f"users: {self.counts['users']}/{self.users}")
+
+    def seed_listings(self):
+        for start in range(0, self.listings, self.batch_size):
+            size = min(self.batch_size, self.listings - start)
+            listings = [self.make_listing() for _ in range(size)]
+            bookings, nights, payments = [], [], []
+            for listing in listings:
+                for booking in self.make_bookings(listing):
+                    bookings.append(booking)
+                    if booking.status != 'canceled':
+                        nights.extend(
+                            BookedNight(property_id=listing.pk, booking_id=booking.pk, night=night)
+                            for night in booking.night_dates()
+                        )
+                    payment = self.make_payment(booking)
+                    if payment is not None:
+                        payments.append(payment)
+
+            with transaction.atomic():
+                Listing.objects.bulk_create(listings)
+                ListingSearchToken.objects.bulk_create(
+                    [token for listing in listings for token in listing.build_search_tokens()], batch_size=5000
+                )
+                Booking.objects.bulk_create(bookings, batch_size=5000)
+                BookedNight.objects.bulk_create(nights, batch_size=5000)
+                Payment.objects.bulk_create(payments, batch_size=5000)
+
+            self.counts['listings'] += len(listings)
+            self.counts['bookings'] += len(bookings)
+            self.counts['nights'] += len(nights)
+            self.counts['payments'] += len(payments)
+            self.log(f"listings: {self.counts['listings']}/{self.listings} ({self.counts['bookings']} bookings)")
+
+    def make_listing(self):
+        # Skewed towards low indexes: a few hosts own most listings
+        host = int(self.hosts * self.random.random() ** 1.5)
+        city = self.random.choices(CITIES, weights=self.city_weights)[0]
+        kind = self.random.choice(KINDS)
+        # Log-normal around 60/night, like real nightly rates
+        price = min(max(self.random.lognormvariate(math.log(60), 0.6), 10), 2000)
+        created = self.moment(self.today - timedelta(days=self.history_days + self.random.randrange(2 * 365)))
+        return Listing(
+            property_id=self.new_id(),
+            host_id=self.user_id(host),
+            name=f"{self.random.choice(ADJECTIVES)} {kind} in {city}",
+            description=(
+                f"A {kind} {self.random.choice(FEATURES)} and {self.random.choice(FEATURES)}. "
+                f"Sleeps {self.random.randint(1, 8)}."
+            ),
+            location=city,
+            pricepernight=Decimal(f"{price:.2f}"),
+            created_at=created,
+            updated_at=created,
+        )
+
+    def make_bookings(self, listing):
+        """
+        A timeline of non-overlapping stays from `history_days` ago to
+        `horizon_days` ahead, with exponentially distributed gaps sized so the
+        listing gets about `bookings_per_listing` bookings on average.
+        """
+        span = self.history_days + self.horizon_days
+        mean_stay = sum(n * w for n, w in zip(STAY_LENGTHS, STAY_WEIGHTS)) / sum(STAY_WEIGHTS)
+        # Popularity varies a lot between listings
+        wanted = self.random.expovariate(1 / self.bookings_per_listing) if self.bookings_per_listing else 0
+        if wanted < 0.5:
+            return
+        mean_gap = max(span / wanted - mean_stay, 0.5)
+
+        day = self.today - timedelta(days=self.history_days)
+        end_of_timeline = self.today + timedelta(days=self.horizon_days)
+        while True:
+            day += timedelta(days=int(self.random.expovariate(1 / mean_gap)))
+            nights = self.random.choices(STAY_LENGTHS, weights=STAY_WEIGHTS)[0]
+            end = day + timedelta(days=nights)
+            if end > end_of_timeline:
+                return
+
+            roll = self.random.random()
+            if roll < 0.07:
+                status = 'canceled'
+            elif end <= self.today or roll < 0.65:
+                status = 'confirmed'
+            else:
+                status = 'pending'
+            created = self.moment(min(day - timedelta(days=self.random.randint(1, 60)), self.today))
+            yield Booking(
+                booking_id=self.new_id(),
+                property_id=listing.pk,
+                user_id=self.user_id(self.hosts + self.random.randrange(self.guests)),
+                start_date=day,
+                end_date=end,
+                total_price=listing.pricepernight * nights,
+                status=status,
+                created_at=created,
+                updated_at=created,
+            )
+            day = end
+
+    def make_payment(self, booking):
+        if booking.status == 'canceled':
+            return None
+        roll = self.random.random()
+        if booking.end_date <= self.today:
+            # Nearly every past stay was paid
+            if roll > 0.95:
+                return None
+            status = 'completed' if roll < 0.92 else 'failed'
+        else:
+            status = 'completed' if roll < 0.7 else 'pending'
+        tx_ref = f"seed{self.seed}-{booking.booking_id}"
+        return Payment(
+            payment_id=self.new_id(),
+            booking_id=booking.booking_id,
+            amount=booking.total_price,
+            tx_ref=tx_ref,
+            chapa_transaction_id=f"chapa-{tx_ref}" if status == 'completed' else None,
+            status=status,
+            created_at=booking.created_at,
+            updated_at=booking.created_at,
+        )
@@ -1,10 +1,15 @@
 from rest_framework import serializers
-from .models import Listing, Booking, Payment
+from django.db import IntegrityError
+from .models import Listing, Booking, BookedNight, ExportJob, Payment
+from .analytics import CENT, default_range, nights_in_period
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from datetime import date
 
 User = get_user_model()
 
+BOOKED_DATES_ERROR = "The property is already booked for some of these dates!"
+
 class BookingSerializer(serializers.ModelSerializer):
     property = serializers.PrimaryKeyRelatedField(queryset=Listing.objects.all())
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -17,6 +22,10 @@ class BookingSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def validate(self, data):
+        if self.instance is not None:
+            # Partial updates are checked against the booking as it will be saved
+            data = {**{field: getattr(self.instance, field) for field in ('property', 'start_date', 'end_date')}, **data}
+
         if data['start_date'] < date.today():
             raise serializers.ValidationError("Start date cannot be in the past!")
 
@@ -26,20 +35,130 @@ class BookingSerializer(serializers.ModelSerializer):
         if data['end_date'] < data['start_date']:
             raise serializers.ValidationError("End date cannot be less than start date!")
 
+        # Early, friendly rejection; the unique BookedNight constraint is what
+        # actually settles races between concurrent requests (see create/update)
+        booking = Booking(property=data['property'], start_date=data['start_date'], end_date=data['end_date'])
+        taken = BookedNight.objects.filter(property=data['property'], night__in=booking.night_dates())
+        if self.instance is not None:
+            taken = taken.exclude(booking=self.instance)
+        if data.get('status', getattr(self.instance, 'status', None)) != 'canceled' and taken.exists():
+            raise serializers.ValidationError(BOOKED_DATES_ERROR)
+
         return data
 
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(BOOKED_DATES_ERROR)
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(BOOKED_DATES_ERROR)
+
 class ListingSerializer(serializers.ModelSerializer):
+    """
+    Compact listing "card". Booking data is summarised from annotations added by
+    `Listing.objects.with_booking_summary()`; use `ListingDetailSerializer` for the
+    full list of bookings.
+    """
     host = serializers.PrimaryKeyRelatedField(read_only=True)
-    bookings = BookingSerializer(many=True, read_only=True)
-    created_at = serializers.DateTimeField(format='%Y-%m-%dT%H:%M:%S', read_only=True)
     created_at = serializers.DateTimeField(format='%Y-%m-%dT%H:%M:%S', read_only=True)
+    booking_count = serializers.IntegerField(read_only=True)
+    next_booked_date = serializers.DateField(format="%Y-%m-%d", read_only=True)
+    upcoming_booking_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Listing
         fields = '__all__'
 
+class ListingDetailSerializer(ListingSerializer):
+    bookings = BookingSerializer(many=True, read_only=True)
+
+class ListingImportSerializer(ListingSerializer):
+    """
+    Validates one row of a bulk listing import with the same field rules as the
+    API. Uniqueness of external_id is not checked here (that would cost a query
+    per row); the importer updates the existing listing instead.
+    """
+    external_id = serializers.CharField(max_length=255)
+    host_email = serializers.EmailField(required=False, allow_blank=True)
+
+    class Meta(ListingSerializer.Meta):
+        fields = ['external_id', 'host_email', 'name', 'description', 'location', 'pricepernight']
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
         read_only_fields = ('status', 'tx_ref', 'chapa_transaction_id')
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'export_id', 'dataset', 'file_format', 'status', 'row_count', 'error',
+            'created_at', 'started_at', 'finished_at', 'download_url',
+        ]
+        read_only_fields = ['status', 'row_count', 'error', 'started_at', 'finished_at']
+
+    def get_download_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        url = reverse('export-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ListingStatsQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(choices=['month', 'day'], default='month')
+    start = serializers.DateField(required=False, input_formats=["%Y-%m-%d", "%Y-%m"])
+    end = serializers.DateField(required=False, input_formats=["%Y-%m-%d", "%Y-%m"])
+    listing = serializers.UUIDField(required=False)
+
+    def validate(self, data):
+        default_start, default_end = default_range()
+        data.setdefault('start', default_start)
+        data.setdefault('end', default_end)
+        if data['end'] < data['start']:
+            raise serializers.ValidationError("end cannot be before start!")
+        return data
+
+class ListingStatsSerializer(serializers.Serializer):
+    """
+    One ListingMonthlyStats or ListingDailyStats row, with the dashboard
+    figures derived from it. Pass the granularity in the context.
+    """
+    listing = serializers.UUIDField(source='listing_id')
+    listing_name = serializers.CharField(source='listing.name')
+    period = serializers.SerializerMethodField()
+    booked_nights = serializers.IntegerField()
+    nights_in_period = serializers.SerializerMethodField()
+    occupancy_rate = serializers.SerializerMethodField()
+    revenue = serializers.DecimalField(source='paid_revenue', max_digits=14, decimal_places=2)
+    booked_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    average_nightly_price = serializers.SerializerMethodField()
+
+    def period_start(self, obj):
+        return obj.month if self.context['granularity'] == 'month' else obj.day
+
+    def get_period(self, obj):
+        if self.context['granularity'] == 'month':
+            return obj.month.strftime("%Y-%m")
+        return obj.day.strftime("%Y-%m-%d")
+
+    def get_nights_in_period(self, obj):
+        return nights_in_period(self.period_start(obj), self.context['granularity'])
+
+    def get_occupancy_rate(self, obj):
+        return round(obj.booked_nights / self.get_nights_in_period(obj), 4)
+
+    def get_average_nightly_price(self, obj):
+        if not obj.booked_nights:
+            return None
+        return str((obj.booked_revenue / obj.booked_nights).quantize(CENT))
@@ -0,0 +1,28 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .analytics import queue_refresh_for_bookings, queue_refresh_for_release
+from .cache import bump_listings_version
+from .models import Booking, Listing, Payment
+
+
+@receiver([post_save, post_delete], sender=Listing)
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_listing_cache(sender, instance, **kwargs):
+    listing_id = instance.pk if sender is Listing else instance.property_id
+    # After commit, so a concurrent read cannot cache pre-commit data under the new version
+    transaction.on_commit(partial(bump_listings_version, listing_id))
+
+
+@receiver(pre_delete, sender=Booking)
+def release_booking_stats(sender, instance, **kwargs):
+    queue_refresh_for_release(instance)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def refresh_payment_stats(sender, instance, created=False, **kwargs):
+    # A new payment is pending and changes no revenue; verification queues its own refresh
+    if not created or instance.status == 'completed':
+        queue_refresh_for_bookings([instance.booking_id])
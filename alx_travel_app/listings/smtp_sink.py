@@ -0,0 +1,84 @@
+"""
+A local SMTP server that accepts and discards every message, for benchmarks
+(the SMTP counterpart of listings.fake_chapa).
+
+    with SMTPSink() as sink:
+        with override_settings(EMAIL_HOST=sink.host, EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+            ...
+"""
+import threading
+import time
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+
+class SMTPSinkHandler(StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 sink ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250-sink")
+                self.reply("250 SIZE 52428800")
+            elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.read_message()
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.messages_received += 1
+                self.reply("250 OK queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def read_message(self):
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                return
+
+
+class SMTPSink(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0):
+        super().__init__((host, port), SMTPSinkHandler)
+        # Seconds to wait before accepting each message
+        self.latency = latency
+        self.messages_received = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,7 +1,9 @@
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.cache import cache
 from django.conf import settings
-from .models import Payment, Booking
+from .models import Payment
+from .chapa import ChapaError, ChapaUnavailable, get_chapa_client, release_webhook
+from .emails import EmailBuffer, booking_confirmation, mailer, payment_confirmation
 
 
 @shared_task
@@ -10,52 +12,28 @@ def send_payment_confirmation_email(user_email, payment_id):
     Sends a confirmation email to the user after a successful payment (HTML + plain fallback).
     """
     try:
-        payment = Payment.objects.get(payment_id=payment_id)
+        payment = Payment.objects.select_related('booking__user').get(payment_id=payment_id)
     except Payment.DoesNotExist:
         return f"Payment with ID {payment_id} not found"
 
-    subject = "Payment Confirmation"
-
-    # Plain text fallback
-    message = (
-        f"Hello {payment.booking.user.first_name},\n\n"
-        f"Your payment for booking {payment.booking.booking_id} has been successfully processed.\n"
-        f"Amount Paid: {payment.amount} USD.\n"
-        f"Transaction Reference: {payment.tx_ref}.\n"
-        f"Chapa Transaction ID: {payment.chapa_transaction_id}.\n\n"
-        "Thank you for your payment!\n\n"
-        "Best regards,\n"
-        "Your Booking Team"
-    )
-
-    # HTML version
-    html_message = f"""
-    <html>
-        <body>
-            <h2 style="color:#2E86C1;">Payment Confirmation</h2>
-            <p>Hello <strong>{payment.booking.user.first_name}</strong>,</p>
-            <p>Your payment for booking <strong>{payment.booking.booking_id}</strong> has been successfully processed.</p>
-            <ul>
-                <li><b>Amount Paid:</b> {payment.amount} USD</li>
-                <li><b>Transaction Reference:</b> {payment.tx_ref}</li>
-                <li><b>Chapa Transaction ID:</b> {payment.chapa_transaction_id}</li>
-            </ul>
-            <p>Thank you for your payment!</p>
-            <p>Best regards,<br>Your Booking Team</p>
-        </body>
-    </html>
+    mailer.send([payment_confirmation(payment, to=user_email)])
+
+    return f"Confirmation email sent to {user_email}"
+
+
+@shared_task
+def send_payment_confirmation_emails(payment_ids):
     """
+    Sends payment confirmations for many payments: one joined query for the
+    data and batched sends over the worker's SMTP connection.
+    """
+    payments = Payment.objects.select_related('booking__user').filter(payment_id__in=payment_ids)
 
-    send_mail(
-        subject,
-        message,  # plain text fallback
-        settings.DEFAULT_FROM_EMAIL,
-        [user_email],
-        fail_silently=False,
-        html_message=html_message  # HTML email
-    )
+    with EmailBuffer() as buffer:
+        for payment in payments:
+            buffer.add(payment_confirmation(payment))
 
-    return f"Confirmation email sent to {user_email}"
+    return f"{buffer.sent} payment confirmation emails sent"
 
 
 @shared_task
@@ -63,30 +41,90 @@ def send_booking_confirmation_email(user_email, booking_id):
     """
     Sends a booking confirmation email (HTML + plain fallback).
     """
-    subject = "Booking Confirmation"
-
-    # Plain text fallback
-    message = f"Your booking with ID {booking_id} has been successfully created!"
-
-    # HTML version
-    html_message = f"""
-    <html>
-        <body>
-            <h2 style="color:#27AE60;">Booking Confirmation</h2>
-            <p>Your booking with ID <strong>{booking_id}</strong> has been successfully created!</p>
-            <p>We look forward to serving you.</p>
-            <p>Best regards,<br>Your Booking Team</p>
-        </body>
-    </html>
+    mailer.send([booking_confirmation(user_email, booking_id)])
+
+    return f"Confirmation email sent to {user_email} for booking {booking_id}"
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def verify_payment(self, tx_ref):
+    """
+    Verifies a payment with Chapa after a webhook notification. Safe to run any
+    number of times: completed payments are skipped and the confirmation email
+    is only queued by the run that completes the payment. A run that cannot
+    settle the payment releases the webhook's dedup key, so Chapa's next
+    notification is not dropped as a duplicate.
     """
+    try:
+        payment = Payment.objects.select_related('booking__user').get(tx_ref=tx_ref)
+    except Payment.DoesNotExist:
+        release_webhook(tx_ref)
+        return f"Payment with tx_ref {tx_ref} not found"
 
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user_email],
-        fail_silently=False,
-        html_message=html_message  # HTML email
-    )
+    if payment.status == 'completed':
+        return f"Payment {tx_ref} already completed"
 
-    return f"Confirmation email sent to {user_email} for booking {booking_id}"
+    try:
+        _, data = get_chapa_client().verify(tx_ref)
+    except ChapaUnavailable as error:
+        if self.request.retries >= self.max_retries:
+            release_webhook(tx_ref)
+        raise self.retry(exc=error)
+    except ChapaError as error:
+        release_webhook(tx_ref)
+        return f"Could not verify payment {tx_ref}: {error}"
+
+    if data.get('status') != 'success':
+        release_webhook(tx_ref)
+        return f"Chapa could not verify payment {tx_ref}: {data.get('message')}"
+
+    chapa_data = data['data']
+    if payment.record_verification(chapa_data['status'], chapa_data.get('reference')):
+        send_payment_confirmation_email.delay(payment.booking.user.email, str(payment.payment_id))
+    elif payment.status == 'pending':
+        # Not settled at Chapa yet: let its next notification verify again
+        release_webhook(tx_ref)
+
+    return f"Payment {tx_ref} is {payment.status}"
+
+
+@shared_task
+def reconcile_pending_payments():
+    """
+    Periodic (Celery beat) sweep that settles payments still pending because the
+    user never came back through the callback. See listings.reconciliation.
+    """
+    from .reconciliation import reconcile_pending_payments as reconcile
+
+    # One sweep at a time; an overlapping beat tick just skips
+    lock_timeout = settings.PAYMENT_RECONCILE_MAX_SECONDS + 60
+    if not cache.add("payments:reconcile:lock", 1, lock_timeout):
+        return {"skipped": True}
+    try:
+        return reconcile()
+    finally:
+        cache.delete("payments:reconcile:lock")
+
+
+@shared_task
+def run_export(export_id):
+    """
+    Writes a booking or payment export file. See listings.exports.
+    """
+    from .exports import run_export as export
+
+    job = export(export_id)
+    return f"Export {export_id} {job.status}: {job.row_count} rows"
+
+
+@shared_task
+def refresh_listing_stats(listing_id, months):
+    """
+    Recomputes one listing's analytics summaries for the given months
+    (ISO dates of their first days). See listings.analytics.
+    """
+    from datetime import date
+    from .analytics import refresh_listing_stats as refresh
+
+    nights = refresh(listing_id, [date.fromisoformat(month) for month in months])
+    return f"Listing {listing_id}: {nights} booked nights in {len(months)} months"
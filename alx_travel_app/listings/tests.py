@@ -1,3 +1,1754 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import hmac
+import json
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, nullcontext
+from io import StringIO
+from pathlib import Path
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, include, path
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from users.authentication import get_cached_user
+from users.blacklist import blacklist_filter
+from users.urls import build_urlpatterns as build_auth_urlpatterns
+from .cache import LISTINGS_VERSION_KEY, listing_version_key
+from .chapa import AsyncChapaClient, ChapaClient, ChapaUnavailable, CircuitBreaker, get_async_chapa_client
+from .fake_chapa import FakeChapaServer
+from .benchmarks import BenchmarkSuite
+from .importers import ListingImporter, read_rows
+from .metrics import fingerprint, registry
+from .models import (
+    Booking, BookedNight, ExportJob, Listing, ListingDailyStats, ListingMonthlyStats, ListingSearchToken, OutboxMessage,
+    Payment, TaskCheckpoint,
+)
+from . import analytics, emails, exports, outbox, reconciliation, replicas
+from .search import listing_token_weights, tokenize
+from .tasks import (
+    refresh_listing_stats, send_booking_confirmation_email, send_payment_confirmation_emails, verify_payment
+)
+from .urls import build_urlpatterns
 
-# Create your tests here.
+User = get_user_model()
+
+# ROOT_URLCONF for AsyncViewTests: the API as served with ASYNC_VIEWS on
+urlpatterns = [
+    path('api/', include(build_urlpatterns(async_views=True))),
+    path('api/auth/', include(build_auth_urlpatterns(async_views=True))),
+]
+
+SAVEPOINT = re.compile(r"^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b", re.IGNORECASE)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Fires many overlapping bookings for one listing at the same time; the unique
+    BookedNight constraint must let exactly one of them through.
+
+    Needs a file-backed test database (TEST['NAME']): in-memory SQLite shares
+    one cache between threads and fails concurrent writers with "database
+    table is locked" instead of waiting for the lock.
+    """
+    workers = 20
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("concurrent writers need a file-backed test database")
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        self.listing = Listing.objects.create(
+            host=host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        self.guests = [
+            User.objects.create_user(f"guest{i}@example.com", "guest", password="password123")
+            for i in range(self.workers)
+        ]
+
+    def book(self, guest, start_offset, barrier, results):
+        client = APIClient()
+        client.force_authenticate(guest)
+        start_date = date.today() + timedelta(days=10 + start_offset)
+        payload = {
+            "property": str(self.listing.pk),
+            "start_date": start_date.isoformat(),
+            "end_date": (start_date + timedelta(days=3)).isoformat(),
+            "total_price": "300.00",
+        }
+        barrier.wait()
+        try:
+            # Never retried: a create that raised may still have committed
+            results.append(client.post("/api/bookings/", payload, format="json").status_code)
+        except OperationalError:
+            # Write contention the database gave up waiting on
+            results.append("locked")
+        finally:
+            connection.close()
+
+    def test_exactly_one_overlapping_booking_wins(self):
+        barrier = threading.Barrier(self.workers)
+        results = []
+        threads = [
+            # Staggered start dates so every pair of requests overlaps on at least one night
+            threading.Thread(target=self.book, args=(guest, i % 3, barrier, results))
+            for i, guest in enumerate(self.guests)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.workers)
+        self.assertLessEqual(set(results), {201, 400, "locked"})
+        self.assertLessEqual(results.count(201), 1)
+        # The committed state is what counts: one booking holding its three nights
+        booking = Booking.objects.get(property=self.listing)
+        self.assertEqual(
+            sorted(BookedNight.objects.filter(property=self.listing).values_list('booking', flat=True)),
+            [booking.pk] * 3,
+        )
+        # Only the winning booking's confirmation email was recorded for sending
+        self.assertEqual(OutboxMessage.objects.filter(task_name=send_booking_confirmation_email.name).count(), 1)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every endpoint in listings/urls.py and users/urls.py runs within a fixed
+    number of SQL statements. List endpoints are checked at two page sizes and
+    with several bookings per listing, so an N+1 always blows the budget;
+    failures list the statements run, grouped by fingerprint.
+    """
+    # Every URL name in listings/urls.py and users/urls.py; a new endpoint needs a budget test
+    BUDGETED_ROUTES = {
+        'api-root', 'booking-list', 'booking-detail', 'listing-list', 'listing-detail', 'export-list',
+        'export-detail', 'export-download', 'initiate', 'verify', 'chapa-webhook', 'listing-analytics',
+        'register', 'login', 'logout', 'update', 'delete', 'token_refresh',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        cls.staff = User.objects.create_user(
+            "staff@example.com", "admin", password="password123", is_staff=True
+        )
+        cls.listings = [
+            Listing.objects.create(
+                host=cls.host, name=f"Beach house {i}", description="By the sea", location="Mombasa",
+                pricepernight=100 + i,
+            )
+            for i in range(3)
+        ]
+        cls.bookings = []
+        for i, listing in enumerate(cls.listings):
+            for j in range(4):
+                start = date.today() + timedelta(days=10 + j * 5)
+                booking = Booking.objects.create(
+                    property=listing, user=cls.guest, start_date=start, end_date=start + timedelta(days=2),
+                    total_price=200,
+                )
+                Payment.objects.create(booking=booking, amount=200, tx_ref=f"budget-{i}-{j}")
+                cls.bookings.append(booking)
+        for listing in cls.listings:
+            for month in range(1, 4):
+                ListingMonthlyStats.objects.create(
+                    listing=listing, month=date(date.today().year, month, 1), booked_nights=5,
+                    booked_revenue=500, paid_revenue=400,
+                )
+        cls.exports = [
+            ExportJob.objects.create(requested_by=cls.host, dataset='bookings', file_format='csv')
+            for _ in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+            # Budgets are for the steady state, where the user is already cached
+            get_cached_user(user.pk)
+        return client
+
+    def assertQueryBudget(self, budget, method, path, user=None, status=200, **kwargs):
+        client = self.client_for(user)
+        if 'content_type' not in kwargs:
+            kwargs['format'] = 'json'
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(db)) for db in connections.all()]
+            response = getattr(client, method)(path, **kwargs)
+        self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+
+        # Savepoints come from the test transaction wrapping every atomic block
+        statements = [
+            query['sql'] for context in captured for query in context.captured_queries
+            if not SAVEPOINT.match(query['sql'])
+        ]
+        if len(statements) > budget:
+            counts = Counter(fingerprint(sql) for sql in statements)
+            self.fail(
+                f"{method.upper()} {path} ran {len(statements)} queries (budget {budget}):\n"
+                + "\n".join(f"  {count} x {sql}" for sql, count in counts.most_common())
+            )
+        return response
+
+    def test_every_endpoint_has_a_budget(self):
+        names = set()
+        for urlconf in ('listings.urls', 'users.urls'):
+            pending = list(get_resolver(urlconf).url_patterns)
+            while pending:
+                pattern = pending.pop()
+                if isinstance(pattern, URLResolver):
+                    pending.extend(pattern.url_patterns)
+                elif pattern.name:
+                    names.add(pattern.name)
+        self.assertEqual(names - self.BUDGETED_ROUTES, set())
+
+    def test_api_root(self):
+        self.assertQueryBudget(0, 'get', '/api/')
+
+    def test_listings(self):
+        for page_size in (1, 50):
+            self.assertQueryBudget(1, 'get', f'/api/listings/?page_size={page_size}')
+            self.assertQueryBudget(1, 'get', f'/api/listings/?page_size={page_size}', user=self.guest)
+            self.assertQueryBudget(2, 'get', f'/api/listings/?page_size={page_size}&expand=bookings', user=self.guest)
+            self.assertQueryBudget(2, 'get', f'/api/listings/?page_size={page_size}&page=1', user=self.guest)
+            self.assertQueryBudget(2, 'get', f'/api/listings/?page_size={page_size}&q=beach', user=self.guest)
+            start = date.today() + timedelta(days=1)
+            self.assertQueryBudget(
+                1, 'get', f'/api/listings/?page_size={page_size}&available_from={start}'
+                f'&available_to={start + timedelta(days=3)}', user=self.guest,
+            )
+
+    def test_listing_detail(self):
+        path = f'/api/listings/{self.listings[0].pk}/'
+        self.assertQueryBudget(1, 'get', path)
+        self.assertQueryBudget(1, 'get', path, user=self.guest)
+        self.assertQueryBudget(2, 'get', f'{path}?expand=bookings', user=self.guest)
+        self.assertQueryBudget(4, 'patch', path, user=self.host, data={'name': "Renamed"})
+        self.assertQueryBudget(4, 'put', path, user=self.host, data={
+            'name': "Renamed", 'description': "By the sea", 'location': "Malindi", 'pricepernight': "120.00",
+        })
+        self.assertQueryBudget(12, 'delete', path, user=self.host, status=204)
+
+    def test_listing_create(self):
+        self.assertQueryBudget(3, 'post', '/api/listings/', user=self.host, status=201, data={
+            'name': "Hill cabin", 'description': "Quiet", 'location': "Gondar", 'pricepernight': "80.00",
+        })
+
+    def test_bookings(self):
+        for page_size in (1, 50):
+            self.assertQueryBudget(1, 'get', f'/api/bookings/?page_size={page_size}', user=self.guest)
+            self.assertQueryBudget(1, 'get', f'/api/bookings/?page_size={page_size}&status=pending', user=self.guest)
+
+        start = date.today() + timedelta(days=100)
+        self.assertQueryBudget(8, 'post', '/api/bookings/', user=self.guest, status=201, data={
+            'property': str(self.listings[0].pk), 'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=3)).isoformat(), 'total_price': "300.00",
+        })
+
+    def test_booking_detail(self):
+        booking = self.bookings[0]
+        path = f'/api/bookings/{booking.pk}/'
+        self.assertQueryBudget(1, 'get', path, user=self.guest)
+        self.assertQueryBudget(8, 'patch', path, user=self.guest, data={'status': 'confirmed'})
+        start = date.today() + timedelta(days=200)
+        self.assertQueryBudget(9, 'put', path, user=self.guest, data={
+            'property': str(booking.property_id), 'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=5)).isoformat(), 'total_price': "500.00",
+        })
+        self.assertQueryBudget(6, 'delete', path, user=self.guest, status=204)
+
+    def test_payments(self):
+        with FakeChapaServer() as chapa, override_settings(
+            CHAPA_BASE_URL=chapa.url, CHAPA_SECRET_KEY="test", CHAPA_WEBHOOK_SECRET="secret"
+        ):
+            start = date.today() + timedelta(days=300)
+            unpaid = Booking.objects.create(
+                property=self.listings[0], user=self.guest, start_date=start, end_date=start + timedelta(days=2),
+                total_price=200,
+            )
+            self.assertQueryBudget(2, 'post', f'/api/payments/{unpaid.pk}/initiate/', user=self.guest)
+            self.assertQueryBudget(6, 'get', '/api/payments/verify/budget-0-0/')
+            # Already completed: answered without asking Chapa again
+            self.assertQueryBudget(1, 'get', '/api/payments/verify/budget-0-0/')
+
+            body = json.dumps({'tx_ref': 'budget-0-1'}).encode()
+            signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+            self.assertQueryBudget(
+                1, 'post', '/api/payments/webhook/', data=body, content_type='application/json',
+                headers={'x-chapa-signature': signature},
+            )
+
+    def test_analytics(self):
+        start = date(date.today().year, 1, 1)
+        for page_size in (1, 50):
+            self.assertQueryBudget(2, 'get', f'/api/analytics/listings/?page_size={page_size}&start={start}', user=self.host)
+            self.assertQueryBudget(2, 'get', f'/api/analytics/listings/?page_size={page_size}&start={start}', user=self.staff)
+
+    def test_exports(self):
+        self.assertQueryBudget(1, 'get', '/api/exports/', user=self.host)
+        self.assertQueryBudget(1, 'get', f'/api/exports/{self.exports[0].pk}/', user=self.host)
+        self.assertQueryBudget(2, 'post', '/api/exports/', user=self.host, status=201, data={
+            'dataset': 'payments', 'file_format': 'ndjson',
+        })
+
+    def test_export_download(self):
+        job = self.exports[0]
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            job.status = 'completed'
+            job.file.save('budget.csv', ContentFile(b"booking_id\n"))
+            response = self.assertQueryBudget(1, 'get', f'/api/exports/{job.pk}/download/', user=self.host)
+            self.assertEqual(b"".join(response.streaming_content), b"booking_id\n")
+
+    @override_settings(TOKEN_BLACKLIST_FILTER=True)
+    def test_users(self):
+        self.assertQueryBudget(2, 'post', '/api/auth/register/', status=201, data={
+            'email': "new@example.com", 'password': "password123", 'first_name': "New", 'last_name': "User",
+            'role': "guest",
+        })
+        self.assertQueryBudget(2, 'post', '/api/auth/login/', data={
+            'email': "guest@example.com", 'password': "password123",
+        })
+        self.assertQueryBudget(3, 'put', '/api/auth/update/', user=self.guest, data={'first_name': "Renamed"})
+
+        refresh = RefreshToken.for_user(self.guest)
+        blacklist_filter.rebuild()
+        self.assertQueryBudget(8, 'post', '/api/auth/token/refresh/', data={'refresh': str(refresh)})
+        self.assertQueryBudget(
+            4, 'post', '/api/auth/logout/', user=self.guest, status=205, data={'refresh': str(RefreshToken.for_user(self.guest))}
+        )
+        self.assertQueryBudget(13, 'delete', '/api/auth/delete/', user=self.guest, status=204)
+
+    def test_model_strings_run_no_queries(self):
+        booking = Booking.objects.get(pk=self.bookings[0].pk)
+        payment = Payment.objects.get(booking=booking)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                str(booking),
+                f"{self.guest.pk} booked {self.listings[0].pk} from {booking.start_date} to {booking.end_date}",
+            )
+            self.assertEqual(str(payment), f"Payment for booking {booking.pk} - pending")
+
+
+class CachedReadTests(TestCase):
+    """
+    Anonymous listing reads come from the versioned response cache until a
+    listing or booking change commits; authenticated reads skip it. While one
+    request rebuilds an entry, the others answer from the previous copy, or
+    wait a bounded time for the rebuild when there is none.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.listing = Listing.objects.create(
+            host=cls.host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, response):
+        return [listing['name'] for listing in response.json()['results']]
+
+    def test_second_read_is_a_hit(self):
+        self.assertEqual(self.client.get('/api/listings/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/listings/')
+        self.assertEqual((response['X-Cache'], self.names(response)), ('HIT', ["Beach house"]))
+        # Another query string is another entry
+        self.assertEqual(self.client.get('/api/listings/?ordering=name')['X-Cache'], 'MISS')
+
+    def test_changes_invalidate_on_commit(self):
+        self.client.get('/api/listings/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.listing.name = "Lake cabin"
+            self.listing.save()
+        # Until the change commits, other requests cannot see it anyway
+        self.assertEqual(self.client.get('/api/listings/')['X-Cache'], 'HIT')
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get('/api/listings/')
+        self.assertEqual((response['X-Cache'], self.names(response)), ('MISS', ["Lake cabin"]))
+
+    def test_authenticated_reads_skip_the_cache(self):
+        client = APIClient()
+        client.force_authenticate(self.host)
+        for _ in range(2):
+            self.assertFalse(client.get('/api/listings/').has_header('X-Cache'))
+        self.assertEqual(self.client.get('/api/listings/')['X-Cache'], 'MISS')
+
+    def test_rebuild_in_progress_serves_the_previous_copy(self):
+        detail = f'/api/listings/{self.listing.pk}/'
+        listed = self.client.get('/api/listings/')
+        self.client.get(detail)
+        self.listing.name = "Lake cabin"
+        self.listing.save()
+        cache.set(LISTINGS_VERSION_KEY, time.time_ns(), None)
+
+        # Another request holds the rebuild: answer at once from the old copy
+        with mock.patch('listings.cache.single_flight', lambda key: nullcontext(False)):
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/listings/')
+            self.assertEqual((response['X-Cache'], self.names(response)), ('STALE', ["Beach house"]))
+            # A list's ETag describes the rows it was sent with
+            self.assertEqual(response['ETag'], listed['ETag'])
+
+            response = self.client.get(detail)
+            self.assertEqual((response['X-Cache'], response.json()['name']), ('STALE', "Beach house"))
+            # Not the listing's current version
+            self.assertFalse(response.has_header('ETag'))
+
+        response = self.client.get('/api/listings/')
+        self.assertEqual((response['X-Cache'], self.names(response)), ('MISS', ["Lake cabin"]))
+        self.assertNotEqual(response['ETag'], listed['ETag'])
+
+    def test_cold_key_waits_for_the_rebuild(self):
+        keys = []
+        leader_result = {'next': None, 'previous': None, 'results': [{'name': "Built by the leader"}]}
+
+        def follow(key):
+            keys.append(key)
+            return nullcontext(False)
+
+        # No copy to serve: the follower polls until the leader's result lands
+        with mock.patch('listings.cache.single_flight', follow), \
+                mock.patch('listings.cache.time.sleep', lambda seconds: cache.set(keys[-1], leader_result)):
+            with self.assertNumQueries(0):
+                response = self.client.get('/api/listings/')
+        self.assertEqual((response['X-Cache'], self.names(response)), ('HIT', ["Built by the leader"]))
+
+    @override_settings(LISTING_CACHE_LOCK_TIMEOUT=0.1)
+    def test_follower_builds_the_response_when_the_rebuild_takes_too_long(self):
+        with mock.patch('listings.cache.single_flight', lambda key: nullcontext(False)):
+            response = self.client.get('/api/listings/')
+        self.assertEqual((response['X-Cache'], self.names(response)), ('MISS', ["Beach house"]))
+
+class ConditionalGetTests(TestCase):
+    """
+    A listing's detail is validated by that listing's data version and today's
+    date, so revalidating costs no query and only a change to the listing or
+    its bookings, or a new day, gives a new ETag. Lists are validated by a
+    hash of their rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        cls.listing = Listing.objects.create(
+            host=cls.host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        cls.other = Listing.objects.create(
+            host=cls.host, name="Lake cabin", description="By the lake", location="Kisumu", pricepernight=80
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.detail = f'/api/listings/{self.listing.pk}/'
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, headers={'If-None-Match': etag}).status_code
+
+    def book(self, listing):
+        start = date.today() + timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                property=listing, user=self.guest, start_date=start, end_date=start + timedelta(days=2),
+                total_price=200
+            )
+
+    def test_revalidation_runs_no_query(self):
+        etag = self.client.get(self.detail)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(self.detail, etag), 304)
+        etag = self.client.get('/api/listings/')['ETag']
+        with self.assertNumQueries(0):  # the list comes from the response cache
+            self.assertEqual(self.revalidate('/api/listings/', etag), 304)
+
+    def test_detail_etag_only_changes_with_its_listing(self):
+        etag = self.client.get(self.detail)['ETag']
+        self.book(self.other)
+        self.assertEqual(self.revalidate(self.detail, etag), 304)
+
+        self.book(self.listing)
+        self.assertEqual(self.revalidate(self.detail, etag), 200)
+        etag = self.client.get(self.detail)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.save()
+        self.assertEqual(self.revalidate(self.detail, etag), 200)
+
+        etag = self.client.get(self.detail)['ETag']
+        tomorrow = date.today() + timedelta(days=1)
+        with mock.patch('listings.conditional.date', wraps=date) as patched:
+            patched.today.return_value = tomorrow
+            self.assertEqual(self.revalidate(self.detail, etag), 200)
+
+    def test_list_etag_changes_with_its_rows(self):
+        filtered = '/api/listings/?location=Kisumu'
+        etag = self.client.get(filtered)['ETag']
+        # Invalidates the response cache, but not this list's rows
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.save()
+        self.assertEqual(self.revalidate(filtered, etag), 304)
+
+        self.book(self.other)
+        self.assertEqual(self.revalidate(filtered, etag), 200)
+
+
+class ChapaClientTests(SimpleTestCase):
+    """
+    The Chapa clients fail fast through a circuit breaker while Chapa is
+    failing, retry verify but never initialize, and reject calls past the
+    bulkhead without counting them against Chapa.
+    """
+
+    def setUp(self):
+        self.chapa = FakeChapaServer().start()
+        self.addCleanup(self.chapa.stop)
+
+    def chapa_client(self, **kwargs):
+        return ChapaClient(self.chapa.url, "test", backoff_factor=0, **{'retries': 0, **kwargs})
+
+    def async_call(self, call, **kwargs):
+        # A client per call, as each async_to_sync call runs on a loop of its own
+        async def run():
+            client = AsyncChapaClient(self.chapa.url, "test", CircuitBreaker(5, 30), backoff_factor=0, **kwargs)
+            try:
+                return await call(client)
+            finally:
+                await client.aclose()
+        return async_to_sync(run)()
+
+    def expire(self, breaker):
+        breaker.opened_at -= breaker.reset_timeout
+
+    def test_breaker_opens_then_lets_one_trial_through(self):
+        client = self.chapa_client(failure_threshold=3, reset_timeout=30)
+        self.chapa.failure_rate = 1
+        for _ in range(3):
+            with self.assertRaisesMessage(ChapaUnavailable, "HTTP 503"):
+                client.verify("tx-1")
+        with self.assertRaisesMessage(ChapaUnavailable, "temporarily unavailable"):
+            client.verify("tx-1")
+        self.assertEqual(self.chapa.requests_served, 3)
+
+        # Half-open: a failed trial opens the circuit again at once
+        self.expire(client.breaker)
+        with self.assertRaisesMessage(ChapaUnavailable, "HTTP 503"):
+            client.verify("tx-1")
+        with self.assertRaisesMessage(ChapaUnavailable, "temporarily unavailable"):
+            client.verify("tx-1")
+        self.assertEqual(self.chapa.requests_served, 4)
+
+        # Only one of two simultaneous calls is the trial; its success closes the circuit
+        self.expire(client.breaker)
+        self.chapa.failure_rate = 0
+        self.chapa.latency = 0.2
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(client.verify("tx-1")[0])
+            except ChapaUnavailable:
+                outcomes.append("rejected")
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(outcomes, key=str), [200, "rejected"])
+        self.assertFalse(client.breaker.is_open)
+        self.assertEqual(client.verify("tx-1")[0], 200)
+
+    def test_initialize_is_never_retried(self):
+        self.chapa.failure_rate = 1
+        payload = {"tx_ref": "tx-1", "amount": "100"}
+        with self.assertRaises(ChapaUnavailable):
+            self.chapa_client(retries=2).initialize(payload)
+        self.assertEqual(self.chapa.requests_served, 1)
+        with self.assertRaises(ChapaUnavailable):
+            self.chapa_client(retries=2).verify("tx-1")
+        self.assertEqual(self.chapa.requests_served, 1 + 3)
+
+        with self.assertRaises(ChapaUnavailable):
+            self.async_call(lambda client: client.initialize(payload), retries=2)
+        self.assertEqual(self.chapa.requests_served, 4 + 1)
+        with self.assertRaises(ChapaUnavailable):
+            self.async_call(lambda client: client.verify("tx-1"), retries=2)
+        self.assertEqual(self.chapa.requests_served, 5 + 3)
+
+    def test_full_bulkhead_leaves_the_breaker_alone(self):
+        client = self.chapa_client(max_concurrency=1, bulkhead_timeout=0.01, failure_threshold=1)
+        client._bulkhead.acquire()
+        with self.assertRaisesMessage(ChapaUnavailable, "Too many payment requests"):
+            client.verify("tx-1")
+        self.assertEqual((client.breaker.failures, client.breaker.is_open), (0, False))
+
+        # A trial call turned away by the bulkhead is not used up
+        client.breaker.record_failure()
+        self.expire(client.breaker)
+        with self.assertRaisesMessage(ChapaUnavailable, "Too many payment requests"):
+            client.verify("tx-1")
+        client._bulkhead.release()
+        self.assertEqual(client.verify("tx-1")[0], 200)
+        self.assertEqual(self.chapa.requests_served, 1)
+
+        async def verify_while_full(client):
+            await client._bulkhead.acquire()
+            try:
+                await client.verify("tx-1")
+            finally:
+                self.assertEqual(client.breaker.failures, 0)
+
+        with self.assertRaisesMessage(ChapaUnavailable, "Too many payment requests"):
+            self.async_call(verify_while_full, max_concurrency=1, bulkhead_timeout=0.01)
+
+
+@override_settings(CHAPA_WEBHOOK_SECRET="secret")
+class ChapaWebhookTests(TestCase):
+    """
+    Notifications must carry a valid HMAC signature. One verification per
+    tx_ref is queued at a time; a verification that cannot settle the payment
+    lets the next notification through.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        listing = Listing.objects.create(
+            host=host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        start = date.today() + timedelta(days=10)
+        booking = Booking.objects.create(
+            property=listing, user=guest, start_date=start, end_date=start + timedelta(days=2), total_price=200
+        )
+        cls.payment = Payment.objects.create(booking=booking, amount=200, tx_ref="tx-webhook")
+
+    def setUp(self):
+        cache.clear()
+
+    def notify(self, signature=None, sign_with=b"secret"):
+        body = json.dumps({'tx_ref': self.payment.tx_ref}).encode()
+        if signature is None and sign_with is not None:
+            signature = hmac.new(sign_with, body, hashlib.sha256).hexdigest()
+        headers = {'x-chapa-signature': signature} if signature else {}
+        return self.client.post('/api/payments/webhook/', body, content_type='application/json', headers=headers)
+
+    def queued(self):
+        return OutboxMessage.objects.filter(task_name=verify_payment.name).count()
+
+    def test_signature_is_checked(self):
+        self.assertEqual(self.notify(sign_with=None).status_code, 401)
+        self.assertEqual(self.notify(sign_with=b"wrong").status_code, 401)
+        self.assertEqual(self.notify(signature="0" * 64).status_code, 401)
+        self.assertEqual(self.queued(), 0)
+
+        response = self.notify()
+        self.assertEqual((response.status_code, response.json()), (200, {'status': 'queued'}))
+        self.assertEqual(self.queued(), 1)
+
+    def test_duplicates_are_dropped_until_verification_fails(self):
+        self.notify()
+        self.assertEqual(self.notify().json(), {'status': 'duplicate'})
+
+        gateway = mock.Mock()
+        gateway.verify.return_value = (400, {'status': 'failed', 'message': "Invalid transaction"})
+        with mock.patch('listings.tasks.get_chapa_client', return_value=gateway):
+            verify_payment.apply(args=[self.payment.tx_ref])
+        self.assertEqual(self.notify().json(), {'status': 'queued'})
+
+        with FakeChapaServer() as chapa, override_settings(CHAPA_BASE_URL=chapa.url, CHAPA_SECRET_KEY="test"):
+            verify_payment.apply(args=[self.payment.tx_ref])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.notify().json(), {'status': 'duplicate'})
+        self.assertEqual(self.queued(), 2)
+
+
+class AvailabilityFilterTests(TestCase):
+    """
+    `?available_from=&available_to=` (check-in and check-out) keeps listings
+    with no booked night in the stay; check-out days are free, and canceled
+    bookings hold no nights.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        listing = lambda name: Listing.objects.create(
+            host=host, name=name, description="By the sea", location="Mombasa", pricepernight=100
+        )
+        cls.booked, cls.canceled, cls.free = listing("Booked"), listing("Canceled"), listing("Free")
+        # Nights 10 and 11, checking out on day 12
+        for listing, status in ((cls.booked, "confirmed"), (cls.canceled, "canceled")):
+            Booking.objects.create(
+                property=listing, user=guest, start_date=cls.day(10), end_date=cls.day(12),
+                total_price=200, status=status
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def day(offset):
+        return date.today() + timedelta(days=offset)
+
+    def available(self, start, end):
+        response = self.client.get(
+            '/api/listings/', {'available_from': self.day(start), 'available_to': self.day(end)}
+        )
+        self.assertEqual(response.status_code, 200)
+        return {listing['name'] for listing in response.json()['results']}
+
+    def test_overlapping_stays_exclude_the_listing(self):
+        everything = {"Booked", "Canceled", "Free"}
+        for start, end, expected in [
+            (8, 10, everything),  # checks out as the booking checks in
+            (8, 11, everything - {"Booked"}),  # overlaps the check-in night
+            (11, 13, everything - {"Booked"}),  # overlaps the last night
+            (12, 14, everything),  # checks in on the booking's check-out day
+            (9, 13, everything - {"Booked"}),  # covers the whole booking
+        ]:
+            with self.subTest(start=start, end=end):
+                self.assertEqual(self.available(start, end), expected)
+
+    def test_canceling_frees_the_nights(self):
+        booking = Booking.objects.get(property=self.booked)
+        booking.status = "canceled"
+        booking.save()
+        self.assertIn("Booked", self.available(10, 12))
+
+    def test_both_ends_of_the_range_are_required(self):
+        for params in (
+            {'available_from': self.day(10)},
+            {'available_to': self.day(12)},
+            {'available_from': self.day(12), 'available_to': self.day(10)},
+            {'available_from': self.day(10), 'available_to': self.day(10)},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/listings/', params).status_code, 400)
+
+
+class RangeFilterTests(TestCase):
+    """
+    Listing and booking range filters include both bounds, status takes a set
+    of values, and unparseable or reversed values are a 400.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        listings = [
+            Listing.objects.create(
+                host=host, name=name, description="By the sea", location="Mombasa", pricepernight=price
+            )
+            for name, price in (("Cheap", 80), ("Middle", 100), ("Dear", 150))
+        ]
+        cls.created = timezone.now() - timedelta(days=30)
+        cls.bookings = []
+        for i, status in enumerate(("pending", "confirmed", "canceled")):
+            start = AvailabilityFilterTests.day(10 * (i + 1))
+            booking = Booking.objects.create(
+                property=listings[i], user=cls.guest, start_date=start, end_date=start + timedelta(days=2),
+                total_price=100 * (i + 1), status=status
+            )
+            Booking.objects.filter(pk=booking.pk).update(created_at=cls.created + timedelta(days=i))
+            cls.bookings.append(booking)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def listing_names(self, **params):
+        response = self.client.get('/api/listings/', params)
+        self.assertEqual(response.status_code, 200)
+        return {listing['name'] for listing in response.json()['results']}
+
+    def booking_indexes(self, params):
+        response = self.client.get('/api/bookings/', params)
+        self.assertEqual(response.status_code, 200)
+        ids = [booking['booking_id'] for booking in response.json()['results']]
+        return {i for i, booking in enumerate(self.bookings) if str(booking.pk) in ids}
+
+    def test_listing_price_range_is_inclusive(self):
+        self.assertEqual(self.listing_names(price_min=80, price_max=100), {"Cheap", "Middle"})
+        self.assertEqual(self.listing_names(price_min=100), {"Middle", "Dear"})
+        self.assertEqual(self.listing_names(price_max=100), {"Cheap", "Middle"})
+
+    def test_booking_ranges(self):
+        day = AvailabilityFilterTests.day
+        for params, expected in [
+            ({'price_min': 100, 'price_max': 200}, {0, 1}),
+            ({'price_min': 200, 'price_max': 200}, {1}),
+            ({'start_date_after': day(10), 'start_date_before': day(20)}, {0, 1}),
+            ({'end_date_after': day(22)}, {1, 2}),
+            ({'end_date_before': day(22)}, {0, 1}),
+            # created_before is exclusive, so consecutive windows never share a row
+            ({'created_after': self.created, 'created_before': self.created + timedelta(days=1)}, {0}),
+            ({'created_after': self.created + timedelta(days=1)}, {1, 2}),
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.booking_indexes(params), expected)
+
+    def test_booking_status_takes_a_set(self):
+        self.assertEqual(self.booking_indexes({'status': 'confirmed'}), {1})
+        self.assertEqual(self.booking_indexes({'status': ['pending', 'canceled']}), {0, 2})
+
+    def test_invalid_values_are_rejected(self):
+        for path, params in [
+            ('/api/listings/', {'price_min': 'cheap'}),
+            ('/api/listings/', {'created_after': 'yesterday'}),
+            ('/api/listings/', {'price_min': 150, 'price_max': 80}),
+            ('/api/bookings/', {'start_date_after': '2024-02-30'}),
+            ('/api/bookings/', {'end_date_before': 'soon'}),
+            ('/api/bookings/', {'start_date_after': AvailabilityFilterTests.day(20),
+                                'start_date_before': AvailabilityFilterTests.day(10)}),
+            ('/api/bookings/', {'status': 'lost'}),
+        ]:
+            with self.subTest(path=path, params=params):
+                self.assertEqual(self.client.get(path, params).status_code, 400)
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3)
+class OutboxRelayTests(TestCase):
+    """
+    Tasks recorded in the outbox are published only if their transaction
+    commits, exactly once, and a message that cannot be published does not
+    hold up the ones after it.
+    """
+
+    def setUp(self):
+        patcher = mock.patch('listings.outbox.current_app')
+        self.send_task = patcher.start().send_task
+        self.addCleanup(patcher.stop)
+
+    def enqueue(self, booking_id):
+        return outbox.enqueue(send_booking_confirmation_email, "guest@example.com", booking_id)
+
+    def test_rolled_back_messages_are_never_sent(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.enqueue("booking-1")
+            raise RuntimeError("the booking failed")
+        self.assertEqual(outbox.relay_batch(), 0)
+        self.send_task.assert_not_called()
+
+    def test_committed_message_is_sent_once(self):
+        message = self.enqueue("booking-1")
+        self.assertEqual(outbox.relay_batch(), 1)
+        self.send_task.assert_called_once_with(
+            send_booking_confirmation_email.name, args=["guest@example.com", "booking-1"], kwargs={}
+        )
+        message.refresh_from_db()
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual(outbox.relay_batch(), 0)
+        self.assertEqual(self.send_task.call_count, 1)
+
+    def test_failing_message_does_not_block_the_rest(self):
+        messages = [self.enqueue(f"booking-{i}") for i in range(3)]
+
+        def publish(name, args, kwargs):
+            if args[1] == "booking-1":
+                raise ValueError("cannot serialize")
+
+        self.send_task.side_effect = publish
+        with self.assertLogs('listings.outbox', 'WARNING'):
+            self.assertEqual(outbox.relay_batch(), 2)
+        for message in messages:
+            message.refresh_from_db()
+        self.assertEqual([message.sent_at is not None for message in messages], [True, False, True])
+        self.assertEqual((messages[1].attempts, messages[1].last_error), (1, "cannot serialize"))
+
+        # Retried by later batches until OUTBOX_MAX_ATTEMPTS, then left alone
+        with self.assertLogs('listings.outbox', 'WARNING'):
+            outbox.relay_batch()
+            outbox.relay_batch()
+        self.assertEqual(outbox.relay_batch(), 0)
+        self.assertEqual(OutboxMessage.objects.get(pk=messages[1].pk).attempts, 3)
+        self.assertEqual(self.send_task.call_count, 5)
+
+    def test_command_relays_everything_pending(self):
+        for i in range(3):
+            self.enqueue(f"booking-{i}")
+        out = StringIO()
+        call_command("relay_outbox", "--once", "--batch-size", "2", stdout=out)
+        self.assertIn("Relayed 3 outbox messages.", out.getvalue())
+        self.assertFalse(OutboxMessage.objects.filter(sent_at__isnull=True).exists())
+
+
+class ListingStatsMaintenanceTests(TestCase):
+    """
+    Booking and payment changes queue refreshes of just the listing-months
+    they touch; once those run, the summaries match a rebuild from scratch.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        cls.listing = Listing.objects.create(
+            host=cls.host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+
+    def book(self, start, nights, total_price, **kwargs):
+        return Booking.objects.create(
+            property=self.listing, user=self.guest, start_date=start, end_date=start + timedelta(days=nights),
+            total_price=total_price, **kwargs
+        )
+
+    def run_queued_refreshes(self):
+        queued = OutboxMessage.objects.filter(task_name=refresh_listing_stats.name, sent_at__isnull=True)
+        for message in queued:
+            refresh_listing_stats(*message.args, **message.kwargs)
+        queued.update(sent_at=timezone.now())
+
+    def stats(self):
+        return (
+            list(ListingMonthlyStats.objects.filter(listing=self.listing).order_by('month').values_list(
+                'month', 'booked_nights', 'booked_revenue', 'paid_revenue'
+            )),
+            list(ListingDailyStats.objects.filter(listing=self.listing).order_by('day').values_list(
+                'day', 'booked_nights', 'booked_revenue', 'paid_revenue'
+            )),
+        )
+
+    def test_incremental_refreshes_match_a_rebuild(self):
+        new_year = date(date.today().year + 1, 1, 1)
+        # Two nights in December, one in January
+        spanning = self.book(new_year - timedelta(days=2), 3, 300)
+        moved = self.book(new_year + timedelta(days=40), 2, 250)
+        canceled = self.book(new_year + timedelta(days=60), 2, 200)
+        payment = Payment.objects.create(booking=spanning, amount=300, tx_ref="tx-spanning")
+        self.run_queued_refreshes()
+
+        # Rescheduled into another month, canceled, paid
+        moved.start_date, moved.end_date = new_year + timedelta(days=10), new_year + timedelta(days=13)
+        moved.save()
+        canceled.status = "canceled"
+        canceled.save()
+        payment.record_verification("success")
+        self.run_queued_refreshes()
+        incremental = self.stats()
+
+        ListingMonthlyStats.objects.all().delete()
+        ListingDailyStats.objects.all().delete()
+        analytics.refresh_listing_stats(self.listing.pk)
+        self.assertEqual(incremental, self.stats())
+
+        december = date(new_year.year - 1, 12, 1)
+        self.assertEqual(incremental[0], [
+            (december, 2, Decimal("200.00"), Decimal("200.00")),
+            (new_year, 1 + 3, Decimal("100.00") + Decimal("250.00"), Decimal("100.00")),
+        ])
+
+
+class ListingImporterTests(TestCase):
+    """
+    Imports create listings, update the one with the same external_id, report
+    bad rows without stopping, and write nothing in a dry run.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.other_host = User.objects.create_user("other@example.com", "host", password="password123")
+        cls.existing = Listing.objects.create(
+            host=cls.host, external_id="ext-1", name="Beach house", description="By the sea",
+            location="Mombasa", pricepernight=100
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def rows(self):
+        return read_rows(StringIO(
+            "external_id,host_email,name,description,location,pricepernight\n"
+            "ext-1,other@example.com,Lake cabin,By the lake,Kisumu,80\n"
+            "ext-2,,Mountain lodge,Up high,Nanyuki,120\n"
+            "ext-3,,No price,Nowhere,Nairobi,cheap\n"
+            "ext-4,nobody@example.com,Orphan,No host,Nairobi,50\n"
+        ), 'csv')
+
+    def test_rows_are_created_updated_or_reported(self):
+        version = cache.get(LISTINGS_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            report = ListingImporter(default_host=self.host, chunk_size=2).run(self.rows())
+
+        self.assertEqual((report.rows, report.created, report.updated, report.invalid), (4, 1, 1, 2))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.existing.refresh_from_db()
+        self.assertEqual(
+            (self.existing.name, self.existing.location, self.existing.host), ("Lake cabin", "Kisumu", self.other_host)
+        )
+        created = Listing.objects.get(external_id="ext-2")
+        self.assertEqual((created.host, created.pricepernight), (self.host, 120))
+        self.assertFalse(Listing.objects.filter(external_id__in=["ext-3", "ext-4"]).exists())
+        # Bulk writes are re-indexed for search and invalidate cached responses
+        self.assertTrue(ListingSearchToken.objects.filter(listing=self.existing, token="kisumu").exists())
+        self.assertFalse(ListingSearchToken.objects.filter(listing=self.existing, token="mombasa").exists())
+        self.assertTrue(ListingSearchToken.objects.filter(listing=created, token="nanyuki").exists())
+        self.assertNotEqual(cache.get(LISTINGS_VERSION_KEY), version)
+
+    def test_dry_run_writes_nothing(self):
+        cache.set(LISTINGS_VERSION_KEY, 1, None)
+        report = ListingImporter(default_host=self.host, dry_run=True).run(self.rows())
+
+        self.assertEqual((report.created, report.updated, report.invalid), (1, 1, 2))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, "Beach house")
+        self.assertFalse(Listing.objects.filter(external_id="ext-2").exists())
+        self.assertEqual(cache.get(LISTINGS_VERSION_KEY), 1)
+
+
+class ListingSearchTests(TestCase):
+    """
+    `?q=` matches listings through the token index, which Listing.save keeps
+    current, and ranks name matches above location and description matches.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        listing = lambda name, description, location: Listing.objects.create(
+            host=host, name=name, description=description, location=location, pricepernight=100
+        )
+        cls.beach = listing("Beach house", "By the sea", "Mombasa")
+        cls.villa = listing("Mombasa villa", "A quiet place", "Kilifi")
+        cls.cabin = listing("Cabin", "Off the Mombasa road", "Nakuru")
+        cls.lodge = listing("Lodge", "Up high", "Nanyuki")
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/listings/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [listing['property_id'] for listing in response.json()['results']]
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("The Beach-House, a 2 B&B in MOMBASA!"), ["beach", "house", "mombasa"])
+        self.assertEqual(tokenize("x" * 100), ["x" * 64])
+        self.assertEqual(tokenize(None), [])
+
+    def test_repeated_terms_stop_counting(self):
+        self.lodge.description = "lodge " * 20
+        self.assertEqual(listing_token_weights(self.lodge)["lodge"], 5 + 5)
+
+    def test_results_are_ranked_by_where_terms_match(self):
+        self.assertEqual(self.search("mombasa"), [str(self.villa.pk), str(self.beach.pk), str(self.cabin.pk)])
+        self.assertEqual(self.search("Mombasa beach")[0], str(self.beach.pk))
+        self.assertEqual(self.search("the of"), [])
+        self.assertEqual(self.search("nowhere"), [])
+
+    def test_saving_a_listing_reindexes_it(self):
+        self.lodge.name = "Safari lodge"
+        self.lodge.location = "Maasai Mara"
+        self.lodge.save()
+        self.assertEqual(self.search("safari mara"), [str(self.lodge.pk)])
+        self.assertEqual(self.search("nanyuki"), [])
+        self.assertEqual(
+            set(ListingSearchToken.objects.filter(listing=self.lodge).values_list("token", flat=True)),
+            {"safari", "lodge", "maasai", "mara", "up", "high"},
+        )
+
+
+@override_settings(PAYMENT_RECONCILE_MIN_AGE=0)
+class PaymentReconciliationTests(TestCase):
+    """
+    The sweep settles payments Chapa reports as succeeded, failed or cancelled,
+    leaves the ones still in progress pending, and resumes an interrupted run
+    from its checkpoint.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        listing = Listing.objects.create(
+            host=host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        created = timezone.now() - timedelta(hours=1)
+        cls.payments = []
+        for i in range(6):
+            start = date.today() + timedelta(days=10 + 3 * i)
+            booking = Booking.objects.create(
+                property=listing, user=guest, start_date=start, end_date=start + timedelta(days=2), total_price=200
+            )
+            cls.payments.append(Payment.objects.create(booking=booking, amount=200, tx_ref=f"tx-{i}"))
+            # Distinct, ordered creation times: the sweep order
+            Payment.objects.filter(pk=cls.payments[-1].pk).update(created_at=created + timedelta(seconds=i))
+
+    def setUp(self):
+        emails = mock.patch('listings.tasks.send_payment_confirmation_emails.delay')
+        emails.start()
+        self.addCleanup(emails.stop)
+
+    def statuses(self):
+        return [payment.status for payment in Payment.objects.order_by('created_at')]
+
+    def test_only_settled_statuses_change_a_payment(self):
+        chapa = {
+            "tx-0": ("success", "ref-0"), "tx-1": ("failed", None), "tx-2": ("cancelled", None),
+            "tx-3": ("pending", None), "tx-4": ("processing", None), "tx-5": None,
+        }
+        with mock.patch('listings.reconciliation.fetch_chapa_status', side_effect=chapa.get):
+            metrics = reconciliation.reconcile_pending_payments(batch_size=10)
+
+        self.assertEqual(
+            self.statuses(), ["completed", "failed", "failed", "pending", "pending", "pending"]
+        )
+        self.assertEqual((metrics['completed'], metrics['failed'], metrics['unresolved']), (1, 2, 3))
+        self.assertEqual(Payment.objects.get(tx_ref="tx-0").chapa_transaction_id, "ref-0")
+        self.assertFalse(self.payments[3].record_verification("pending"))
+        self.assertEqual(Payment.objects.get(tx_ref="tx-3").status, "pending")
+
+    def test_interrupted_run_resumes_from_the_checkpoint(self):
+        asked = []
+
+        def chapa_down_after_one_batch(tx_ref):
+            asked.append(tx_ref)
+            if len(asked) > 2:
+                raise ChapaUnavailable("Chapa is down")
+            return "success", None
+
+        with mock.patch('listings.reconciliation.fetch_chapa_status', side_effect=chapa_down_after_one_batch), \
+                self.assertLogs('listings.reconciliation', 'WARNING'):
+            metrics = reconciliation.reconcile_pending_payments(batch_size=2, concurrency=1)
+        self.assertEqual((metrics['batches'], metrics['finished']), (1, False))
+        self.assertEqual(
+            TaskCheckpoint.objects.get(name=reconciliation.CHECKPOINT_NAME).position['payment_id'],
+            str(self.payments[1].pk),
+        )
+
+        asked.clear()
+        with mock.patch('listings.reconciliation.fetch_chapa_status', side_effect=lambda tx_ref: asked.append(tx_ref)):
+            metrics = reconciliation.reconcile_pending_payments(batch_size=2, concurrency=1)
+        # Picks up after the last batch it finished, then resets for the next sweep
+        self.assertEqual(asked, ["tx-2", "tx-3", "tx-4", "tx-5"])
+        self.assertEqual((metrics['batches'], metrics['finished']), (2, True))
+        self.assertEqual(TaskCheckpoint.objects.get(name=reconciliation.CHECKPOINT_NAME).position, {})
+        self.assertEqual(self.statuses()[:2], ["completed", "completed"])
+
+
+class ExportTests(TestCase):
+    """
+    Export files hold the requester's rows in either format, are read in
+    keyset batches on MySQL, and never appear half-written.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        other_host = User.objects.create_user("other@example.com", "host", password="password123")
+        guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        listing = Listing.objects.create(
+            host=cls.host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        other = Listing.objects.create(
+            host=other_host, name="Cabin", description="In the woods", location="Nakuru", pricepernight=80
+        )
+        cls.bookings = []
+        for i, place in enumerate([listing, listing, listing, other]):
+            start = date.today() + timedelta(days=10 + 3 * i)
+            booking = Booking.objects.create(
+                property=place, user=guest, start_date=start, end_date=start + timedelta(days=2), total_price=200
+            )
+            Payment.objects.create(booking=booking, amount=200, tx_ref=f"tx-{i}", status='completed')
+            cls.bookings.append(booking)
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media_root = media_root.name
+
+    def export(self, dataset, file_format):
+        job = ExportJob.objects.create(requested_by=self.host, dataset=dataset, file_format=file_format)
+        return exports.run_export(job.pk)
+
+    def read(self, job):
+        with job.file.open('r') as stream:
+            text = stream.read()
+        if job.file_format == 'csv':
+            header, *rows = csv.reader(StringIO(text))
+            return header, [dict(zip(header, row)) for row in rows]
+        rows = [json.loads(line) for line in text.splitlines()]
+        return list(rows[0]), rows
+
+    def test_every_dataset_and_format(self):
+        first = self.bookings[0]
+        samples = {
+            'bookings': {
+                'booking_id': str(first.booking_id), 'listing_name': "Beach house",
+                'host_email': "host@example.com", 'guest_email': "guest@example.com",
+                'start_date': first.start_date.isoformat(), 'total_price': "200.00", 'status': "pending",
+            },
+            'payments': {
+                'booking_id': str(first.booking_id), 'listing_name': "Beach house",
+                'guest_email': "guest@example.com", 'amount': "200.00", 'tx_ref': "tx-0", 'status': "completed",
+            },
+        }
+        for dataset, sample in samples.items():
+            for file_format in ('csv', 'ndjson'):
+                with self.subTest(dataset=dataset, file_format=file_format):
+                    job = self.export(dataset, file_format)
+
+                    self.assertEqual(job.status, 'completed')
+                    self.assertEqual(job.row_count, 3)
+                    header, rows = self.read(job)
+                    self.assertEqual(header, [name for name, _ in exports.COLUMNS[dataset]])
+                    # Only rows on the requester's own listings
+                    self.assertEqual(len(rows), 3)
+                    row = next(row for row in rows if row['booking_id'] == str(first.booking_id))
+                    self.assertEqual({name: row[name] for name in sample}, sample)
+
+    def test_failed_export_leaves_no_file(self):
+        def fail_midway(job, stream, rows):
+            stream.write("booking_id\n")
+            raise OperationalError("connection lost")
+
+        with mock.patch('listings.exports.write_rows', fail_midway), self.assertLogs('listings.exports', 'ERROR'):
+            with self.assertRaises(OperationalError):
+                self.export('bookings', 'csv')
+
+        job = ExportJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, "connection lost")
+        self.assertFalse(job.file)
+        self.assertEqual(list(Path(self.media_root, "exports").iterdir()), [])
+
+    def test_rows_are_streamed_in_chunks(self):
+        queryset = Booking.objects.all()
+        expected = sorted(booking.pk for booking in self.bookings)
+
+        # SQLite streams from one query
+        with CaptureQueriesContext(connection) as queries:
+            rows = [row.pk for row in exports.stream_rows(queryset, chunk_size=3)]
+        self.assertEqual(rows, expected)
+        self.assertEqual(len(queries), 1)
+
+        # MySQL buffers whole results, so it reads primary-key keyset batches
+        mysql = mock.MagicMock()
+        mysql.__getitem__.return_value.vendor = 'mysql'
+        with mock.patch('listings.exports.connections', mysql), CaptureQueriesContext(connection) as queries:
+            rows = [row.pk for row in exports.stream_rows(queryset, chunk_size=3)]
+        self.assertEqual(rows, expected)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"booking_id" >', queries[0]['sql'])
+        self.assertIn('"booking_id" >', queries[1]['sql'])
+
+
+class QueryPlanAuditTests(TestCase):
+    """
+    audit_query_plans runs and explains the queries of every endpoint and job
+    it covers.
+    """
+
+    PROBES = [
+        "GET /api/listings/",
+        "GET /api/listings/?price_min&price_max",
+        "GET /api/listings/?ordering=pricepernight",
+        "GET /api/listings/?available_from&available_to",
+        "GET /api/listings/?q",
+        "GET /api/listings/<id>/?expand=bookings",
+        "GET /api/bookings/",
+        "GET /api/bookings/?status&start_date_after",
+        "GET /api/bookings/<id>/",
+        "GET /api/exports/",
+        "GET /api/analytics/listings/",
+        "Payment lookup by tx_ref (verify, webhook)",
+        "Login lookup by email",
+        "Payment reconciliation batch",
+        "Outbox relay batch",
+        "Admin listing list",
+        "Admin booking list",
+        "Admin payment list",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        listing = Listing.objects.create(
+            host=host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        start = date.today() + timedelta(days=10)
+        booking = Booking.objects.create(
+            property=listing, user=guest, start_date=start, end_date=start + timedelta(days=2), total_price=200
+        )
+        Payment.objects.create(booking=booking, amount=200, tx_ref="tx-audit")
+
+    def setUp(self):
+        cache.clear()
+
+    def audit(self, *args):
+        out = StringIO()
+        call_command('audit_query_plans', *args, stdout=out, no_color=True)
+        return out.getvalue()
+
+    def test_every_probe_is_explained(self):
+        output = self.audit('--verbosity', '2')
+
+        reported = dict(re.findall(r"^(\S.*) \((\d+) queries\)$", output, re.MULTILINE))
+        self.assertEqual(list(reported), self.PROBES)
+        for name, count in reported.items():
+            with self.subTest(probe=name):
+                self.assertGreater(int(count), 0)
+        self.assertIn("SEARCH", output)
+        self.assertRegex(output, r"(No full table scans\.|\d+ full table scans found\.)\n$")
+
+    def test_nothing_is_written(self):
+        counts = [model.objects.count() for model in (Listing, Booking, Payment, OutboxMessage)]
+        self.audit()
+        self.assertEqual([model.objects.count() for model in (Listing, Booking, Payment, OutboxMessage)], counts)
+
+    def test_needs_a_listing_and_a_booking(self):
+        Booking.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "Needs at least one listing and one booking"):
+            self.audit()
+
+
+class MetricsTests(TestCase):
+    """
+    MetricsMiddleware records every request per route, and /metrics serves
+    the histograms only to scrapers holding METRICS_TOKEN.
+    """
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def scrape(self, **headers):
+        return self.client.get('/metrics', headers=headers)
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_requests_are_recorded(self):
+        self.client.get('/api/')
+        self.client.get('/api/')
+        self.client.get('/no-such-page/')
+
+        response = self.scrape(authorization="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="api-root",status="2xx"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{method="GET",route="api-root",status="2xx",le="0"} 2', body)
+        self.assertIn('http_response_size_bytes_count{method="GET",route="unmatched",status="4xx"} 1', body)
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_scrapers_need_the_token(self):
+        for headers in ({}, {'authorization': "Bearer wrong"}, {'authorization': "scrape-token-2"}):
+            with self.subTest(headers=headers):
+                response = self.scrape(**headers)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        self.assertEqual(self.scrape(authorization="Bearer scrape-token").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_hidden_without_a_token(self):
+        self.assertEqual(self.scrape().status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.scrape().status_code, 200)
+
+
+class EmailDeliveryTests(TestCase):
+    """
+    Confirmation emails are rendered from the templates and sent in batches
+    over one connection, kept open across tasks.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.guest = User.objects.create_user(
+            "guest@example.com", "guest", password="password123", first_name="Amina"
+        )
+        listing = Listing.objects.create(
+            host=host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        cls.payments = []
+        for i in range(5):
+            start = date.today() + timedelta(days=10 + 3 * i)
+            booking = Booking.objects.create(
+                property=listing, user=cls.guest, start_date=start, end_date=start + timedelta(days=2),
+                total_price=200
+            )
+            cls.payments.append(Payment.objects.create(
+                booking=booking, amount=200, tx_ref=f"tx-{i}", chapa_transaction_id=f"chapa-{i}"
+            ))
+
+    def setUp(self):
+        # Start every test without the connection an earlier one left open
+        emails.mailer.close()
+        self.addCleanup(emails.mailer.close)
+        opened = mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.open', autospec=True, return_value=True
+        )
+        self.open = opened.start()
+        self.addCleanup(opened.stop)
+
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    def test_batched_sends_share_one_connection(self):
+        payment_ids = [str(payment.pk) for payment in self.payments]
+        with mock.patch.object(emails.Mailer, '_send_batch', autospec=True,
+                               side_effect=emails.Mailer._send_batch) as send_batch:
+            with self.assertNumQueries(1):
+                result = send_payment_confirmation_emails(payment_ids)
+
+        self.assertEqual(result, "5 payment confirmation emails sent")
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual([len(call.args[1]) for call in send_batch.call_args_list], [2, 2, 1])
+        self.assertEqual(self.open.call_count, 1)
+
+        # The next task reuses the open connection
+        send_booking_confirmation_email("guest@example.com", "booking-1")
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(self.open.call_count, 1)
+
+    def test_messages_are_rendered(self):
+        payment = self.payments[0]
+        send_payment_confirmation_emails([str(payment.pk)])
+
+        message, = mail.outbox
+        self.assertEqual(message.subject, "Payment Confirmation")
+        self.assertEqual(message.to, ["guest@example.com"])
+        self.assertIn("Hello Amina,", message.body)
+        self.assertIn(f"Your payment for booking {payment.booking_id} has been", message.body)
+        self.assertIn("Transaction Reference: tx-0.", message.body)
+        html, mimetype = message.alternatives[0]
+        self.assertEqual(mimetype, "text/html")
+        self.assertIn("<strong>Amina</strong>", html)
+        self.assertIn("<b>Chapa Transaction ID:</b> chapa-0", html)
+
+    @override_settings(EMAIL_CONNECTION_MAX_IDLE=30)
+    def test_idle_connection_is_replaced(self):
+        send_booking_confirmation_email("guest@example.com", "booking-1")
+        emails.mailer.last_used -= 31
+        send_booking_confirmation_email("guest@example.com", "booking-2")
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.open.call_count, 2)
+        self.assertIn("booking-2", mail.outbox[1].body)
+
+
+class CursorPaginationTests(TestCase):
+    """
+    Cursors key on every ordering field plus the primary key, so walking the
+    pages of a non-unique ordering returns each row exactly once, both ways.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user("host@example.com", "host", password="password123")
+        Listing.objects.bulk_create([
+            Listing(host=host, name=f"Cabin {i}", description="In the woods", location="Nakuru",
+                    pricepernight=120 if i % 5 else 80)
+            for i in range(23)
+        ])
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([listing['property_id'] for listing in response.json()['results']])
+            url = response.json()[link]
+        return pages
+
+    def test_every_page_of_a_non_unique_ordering(self):
+        for ordering in ('pricepernight', '-pricepernight'):
+            with self.subTest(ordering=ordering):
+                pages = self.walk(f'/api/listings/?ordering={ordering}&page_size=4', 'next')
+                ids = [pk for page in pages for pk in page]
+                expected = Listing.objects.order_by(ordering, ordering.replace('pricepernight', 'pk'))
+                self.assertEqual(ids, [str(pk) for pk in expected.values_list('pk', flat=True)])
+                self.assertEqual(len(pages), 6)
+
+                # And back again from the last page
+                last = self.client.get(f'/api/listings/?ordering={ordering}&page_size=4').json()
+                while last['next']:
+                    last = self.client.get(last['next']).json()
+                back = self.walk(last['previous'], 'previous')
+                self.assertEqual([pk for page in reversed(back) for pk in page], ids[:-len(last['results'])])
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        cursor = self.client.get('/api/listings/?page_size=4').json()['next'].split('cursor=')[1]
+        self.assertEqual(self.client.get(f'/api/listings/?page_size=4&cursor={cursor}').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/listings/?ordering=name&cursor={cursor}').status_code, 404)
+        self.assertEqual(self.client.get('/api/listings/?cursor=not-a-cursor').status_code, 404)
+
+
+class AsyncViewTests(TestCase):
+    """
+    With ASYNC_VIEWS, listing reads and the payment views run on the event
+    loop through the ASGI handler, answering like the sync views with the
+    same queries, and one loop holds many Chapa calls at once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user("host@example.com", "host", password="password123")
+        cls.guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        cls.listings = [
+            Listing.objects.create(
+                host=cls.host, name=f"Beach house {i}", description="By the sea", location="Mombasa",
+                pricepernight=100 + i,
+            )
+            for i in range(3)
+        ]
+        start = date.today() + timedelta(days=10)
+        cls.booking = Booking.objects.create(
+            property=cls.listings[0], user=cls.guest, start_date=start, end_date=start + timedelta(days=2),
+            total_price=200,
+        )
+        cls.auth = {'Authorization': f"Bearer {RefreshToken.for_user(cls.guest).access_token}"}
+
+    def setUp(self):
+        cache.clear()
+
+    def async_get(self, path, **kwargs):
+        with override_settings(ROOT_URLCONF='listings.tests'):
+            return async_to_sync(self.async_client.get)(path, **kwargs)
+
+    def test_listing_reads_match_the_sync_views(self):
+        detail = f'/api/listings/{self.listings[0].pk}/'
+        for path in ('/api/listings/', '/api/listings/?page_size=1&expand=bookings', '/api/listings/?q=beach',
+                     detail, f'{detail}?expand=bookings'):
+            for headers in ({}, self.auth):
+                with self.subTest(path=path, authenticated=bool(headers)):
+                    with CaptureQueriesContext(connection) as sync_queries:
+                        expected = self.client.get(path, headers=headers)
+                    cache.clear()
+                    with self.assertNumQueries(len(sync_queries)):
+                        response = self.async_get(path, headers=headers)
+                    cache.clear()
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), expected.json())
+
+        etag = self.async_get(detail, headers=self.auth)['ETag']
+        self.assertEqual(self.async_get(detail, headers={'If-None-Match': etag, **self.auth}).status_code, 304)
+
+    def test_anonymous_reads_are_served_from_the_cache(self):
+        self.assertEqual(self.async_get('/api/listings/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.async_get('/api/listings/')['X-Cache'], 'HIT')
+
+    def test_payments(self):
+        with FakeChapaServer() as chapa, override_settings(
+            CHAPA_BASE_URL=chapa.url, CHAPA_SECRET_KEY="test", ROOT_URLCONF='listings.tests'
+        ):
+            response = async_to_sync(self.async_client.post)(
+                f'/api/payments/{self.booking.pk}/initiate/', headers=self.auth
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            tx_ref = response.json()['tx_ref']
+
+            response = async_to_sync(self.async_client.get)(f'/api/payments/verify/{tx_ref}/')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.json()['status'], 'completed')
+
+        self.assertEqual(Payment.objects.get(tx_ref=tx_ref).status, 'completed')
+        self.assertEqual(OutboxMessage.objects.filter(task_name='listings.tasks.send_payment_confirmation_email').count(), 1)
+
+    def test_one_event_loop_holds_many_gateway_calls(self):
+        async def verify_all():
+            client = get_async_chapa_client()
+            return await asyncio.gather(*(client.verify(f"tx-{i}") for i in range(20)))
+
+        with FakeChapaServer(latency=0.2) as chapa, override_settings(CHAPA_BASE_URL=chapa.url, CHAPA_SECRET_KEY="test"):
+            started = time.monotonic()
+            results = async_to_sync(verify_all)()
+            elapsed = time.monotonic() - started
+
+        self.assertEqual([status_code for status_code, _ in results], [200] * 20)
+        # One at a time, 20 calls would take 4 seconds
+        self.assertLess(elapsed, 1.5)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Listing and stats reads go to a replica; a user who has just written reads
+    from the primary until the pin expires. The replica is a second connection
+    to the test database, as a TEST MIRROR is with REPLICA_DATABASE_URLS set.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered in this thread only, as the test client runs here
+        default = connections['default']
+        connections['replica'] = type(default)({**default.settings_dict}, alias='replica')
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user("host@example.com", "host", password="password123")
+        self.guest = User.objects.create_user("guest@example.com", "guest", password="password123")
+        self.listing = Listing.objects.create(
+            host=self.host, name="Beach house", description="By the sea", location="Mombasa", pricepernight=100
+        )
+        ListingMonthlyStats.objects.create(
+            listing=self.listing, month=date.today().replace(day=1), booked_nights=5, booked_revenue=500,
+            paid_revenue=400,
+        )
+
+    def settle_listings(self):
+        # As if the replica had had time to apply the last change
+        settled = time.time_ns() - 60 * 10 ** 9
+        cache.set_many({LISTINGS_VERSION_KEY: settled, listing_version_key(self.listing.pk): settled}, None)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def databases_used(self, client, method, path, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(client, method)(path, format='json', **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return [alias for alias, queries in (('default', primary), ('replica', replica)) if queries]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.databases_used(APIClient(), 'get', '/api/listings/'), ['replica'])
+        self.assertEqual(self.databases_used(APIClient(), 'get', f'/api/listings/{self.listing.pk}/'), ['replica'])
+        self.assertEqual(self.databases_used(self.client_for(self.host), 'get', '/api/analytics/listings/'), ['replica'])
+
+    def test_writer_reads_from_the_primary_until_the_pin_expires(self):
+        guest = self.client_for(self.guest)
+        start = date.today() + timedelta(days=10)
+        self.databases_used(guest, 'post', '/api/bookings/', data={
+            "property": str(self.listing.pk),
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=2)).isoformat(),
+            "total_price": "200.00",
+        })
+        self.assertEqual(self.databases_used(guest, 'get', '/api/listings/'), ['default'])
+        self.assertEqual(self.databases_used(self.client_for(self.host), 'get', '/api/listings/'), ['replica'])
+
+        cache.delete(replicas.pin_key(self.guest.pk))
+        self.assertEqual(self.databases_used(guest, 'get', '/api/listings/'), ['replica'])
+
+    def test_fresh_replica_reads_are_not_cached(self):
+        # The listing was just created: a replica may not have it yet
+        detail = f'/api/listings/{self.listing.pk}/'
+        for _ in range(2):
+            self.assertEqual(APIClient().get('/api/listings/')['X-Cache'], 'MISS')
+            response = APIClient().get(detail)
+            self.assertEqual(response['X-Cache'], 'MISS')
+            self.assertFalse(response.has_header('ETag'))
+
+        self.settle_listings()
+        self.assertEqual(APIClient().get('/api/listings/')['X-Cache'], 'MISS')
+        self.assertEqual(APIClient().get('/api/listings/')['X-Cache'], 'HIT')
+        self.assertEqual(APIClient().get(detail)['X-Cache'], 'MISS')
+        response = APIClient().get(detail)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_reads_after_a_write_in_the_same_request_use_the_primary(self):
+        router = replicas.ReplicaRouter()
+        token = replicas.begin()
+        try:
+            replicas.route_reads_to_replica()
+            self.assertEqual(router.db_for_read(Listing), 'replica')
+            self.assertEqual(router.db_for_write(Listing), 'default')
+            self.assertIsNone(router.db_for_read(Listing))
+        finally:
+            replicas.end(token)
+        self.assertFalse(router.allow_migrate('replica', 'listings'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedAndBenchmarkTests(TransactionTestCase):
+    """
+    seed_data writes consistent bookings, booked nights and payments, and
+    run_benchmarks gets through every scenario on such data without errors.
+
+    The benchmark workers run in threads with connections of their own, so
+    this needs a file-backed test database, like ConcurrentBookingTests.
+    """
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("benchmark workers need a file-backed test database")
+        cache.clear()
+
+    def seed(self, *args):
+        call_command(
+            'seed_data', '--users', '20', '--listings', '5', '--bookings-per-listing', '6', '--seed', '7', *args,
+            stdout=StringIO(),
+        )
+
+    def test_seeded_data_is_consistent(self):
+        self.seed()
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(User.objects.filter(role='host').count(), 2)
+        self.assertEqual(Listing.objects.count(), 5)
+        self.assertEqual(
+            set(ListingSearchToken.objects.values_list('listing_id', flat=True)),
+            set(Listing.objects.values_list('pk', flat=True)),
+        )
+        bookings = list(Booking.objects.prefetch_related('nights'))
+        self.assertGreater(len(bookings), 0)
+        for booking in bookings:
+            with self.subTest(booking=booking.pk):
+                nights = booking.nights.all()
+                expected = set() if booking.status == 'canceled' else set(booking.night_dates())
+                self.assertEqual({night.night for night in nights}, expected)
+                self.assertEqual({night.property_id for night in nights} - {booking.property_id}, set())
+        self.assertFalse(Payment.objects.filter(booking__status='canceled').exists())
+        # Stats were rebuilt: one row per booked night
+        self.assertEqual(ListingDailyStats.objects.count(), BookedNight.objects.count())
+
+        with self.assertRaisesMessage(CommandError, "Seed 7 is already in this database"):
+            self.seed()
+
+    def test_every_scenario_runs(self):
+        self.seed('--skip-stats')
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = f"{directory}/report.json"
+            call_command(
+                'run_benchmarks', '--requests', '2', '--concurrency', '1', '--warmup', '0',
+                '--chapa-latency', '0', '--json', report_path, stdout=StringIO(),
+            )
+            with open(report_path) as report:
+                results = json.load(report)['results']
+
+        self.assertEqual(list(results), BenchmarkSuite.SCENARIOS)
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual((result['requests'], result['errors']), (2, 0))
@@ -1,13 +1,29 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookingViewSet, ListingViewSet, InitiatePaymentView, VerifyPaymentView
+from .views import (
+    AsyncInitiatePaymentView, AsyncListingViewSet, AsyncVerifyPaymentView, BookingViewSet, ExportJobViewSet,
+    ListingViewSet, InitiatePaymentView, VerifyPaymentView, ChapaWebhookView, ListingStatsView,
+)
 
-router = DefaultRouter()
-router.register(r'bookings', BookingViewSet, basename='booking')
-router.register(r'listings', ListingViewSet, basename='listing')
 
-urlpatterns = [
-    path('', include(router.urls)),
-    path('payments/<str:booking_id>/initiate/', InitiatePaymentView.as_view(), name="initiate"),
-    path('payments/verify/<str:tx_ref>/', VerifyPaymentView.as_view(), name="verify")
-]
+def build_urlpatterns(async_views=False):
+    """
+    The API routes. With `async_views`, listing reads and the payment views
+    are served by their async variants.
+    """
+    router = DefaultRouter()
+    router.register(r'bookings', BookingViewSet, basename='booking')
+    router.register(r'listings', AsyncListingViewSet if async_views else ListingViewSet, basename='listing')
+    router.register(r'exports', ExportJobViewSet, basename='export')
+
+    return [
+        path('', include(router.urls)),
+        path('payments/<str:booking_id>/initiate/', (AsyncInitiatePaymentView if async_views else InitiatePaymentView).as_view(), name="initiate"),
+        path('payments/verify/<str:tx_ref>/', (AsyncVerifyPaymentView if async_views else VerifyPaymentView).as_view(), name="verify"),
+        path('payments/webhook/', ChapaWebhookView.as_view(), name="chapa-webhook"),
+        path('analytics/listings/', ListingStatsView.as_view(), name="listing-analytics")
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.ASYNC_VIEWS)
@@ -1,35 +1,53 @@
 from django.shortcuts import get_object_or_404
-from rest_framework import filters, status, views, viewsets
+from rest_framework import filters, generics, mixins, status, views, viewsets
 from rest_framework.response import Response
-from .permissions import IsAuthenticatedIsOwnerOrReadOnlyListing, IsAuthenticatedIsOwnerBooking
+from .permissions import CanExportBookings, IsAuthenticatedIsOwnerOrReadOnlyListing, IsAuthenticatedIsOwnerBooking, IsHostOrStaff, is_finance
 from django.contrib.auth import get_user_model
-from .serializers import BookingSerializer, ListingSerializer, PaymentSerializer
-from .models import Booking, Listing
+from django.conf import settings
+from django.db.models import Prefetch
+from .serializers import (
+    BookingSerializer, ExportJobSerializer, ListingSerializer, ListingDetailSerializer, ListingStatsQuerySerializer,
+    ListingStatsSerializer, PaymentSerializer,
+)
+from .models import Booking, ExportJob, Listing, ListingDailyStats, ListingMonthlyStats
 from django_filters.rest_framework import DjangoFilterBackend
-from .pagination import StandardResultsSetPagination
-import uuid, requests, os
+from .pagination import BookingCursorPagination, ListingCursorPagination, StandardResultsSetPagination
+from .filters import BookingFilter, ListingFilter, ListingSearchFilter
+from .analytics import batched_refresh
+from .cache import CachedReadMixin, listing_version_key
+from .conditional import ConditionalGetMixin
+from .replicas import ReplicaReadMixin
+from functools import partial
+import uuid
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from .models import Payment, Booking
 from .serializers import PaymentSerializer
-from .tasks import send_payment_confirmation_email, send_booking_confirmation_email
+from .tasks import run_export, send_payment_confirmation_email, send_booking_confirmation_email, verify_payment
+from .chapa import (
+    ChapaError, ChapaUnavailable, get_async_chapa_client, get_chapa_client, webhook_dedup_key, webhook_signature_is_valid,
+)
+from django.core.cache import cache
+from django.http import FileResponse, Http404
+from django.db import transaction
+from . import outbox
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-
-CHAPA_SECRET_KEY = os.environ.get('CHAPA_SECRET_KEY')
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from .async_views import AsyncAPIView, AsyncViewSetMixin, documented_like
 
 User = get_user_model()  # Custom user model
 
 # Booking view
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticatedIsOwnerBooking]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ["property", "start_date", "end_date", "total_price", "status", "created_at"]
-    search_fields = ["property", "start_date", "end_date", "total_price", "status", "created_at"]
+    pagination_class = BookingCursorPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = BookingFilter
     ordering_fields = ["property", "start_date", "end_date", "total_price", "status", "created_at"]
-    ordering = ["property"]
+    ordering = ["start_date", "booking_id"]
 
     def get_queryset(self):
         # Short-circuit for Swagger schema generation
@@ -39,18 +57,24 @@ class BookingViewSet(viewsets.ModelViewSet):
         return Booking.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        booking = serializer.save(user=self.request.user)
-        send_booking_confirmation_email.delay(
-            booking.user.email,
-            str(booking.booking_id)
-        )
+        with transaction.atomic():
+            booking = serializer.save(user=self.request.user)
+            outbox.enqueue(
+                send_booking_confirmation_email,
+                booking.user.email,
+                str(booking.booking_id)
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(), batched_refresh():
+            instance.delete()
 
     @swagger_auto_schema(
         operation_summary="List user's bookings",
         operation_description="Retrieve a list of all bookings made by the authenticated user."
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return self.conditional_read(super().list, request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Create a booking",
@@ -64,7 +88,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         operation_description="Retrieve details of a specific booking made by the authenticated user."
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        return self.conditional_read(super().retrieve, request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Update a booking",
@@ -88,26 +112,59 @@ class BookingViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 # Listing view
-class ListingViewSet(viewsets.ModelViewSet):
-    queryset = Listing.objects.all()
+expand_bookings_param = openapi.Parameter(
+    "expand", openapi.IN_QUERY,
+    description="Set to `bookings` to embed the full list of bookings for each property.",
+    type=openapi.TYPE_STRING, enum=["bookings"]
+)
+
+class ListingViewSet(ReplicaReadMixin, ConditionalGetMixin, CachedReadMixin, viewsets.ModelViewSet):
     serializer_class = ListingSerializer
     permission_classes = [IsAuthenticatedIsOwnerOrReadOnlyListing]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ["name", "description", "location", "pricepernight", "created_at"]
-    search_fields =  ["name", "description", "location", "pricepernight", "created_at"]
+    pagination_class = ListingCursorPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ListingSearchFilter]
+    filterset_class = ListingFilter
     ordering_fields =  ["name", "description", "location", "pricepernight", "created_at"]
-    ordering = ["name"]
+    ordering = ["-created_at", "-property_id"]
+
+    def expand_bookings(self):
+        return "bookings" in self.request.query_params.get("expand", "").split(",")
+
+    def get_version_key(self, request, **kwargs):
+        # A listing's detail only changes with the listing and its bookings
+        try:
+            return listing_version_key(uuid.UUID(str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))))
+        except ValueError:
+            return None
+
+    def get_queryset(self):
+        queryset = Listing.objects.with_booking_summary(settings.LISTING_UPCOMING_WINDOW_DAYS)
+        if self.expand_bookings():
+            queryset = queryset.prefetch_related(
+                Prefetch("bookings", queryset=Booking.objects.order_by("start_date"))
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        if self.expand_bookings():
+            return ListingDetailSerializer
+        return ListingSerializer
 
     def perform_create(self, serializer):
         serializer.save(host=self.request.user)
 
+    def perform_destroy(self, instance):
+        # Cascades to every booking and payment of the listing
+        with transaction.atomic(), batched_refresh():
+            instance.delete()
+
     @swagger_auto_schema(
         operation_summary="List all properties",
-        operation_description="Retrieve a list of all available property listings."
+        operation_description="Retrieve a list of all available property listings. Pass `available_from` and `available_to` (check-in and check-out dates) to only get properties that are free for that stay.",
+        manual_parameters=[expand_bookings_param]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return self.conditional_read(partial(self.cached_read, super().list), request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Create a property listing",
@@ -118,10 +175,11 @@ class ListingViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         operation_summary="Retrieve a property",
-        operation_description="Retrieve details of a specific property listing."
+        operation_description="Retrieve details of a specific property listing.",
+        manual_parameters=[expand_bookings_param]
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        return self.conditional_read(partial(self.cached_read, super().retrieve), request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Update a property listing",
@@ -144,6 +202,43 @@ class ListingViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
+class AsyncListingViewSet(AsyncViewSetMixin, ListingViewSet):
+    """
+    ListingViewSet for ASGI workers (ASYNC_VIEWS): list and retrieve use the
+    async ORM and cache API on the event loop; writes keep the sync code, run
+    in a thread.
+    """
+
+    @documented_like(ListingViewSet.list)
+    async def list(self, request, *args, **kwargs):
+        return await self.aconditional_read(partial(self.acached_read, self.alist), request, *args, **kwargs)
+
+    @documented_like(ListingViewSet.retrieve)
+    async def retrieve(self, request, *args, **kwargs):
+        return await self.aconditional_read(partial(self.acached_read, self.aretrieve), request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # DRF paginators are sync; the page query runs in a thread, as the async ORM's own do
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is None:
+            return Response(self.get_serializer([listing async for listing in queryset], many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            listing = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (Listing.DoesNotExist, TypeError, ValueError, ValidationError):
+            # The same cases rest_framework.generics.get_object_or_404 turns into a 404
+            raise Http404
+        self.check_object_permissions(self.request, listing)
+        return listing
+
 class InitiatePaymentView(views.APIView):
     permission_classes = [IsAuthenticated]
 
@@ -161,7 +256,8 @@ class InitiatePaymentView(views.APIView):
                 }
             ),
             404: "Booking not found or not yours",
-            400: "Failed to initialize payment"
+            400: "Failed to initialize payment",
+            503: "Payment gateway unavailable, retry later"
         }
     )
     def post(self, request, booking_id=None):
@@ -172,7 +268,30 @@ class InitiatePaymentView(views.APIView):
 
         tx_ref = f"booking-{uuid.uuid4()}"
 
-        payload = {
+        try:
+            status_code, data = get_chapa_client().initialize(self.chapa_payload(request, booking, tx_ref))
+        except ChapaError as e:
+            return self.gateway_error_response(e)
+
+        if status_code == 200 and data.get('status') == 'success':
+            try:
+                payment = Payment.objects.create(
+                    booking=booking,
+                    amount=booking.total_price,
+                    tx_ref=tx_ref
+                )
+                
+                return Response({
+                    "checkout_url": data['data']['checkout_url'],
+                    "tx_ref": tx_ref
+                })
+            except Exception as e:
+                return Response({"error": f"Failed to record payment in system: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        else:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    def chapa_payload(self, request, booking, tx_ref):
+        return {
             "amount": str(booking.total_price),
             "currency": "USD",
             "email": request.user.email,
@@ -187,38 +306,40 @@ class InitiatePaymentView(views.APIView):
             }
         }
 
-        headers = {
-            "Authorization": f"Bearer {CHAPA_SECRET_KEY}",
-            "Content-Type": "application/json"
-        }
+    @staticmethod
+    def gateway_error_response(error):
+        if isinstance(error, ChapaUnavailable):
+            return Response({"error": f"Payment failed: {str(error)}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"error": f"Payment failed: {str(error)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+class AsyncInitiatePaymentView(AsyncAPIView, InitiatePaymentView):
+    """
+    InitiatePaymentView for ASGI workers (ASYNC_VIEWS): the Chapa call waits on
+    the event loop rather than in a thread.
+    """
+
+    @documented_like(InitiatePaymentView.post)
+    async def post(self, request, booking_id=None):
         try:
-            chapa_response = requests.post(
-                "https://api.chapa.co/v1/transaction/initialize",
-                json=payload, 
-                headers=headers
-            )
-            data = chapa_response.json()
-        except Exception as e:
-            return Response({"error": f"Payment failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+            booking = await Booking.objects.aget(pk=booking_id, user=request.user)
+        except Booking.DoesNotExist:
+            return Response({'error': 'Booking not found or not yours'}, status=status.HTTP_404_NOT_FOUND)
+
+        tx_ref = f"booking-{uuid.uuid4()}"
 
-        if chapa_response.status_code == 200 and data.get('status') == 'success':
+        try:
+            status_code, data = await get_async_chapa_client().initialize(self.chapa_payload(request, booking, tx_ref))
+        except ChapaError as e:
+            return self.gateway_error_response(e)
+
+        if status_code == 200 and data.get('status') == 'success':
             try:
-                payment = Payment.objects.create(
-                    booking=booking,
-                    amount=booking.total_price,
-                    tx_ref=tx_ref
-                )
-                
-                return Response({
-                    "checkout_url": data['data']['checkout_url'],
-                    "tx_ref": tx_ref
-                })
+                await Payment.objects.acreate(booking=booking, amount=booking.total_price, tx_ref=tx_ref)
             except Exception as e:
                 return Response({"error": f"Failed to record payment in system: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            return Response(data, status=status.HTTP_400_BAD_REQUEST)
-    
+            return Response({"checkout_url": data['data']['checkout_url'], "tx_ref": tx_ref})
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
 class VerifyPaymentView(views.APIView):
     @swagger_auto_schema(
         operation_summary="Verify payment",
@@ -237,46 +358,212 @@ class VerifyPaymentView(views.APIView):
                 }
             ),
             404: "Payment not found",
-            400: "Verification failed"
+            400: "Verification failed",
+            503: "Payment gateway unavailable, retry later"
         }
     )    
     def get(self, request, tx_ref=None):
+        try:
+            payment = Payment.objects.select_related('booking__user').get(tx_ref=tx_ref)
+        except Payment.DoesNotExist:
+            return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Already verified by an earlier callback or the webhook; nothing to redo
+        if payment.status == 'completed':
+            return Response({"status": payment.status})
+
+        try:
+            _, data = get_chapa_client().verify(tx_ref)
+        except ChapaError as e:
+            return self.gateway_error_response(e)
+
+        if data.get('status') == 'success':
+            self.record_verification(payment, data['data'], self.callback_transaction_id(request, tx_ref))
+            return Response({"status": payment.status, "chapa_response": data})
+        else:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    def callback_transaction_id(request, tx_ref):
         # callback_url recive a GET request with a JSON payload
         callback_url_trx_ref = request.GET.get("trx_ref")
         callback_url_ref_id = request.GET.get("ref_id")
         callback_url_chapa_status = request.GET.get("status")
 
-        try:
-            payment = Payment.objects.get(tx_ref=tx_ref)
-            
-            if callback_url_ref_id and callback_url_trx_ref == tx_ref and callback_url_chapa_status == "success":
-                payment.chapa_transaction_id = callback_url_ref_id 
-                payment.save()
+        if callback_url_ref_id and callback_url_trx_ref == tx_ref and callback_url_chapa_status == "success":
+            return callback_url_ref_id
+        return None
+
+    @staticmethod
+    def gateway_error_response(error):
+        if isinstance(error, ChapaUnavailable):
+            return Response({"error": f"Failed to verify payment in system: {str(error)}"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"error": f"Failed to verify payment in system: {str(error)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @staticmethod
+    def record_verification(payment, chapa_data, chapa_transaction_id):
+        with transaction.atomic():
+            if payment.record_verification(chapa_data['status'], chapa_transaction_id or chapa_data.get('reference')):
+                outbox.enqueue(
+                    send_payment_confirmation_email,
+                    payment.booking.user.email,
+                    str(payment.payment_id)
+                )
+
+class AsyncVerifyPaymentView(AsyncAPIView, VerifyPaymentView):
+    """
+    VerifyPaymentView for ASGI workers (ASYNC_VIEWS): the Chapa call waits on
+    the event loop; recording the result is one transaction, run in a thread.
+    """
 
+    @documented_like(VerifyPaymentView.get)
+    async def get(self, request, tx_ref=None):
+        try:
+            payment = await Payment.objects.select_related('booking__user').aget(tx_ref=tx_ref)
         except Payment.DoesNotExist:
             return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
+        if payment.status == 'completed':
+            return Response({"status": payment.status})
+
         try:
-            response = requests.get(
-                f"https://api.chapa.co/v1/transaction/verify/{tx_ref}",
-                headers=headers
-            ) 
-            data = response.json()
-        except Exception as e:
-            return Response({"error": f"Failed to verify payment in system: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            _, data = await get_async_chapa_client().verify(tx_ref)
+        except ChapaError as e:
+            return self.gateway_error_response(e)
 
         if data.get('status') == 'success':
-            chapa_status = data['data']['status']
-            payment.status = 'completed' if chapa_status == 'success' else 'failed'
-            payment.save()
+            await sync_to_async(self.record_verification)(
+                payment, data['data'], self.callback_transaction_id(request, tx_ref)
+            )
+            return Response({"status": payment.status, "chapa_response": data})
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
 
-            if payment.status == 'completed':
-                send_payment_confirmation_email.delay(
-                    payment.booking.user.email,
-                    str(payment.payment_id)
-                )
+class ChapaWebhookView(views.APIView):
+    # Chapa authenticates with a signature over the body, not a user token
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
-            return Response({"status": payment.status, "chapa_response": data})
+    @swagger_auto_schema(
+        operation_summary="Chapa payment webhook",
+        operation_description="Receives signed payment notifications from Chapa. The notification is acknowledged immediately and the payment is verified in the background, once per tx_ref.",
+        responses={
+            200: "Notification accepted (or already being processed)",
+            401: "Missing or invalid signature",
+            400: "Malformed notification"
+        }
+    )
+    def post(self, request):
+        if not webhook_signature_is_valid(request):
+            return Response({"error": "Invalid signature"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        tx_ref = request.data.get("tx_ref") if isinstance(request.data, dict) else None
+        if not tx_ref:
+            return Response({"error": "tx_ref is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Chapa retries notifications; only one verification per tx_ref is queued at a time.
+        # verify_payment releases the key if it cannot settle the payment, so a later retry gets through
+        if cache.add(webhook_dedup_key(tx_ref), 1, settings.CHAPA_WEBHOOK_DEDUP_TIMEOUT):
+            outbox.enqueue(verify_payment, tx_ref)
+            return Response({"status": "queued"})
+        return Response({"status": "duplicate"})
+
+
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = ExportJobSerializer
+    permission_classes = [CanExportBookings]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ExportJob.objects.none()
+
+        return ExportJob.objects.filter(requested_by=self.request.user).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            job = serializer.save(requested_by=self.request.user)
+            outbox.enqueue(run_export, str(job.export_id))
+
+    @swagger_auto_schema(
+        operation_summary="Start an export",
+        operation_description="Queue a full export of booking or payment history as CSV or NDJSON. Staff export every row; hosts export rows for the listings they host. Poll the job until its status is completed, then follow download_url.",
+        responses={201: ExportJobSerializer, 403: "Only hosts and staff can export"}
+    )
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Download an export",
+        operation_description="Stream the file of a completed export.",
+        responses={200: "The export file", 404: "Export not found or not completed yet"}
+    )
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'completed' or not job.file:
+            raise Http404("Export is not completed yet")
+        content_type = 'text/csv' if job.file_format == 'csv' else 'application/x-ndjson'
+        # FileResponse streams the file in blocks instead of reading it into memory
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=f"{job.dataset}-{job.created_at:%Y%m%d%H%M%S}.{job.file_format}",
+            content_type=content_type,
+        )
+
+
+class ListingStatsView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    Host dashboard figures, read from the analytics summary tables only (see
+    listings.analytics); no booking or payment rows are aggregated per request.
+    """
+    serializer_class = ListingStatsSerializer
+    permission_classes = [IsHostOrStaff]
+    pagination_class = StandardResultsSetPagination
+
+    def get_params(self):
+        if not hasattr(self, '_params'):
+            query = ListingStatsQuerySerializer(data=self.request.query_params)
+            query.is_valid(raise_exception=True)
+            self._params = query.validated_data
+        return self._params
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ListingMonthlyStats.objects.none()
+
+        params = self.get_params()
+        if params['granularity'] == 'month':
+            queryset = ListingMonthlyStats.objects.filter(
+                month__gte=params['start'].replace(day=1), month__lte=params['end']
+            )
+            period = 'month'
         else:
-            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+            queryset = ListingDailyStats.objects.filter(day__gte=params['start'], day__lte=params['end'])
+            period = 'day'
+
+        if not is_finance(self.request.user):
+            queryset = queryset.filter(listing__host=self.request.user)
+        if params.get('listing'):
+            queryset = queryset.filter(listing_id=params['listing'])
+        return queryset.select_related('listing').only(
+            'listing__name', period, 'booked_nights', 'booked_revenue', 'paid_revenue'
+        ).order_by(period, 'listing_id')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if not getattr(self, 'swagger_fake_view', False):
+            context['granularity'] = self.get_params()['granularity']
+        return context
+
+    @swagger_auto_schema(
+        operation_summary="Listing revenue and occupancy",
+        operation_description="Revenue (completed payments), occupancy rate and average nightly price per listing per month (or per day with granularity=day), for the host's listings; staff see every listing. Only periods with booked nights are returned. Defaults to the last twelve months.",
+        manual_parameters=[
+            openapi.Parameter("granularity", openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=["month", "day"]),
+            openapi.Parameter("start", openapi.IN_QUERY, description="YYYY-MM or YYYY-MM-DD", type=openapi.TYPE_STRING),
+            openapi.Parameter("end", openapi.IN_QUERY, description="YYYY-MM or YYYY-MM-DD", type=openapi.TYPE_STRING),
+            openapi.Parameter("listing", openapi.IN_QUERY, description="Only this listing", type=openapi.TYPE_STRING),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
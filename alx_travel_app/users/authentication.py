@@ -0,0 +1,71 @@
+"""
+JWT authentication without a users-table query per request. The user named by
+the token's user_id claim is rebuilt from a short-lived cache entry holding
+its column values (everything but the password hash) with Model.from_db, so
+request.user is a real CustomUser and views reading its id, email, role or
+flags never query the users table. A cache miss loads the row once and fills
+the entry for the next USER_CACHE_TIMEOUT seconds.
+
+users.signals drops the entry whenever a user is saved (profile updates,
+deactivation) or deleted. Changes that skip signals, such as
+QuerySet.update(is_active=False), take effect once the entry expires.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Loaded on access (one query) if a view ever needs it
+UNCACHED_FIELDS = {'password'}
+
+
+def user_cache_key(user_id):
+    return f"users:auth:{user_id}"
+
+
+def cached_fields():
+    return [field.attname for field in User._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+
+
+def get_cached_user(user_id):
+    """
+    The user with primary key `user_id`, from the cache if possible, or None
+    if there is no such user.
+    """
+    key = user_cache_key(user_id)
+    fields = cached_fields()
+    values = cache.get(key)
+    if values is None:
+        values = User.objects.filter(pk=user_id).values_list(*fields).first()
+        if values is None:
+            return None
+        cache.set(key, values, settings.USER_CACHE_TIMEOUT)
+    return User.from_db(router.db_for_read(User), fields, values)
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Reads the password hash from the database
+            return super().get_user(validated_token)
+        return user
@@ -0,0 +1,210 @@
+"""
+Refresh-token blacklist upkeep: a purge job for the blacklist tables and a
+per-process Bloom filter that answers most blacklist checks without a query.
+
+simplejwt adds an OutstandingToken row for every login and rotation and a
+BlacklistedToken row for every rotation and logout, and never deletes either.
+purge_expired_tokens() deletes tokens past their expiry, with their blacklist
+rows, a chunk at a time in short transactions. An expired token is rejected
+on its exp claim before the blacklist matters, so nothing is lost.
+Celery beat runs it hourly; `manage.py purge_tokens` runs it by hand.
+
+The filter holds the jtis of blacklisted tokens. A jti it has never seen is
+certainly not blacklisted, so the refresh is accepted without a query; a hit
+(a blacklisted token, or a false positive about
+TOKEN_BLACKLIST_FILTER_ERROR_RATE of the time) is confirmed in the database.
+Purged jtis stay in the filter: their tokens are expired and rejected before
+the blacklist is consulted, so they only add false positives.
+
+Workers keep their filters in step through a version in the default cache.
+A committed blacklist row moves it, and the next check in every worker loads
+the rows added since its last sync, by primary key (blacklisted_at has no
+index, and the table can be huge). Each check reads the version,
+which is one cache round trip; if the entry is missing the worker loads
+again, so an eviction costs a query, never a missed token. The full build
+(at startup, and once the filter holds more jtis than it was sized for) runs
+in a background thread and is swapped in when done; until the first one
+finishes every check goes to the database. This only holds when all workers
+share the cache, so TOKEN_BLACKLIST_FILTER is off by default; turn it on
+along with a Redis or Memcached CACHE_URL.
+"""
+import hashlib
+import math
+import threading
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+VERSION_KEY = "users:blacklist:version"
+
+# Incremental syncs re-read this many ids back, for rows whose transaction
+# committed after one with a higher auto-increment id
+SYNC_OVERLAP_IDS = 100
+
+
+def expiry_cutoff():
+    """
+    Tokens that expired before this are rejected even with the configured leeway.
+    """
+    leeway = api_settings.LEEWAY
+    if not isinstance(leeway, timedelta):
+        leeway = timedelta(seconds=leeway)
+    return timezone.now() - leeway
+
+
+def purge_expired_tokens(chunk_size=None):
+    """
+    Deletes expired outstanding tokens and their blacklist rows,
+    `chunk_size` tokens per transaction. Returns (outstanding, blacklisted)
+    row counts.
+    """
+    chunk_size = chunk_size or settings.TOKEN_PURGE_CHUNK_SIZE
+    cutoff = expiry_cutoff()
+    outstanding = blacklisted = 0
+
+    while True:
+        # expires_at is not indexed, but it grows with the id, so the expired
+        # rows are the first ones in primary key order
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=cutoff)
+            .order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+
+        # Only the ids are read back; the blacklist rows go in one DELETE by token_id
+        _, deleted = OutstandingToken.objects.filter(pk__in=ids).only('pk').delete()
+        outstanding += deleted.get(OutstandingToken._meta.label, 0)
+        blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+        if len(ids) < chunk_size:
+            break
+
+    return outstanding, blacklisted
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def publish_blacklisted():
+    """
+    Tells every worker that rows were blacklisted. Call after they commit.
+    """
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class BlacklistFilter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.version = None
+        self.last_id = 0
+        self.rebuilding = False
+
+    def might_contain(self, jti):
+        """
+        False if the token with this jti is certainly not blacklisted.
+        """
+        self.sync()
+        bloom = self.bloom
+        # No filter built yet: the database answers
+        return bloom is None or jti in bloom
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def sync(self):
+        version = current_version()
+        if version is not None and version == self.version:
+            return
+
+        with self.lock:
+            if version is not None and version == self.version:
+                # Another thread synced while this one waited for the lock
+                return
+            if self.bloom is not None:
+                self.load_new_rows()
+                # The version was read before loading, so a change made meanwhile triggers another sync
+                self.version = version
+            stale = self.bloom is None or self.bloom.count > self.bloom.capacity
+            if stale and not self.rebuilding:
+                self.rebuilding = True
+                self.start_rebuild()
+
+    def start_rebuild(self):
+        threading.Thread(target=self.rebuild_in_background, name='blacklist-filter', daemon=True).start()
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            connections.close_all()
+
+    def rebuild(self):
+        """
+        Builds a filter of the live blacklisted jtis and swaps it in. Checks
+        keep using the current filter meanwhile.
+        """
+        try:
+            # Read first: rows blacklisted from here on move the version, and the next
+            # sync loads them into the new filter
+            version = current_version()
+            last_id = BlacklistedToken.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+            live = BlacklistedToken.objects.filter(token__expires_at__gt=expiry_cutoff())
+            # Room to double before the false positive rate drifts and forces a rebuild
+            capacity = max(live.count() * 2, settings.TOKEN_BLACKLIST_FILTER_MIN_CAPACITY)
+            bloom = BloomFilter(capacity, settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE)
+            for jti in live.values_list('token__jti', flat=True).iterator(chunk_size=10000):
+                bloom.add(jti)
+            with self.lock:
+                self.bloom, self.last_id, self.version = bloom, last_id, version
+        finally:
+            self.rebuilding = False
+
+    def load_new_rows(self):
+        # A range read on the primary key index, however large the table is
+        rows = BlacklistedToken.objects.filter(pk__gt=self.last_id - SYNC_OVERLAP_IDS).order_by('pk')
+        for pk, jti in rows.values_list('pk', 'token__jti'):
+            # The overlap is read again every time; only count a jti once towards capacity
+            if jti not in self.bloom:
+                self.bloom.add(jti)
+            self.last_id = max(self.last_id, pk)
+
+
+blacklist_filter = BlacklistFilter()
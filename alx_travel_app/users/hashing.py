@@ -0,0 +1,52 @@
+"""
+Password hashing off the request thread. PBKDF2 takes hundreds of
+milliseconds of CPU by design; run inline, a burst of logins blocks the event
+loop under ASGI (and Django's one thread for sync views). Hashes run in a
+small dedicated pool instead, so at most PASSWORD_HASHING_WORKERS cores go to
+hashing and the rest of the API keeps serving. The sync views (WSGI) wait on
+the same pool, which keeps the same bound on cores.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing'
+        )
+    return _executor
+
+
+async def run_in_hashing_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+def hash_password(password):
+    return get_executor().submit(hashers.make_password, password).result()
+
+
+def verify_password(password, encoded):
+    """
+    (is_correct, must_update) like django's verify_password(). Pass
+    encoded=None for an unknown account: the default hasher still runs once,
+    so the response time does not reveal whether the email is registered.
+    """
+    # An empty hash is unidentifiable, which makes verify_password hash a dummy password
+    return get_executor().submit(hashers.verify_password, password, encoded or '').result()
+
+
+async def ahash_password(password):
+    return await run_in_hashing_pool(hashers.make_password, password)
+
+
+async def averify_password(password, encoded):
+    """
+    verify_password() for async views.
+    """
+    return await run_in_hashing_pool(hashers.verify_password, password, encoded or '')
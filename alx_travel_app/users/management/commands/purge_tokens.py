@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from users.blacklist import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Deletes expired refresh tokens (and their blacklist entries) in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.TOKEN_PURGE_CHUNK_SIZE, help="Tokens deleted per transaction."
+        )
+
+    def handle(self, *args, **options):
+        outstanding, blacklisted = purge_expired_tokens(options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {outstanding} expired tokens ({blacklisted} blacklisted)."))
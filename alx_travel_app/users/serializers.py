@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt import serializers as jwt_serializers
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -13,12 +15,18 @@ class RegisterUserSerializer(serializers.ModelSerializer):
 
     # Override the creation method to handle user creation logic
     def create(self, validated_data):
-        user = User.objects.create_user(**validated_data)
-        return user
+        # The view may hash the password beforehand, off the request thread
+        encoded_password = validated_data.pop('encoded_password', None)
+        if encoded_password is None:
+            return User.objects.create_user(**validated_data)
+        validated_data.pop('password')
+        validated_data['email'] = User.objects.normalize_email(validated_data['email'])
+        return User.objects.create(password=encoded_password, **validated_data)
 
     def validate_password(self, value):
         if len(value) < 8:
             raise serializers.ValidationError("Password must be at least 8 characters long.")
+        return value
 
 # Serializer class for updating user profile
 class UpdateUserSerializer(serializers.ModelSerializer):
@@ -44,6 +52,7 @@ class UpdateUserSerializer(serializers.ModelSerializer):
     def validate_password(self, value):
         if len(value) < 8:
             raise serializers.ValidationError("password must have at least 8 charcters")
+        return value
 
 # Serializer class for user login
 class LoginUserSerializer(serializers.Serializer):
@@ -53,4 +62,8 @@ class LoginUserSerializer(serializers.Serializer):
 # Serializer class for user logout
 class LogoutUserSerializer(serializers.Serializer):
     refresh = serializers.CharField()
-    
\ No newline at end of file
+    
+
+# Token refresh (SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER']) with the filtered blacklist check
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .authentication import invalidate_cached_user
+from .blacklist import blacklist_filter, publish_blacklisted
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Now, and again after commit so a request cannot re-cache the row as it was before the change
+    user_id = instance.pk
+    invalidate_cached_user(user_id)
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def publish_blacklisted_token(sender, instance, created, **kwargs):
+    if not created:
+        return
+    # This worker knows at once; the others sync once the row is visible to them
+    blacklist_filter.add(instance.token.jti)
+    transaction.on_commit(publish_blacklisted)
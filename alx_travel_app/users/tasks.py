@@ -0,0 +1,12 @@
+from celery import shared_task
+from . import blacklist
+
+
+@shared_task
+def purge_expired_tokens():
+    """
+    Deletes expired refresh tokens from the outstanding and blacklist tables.
+    """
+    outstanding, blacklisted = blacklist.purge_expired_tokens()
+
+    return f"Purged {outstanding} expired tokens ({blacklisted} blacklisted)"
@@ -1,3 +1,275 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from unittest import mock
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import get_cached_user
+from .blacklist import BlacklistFilter, blacklist_filter
+from .throttling import TokenBucket
+from .views import AsyncLoginUserView, AsyncRegisterUserView, LoginUserView, RegisterUserView
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(
+    AUTH_THROTTLES={'auth_ip': (10, 1), 'login_account': (3, 1)},
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class LoginThrottleTests(TestCase):
+    """
+    Failed logins drain per-account and per-IP token buckets; once a bucket is
+    empty, attempts are rejected before the user is looked up or any password
+    is hashed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("guest@example.com", "guest", password="password123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, email, password, ip="10.0.0.1"):
+        return self.client.post(
+            "/api/auth/login/", {"email": email, "password": password}, format="json", REMOTE_ADDR=ip
+        )
+
+    def test_unknown_email_and_wrong_password_get_the_same_answer(self):
+        unknown = self.login("nobody@example.com", "password123")
+        wrong = self.login("guest@example.com", "wrong-password")
+        self.assertEqual((unknown.status_code, unknown.data), (400, {"error": "Invalid email or password"}))
+        self.assertEqual((wrong.status_code, wrong.data), (unknown.status_code, unknown.data))
+
+    def test_account_locks_after_failures_from_any_ip(self):
+        for i in range(3):
+            self.assertEqual(self.login("guest@example.com", "wrong-password", ip=f"10.0.0.{i}").status_code, 400)
+
+        with self.assertNumQueries(0):
+            response = self.login("guest@example.com", "password123", ip="10.0.0.9")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    def test_ip_is_throttled_across_accounts(self):
+        for i in range(10):
+            self.assertEqual(self.login(f"user{i}@example.com", "password123").status_code, 400)
+        self.assertEqual(self.login("guest@example.com", "password123").status_code, 429)
+        self.assertEqual(self.login("guest@example.com", "password123", ip="10.0.0.2").status_code, 200)
+
+    def test_successful_login_refills_the_account_bucket(self):
+        for _ in range(2):
+            self.login("guest@example.com", "wrong-password")
+        self.assertEqual(self.login("guest@example.com", "password123").status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self.login("guest@example.com", "wrong-password").status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthViewModeTests(TestCase):
+    """
+    Registration and login are sync views unless ASYNC_VIEWS is on, and both
+    variants answer alike.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def register_and_login(self, post):
+        registered = post("/api/auth/register/", {
+            "email": "new@example.com", "password": "password123", "first_name": "New", "last_name": "User",
+            "role": "guest",
+        }, content_type="application/json")
+        self.assertEqual(registered.status_code, 201)
+        wrong = post("/api/auth/login/", {"email": "new@example.com", "password": "wrong-password"},
+                     content_type="application/json")
+        self.assertEqual(wrong.status_code, 400)
+        response = post("/api/auth/login/", {"email": "new@example.com", "password": "password123"},
+                        content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_data']['email'], "new@example.com")
+        self.assertEqual(RefreshToken(response.json()['refresh'])['user_id'], str(User.objects.get().pk))
+
+    def test_sync_views_by_default(self):
+        self.assertIs(resolve("/api/auth/register/").func.view_class, RegisterUserView)
+        self.assertIs(resolve("/api/auth/login/").func.view_class, LoginUserView)
+        self.register_and_login(self.client.post)
+
+    def test_async_views_with_async_views_on(self):
+        with override_settings(ROOT_URLCONF='listings.tests'):
+            self.assertIs(resolve("/api/auth/register/").func.view_class, AsyncRegisterUserView)
+            self.assertIs(resolve("/api/auth/login/").func.view_class, AsyncLoginUserView)
+            self.register_and_login(async_to_sync(self.async_client.post))
+
+
+class TokenBucketTests(TestCase):
+    """
+    Taking a token is one atomic increment, so simultaneous attempts never get
+    more than a bucket's worth through, and the bucket refills as its window
+    slides.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.bucket = TokenBucket('test', 5, 1)
+
+    def test_simultaneous_attempts_get_at_most_the_burst(self):
+        start = threading.Barrier(20)
+        waits = []
+
+        def attempt():
+            start.wait()
+            waits.append(self.bucket.take("10.0.0.1"))
+
+        threads = [threading.Thread(target=attempt) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(waits.count(0), 5)
+        self.assertTrue(all(wait > 0 for wait in waits if wait))
+
+    def test_bucket_refills_as_the_window_slides(self):
+        with mock.patch('users.throttling.time.time', return_value=3000.0):
+            self.assertEqual([self.bucket.take("10.0.0.1") for _ in range(5)], [0] * 5)
+            wait = self.bucket.take("10.0.0.1")
+        # The rest of the five-minute window, then a fifth of the next
+        self.assertAlmostEqual(wait, 360)
+        with mock.patch('users.throttling.time.time', return_value=3000.0 + wait + 1):
+            self.assertEqual(self.bucket.take("10.0.0.1"), 0)
+            self.assertGreater(self.bucket.take("10.0.0.1"), 0)
+
+    def test_reset_refills_the_bucket(self):
+        for _ in range(5):
+            self.bucket.take("10.0.0.1")
+        self.bucket.reset("10.0.0.1")
+        self.assertEqual(self.bucket.take("10.0.0.1"), 0)
+
+
+class CachedUserAuthenticationTests(TestCase):
+    """
+    JWT requests rebuild request.user from the user cache, which saves and
+    deletes of the user invalidate.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("guest@example.com", "guest", password="password123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_cached_user_skips_the_users_table(self):
+        self.client.get("/api/bookings/")
+        with self.assertNumQueries(1):  # the page; no user lookup
+            self.assertEqual(self.client.get("/api/bookings/").status_code, 200)
+
+    def test_profile_update_refreshes_the_cached_user(self):
+        self.client.get("/api/bookings/")
+        self.client.put("/api/auth/update/", {"first_name": "Renamed"}, format="json")
+        self.assertEqual(get_cached_user(self.user.pk).first_name, "Renamed")
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get("/api/bookings/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/bookings/").status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.assertEqual(self.client.delete("/api/auth/delete/").status_code, 204)
+        self.assertEqual(self.client.get("/api/bookings/").status_code, 401)
+
+
+@override_settings(TOKEN_BLACKLIST_FILTER=True)
+class TokenBlacklistTests(TestCase):
+    """
+    Refresh tokens are checked against a per-process filter that workers keep
+    in step through the cache; the purge job drops expired tokens in chunks.
+    Filters are built inline here; workers build them in a background thread.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("guest@example.com", "guest", password="password123")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        blacklist_filter.rebuild()
+
+    def refresh(self, token):
+        return self.client.post("/api/auth/token/refresh/", {"refresh": str(token)}, format="json")
+
+    def test_rotated_and_logged_out_tokens_are_rejected(self):
+        rotated = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.refresh(rotated)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(rotated).status_code, 401)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/auth/logout/", {"refresh": response.data["refresh"]}, format="json")
+        self.assertEqual(self.refresh(response.data["refresh"]).status_code, 401)
+
+    def test_other_workers_learn_of_new_entries_through_the_cache(self):
+        worker = BlacklistFilter()
+        token = RefreshToken.for_user(self.user)
+        worker.rebuild()
+        with self.assertNumQueries(0):
+            self.assertFalse(worker.might_contain(token["jti"]))
+
+        # Blacklisted by this process, while `worker` stands in for another one
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(worker.might_contain(token["jti"]))
+        # The new rows are found through the primary key, not the unindexed blacklisted_at
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"id" >', queries[0]['sql'])
+        self.assertNotIn('blacklisted_at', queries[0]['sql'])
+
+    def test_purge_deletes_expired_tokens_in_chunks(self):
+        expired = timezone.now() - timedelta(minutes=1)
+        for i in range(5):
+            outstanding = OutstandingToken.objects.create(user=self.user, jti=f"expired-{i}", token="", expires_at=expired)
+            if i % 2:
+                BlacklistedToken.objects.create(token=outstanding)
+        with self.captureOnCommitCallbacks(execute=True):
+            live = RefreshToken.for_user(self.user)
+            live.blacklist()
+        blacklist_filter.sync()
+
+        call_command("purge_tokens", chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), [live["jti"]])
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, live["jti"])
+        # Workers keep their filters: the purged jtis are only false positives now
+        with self.assertNumQueries(0):
+            self.assertTrue(blacklist_filter.might_contain(live["jti"]))
+
+    @override_settings(TOKEN_BLACKLIST_FILTER_MIN_CAPACITY=2)
+    def test_full_filter_is_rebuilt_in_the_background(self):
+        worker = BlacklistFilter()
+        worker.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                RefreshToken.for_user(self.user).blacklist()
+
+        with mock.patch.object(worker, 'start_rebuild') as start_rebuild:
+            with self.assertNumQueries(1):  # the new rows only
+                worker.sync()
+            worker.sync()
+        start_rebuild.assert_called_once()
@@ -0,0 +1,131 @@
+"""
+Throttle buckets for the auth endpoints, kept in the default cache so every
+worker shares them (point CACHE_URL at Redis or Memcached in production).
+
+A bucket lets `burst` attempts through at once and `per_minute` attempts a
+minute in the long run. Throttles run in DRF's initial(), so a rejected
+attempt never reaches the database or the password hasher.
+
+Buckets are sliding windows of counters rather than a stored token count, so
+taking a token is a single atomic cache.incr() and never a read-modify-write:
+simultaneous attempts each get their own count, and no more than `burst` of
+them get through. A window lasts `burst` / `per_minute` minutes, and an
+attempt passes while the attempts in the current window, plus the previous
+window's share of the sliding span, come to at most `burst`. Unlike a true
+token bucket, an emptied bucket does not hand out single tokens as it
+refills: the sliding span has to move past the burst first.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    def __init__(self, scope, burst, per_minute):
+        self.scope = scope
+        self.burst = burst
+        self.window = burst * 60 / per_minute
+
+    def key(self, ident):
+        # Hashed so any identifier (an email address, an IPv6 address) is a valid cache key
+        return f"throttle:{self.scope}:{hashlib.sha256(ident.encode()).hexdigest()}"
+
+    def window_keys(self, ident, window):
+        key = self.key(ident)
+        return f"{key}:{window}", f"{key}:{window - 1}"
+
+    def take(self, ident):
+        """
+        Takes a token for `ident`. Returns 0 if one was available, otherwise
+        the seconds until there will be one.
+        """
+        position = time.time() / self.window
+        window = int(position)
+        elapsed = position - window
+        current_key, previous_key = self.window_keys(ident, window)
+        # Counters are read back in the next window, so they outlive two
+        timeout = int(2 * self.window) + 1
+        if cache.add(current_key, 1, timeout):
+            taken = 1
+        else:
+            try:
+                taken = cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(current_key, 1, timeout)
+                taken = 1
+        previous = cache.get(previous_key, 0)
+        if previous * (1 - elapsed) + taken <= self.burst:
+            return 0
+        # A rejected attempt takes no token
+        cache.decr(current_key)
+        if taken <= self.burst:
+            # The previous window's share has to shrink first
+            return (1 - (self.burst - taken) / previous - elapsed) * self.window
+        # This window is spent; wait for the next one to leave room
+        return (1 - elapsed + max(0, 1 - (self.burst - 1) / (taken - 1))) * self.window
+
+    def reset(self, ident):
+        cache.delete_many(self.window_keys(ident, int(time.time() / self.window)))
+
+    async def areset(self, ident):
+        await cache.adelete_many(self.window_keys(ident, int(time.time() / self.window)))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def __init__(self):
+        self.wait_seconds = 0
+
+    def get_bucket(self):
+        burst, per_minute = settings.AUTH_THROTTLES[self.scope]
+        return TokenBucket(self.scope, burst, per_minute)
+
+    def get_cache_ident(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        ident = self.get_cache_ident(request)
+        if ident is None:
+            return True
+        self.wait_seconds = self.get_bucket().take(ident)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AuthIPThrottle(TokenBucketThrottle):
+    """
+    Attempts per client IP (honouring REST_FRAMEWORK['NUM_PROXIES']), shared
+    by login and registration.
+    """
+    scope = 'auth_ip'
+
+    def get_cache_ident(self, request):
+        return self.get_ident(request)
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    """
+    Login attempts per account, from any IP. A successful login refills the
+    bucket, so only repeated failures lock an account out.
+    """
+    scope = 'login_account'
+
+    @staticmethod
+    def normalize(email):
+        return email.strip().lower()
+
+    def get_cache_ident(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return self.normalize(email) if isinstance(email, str) and email.strip() else None
+
+    def reset(self, email):
+        self.get_bucket().reset(self.normalize(email))
+
+    async def areset(self, email):
+        await self.get_bucket().areset(self.normalize(email))
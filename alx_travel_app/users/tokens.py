@@ -0,0 +1,16 @@
+from django.conf import settings
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from .blacklist import blacklist_filter
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    A refresh token whose blacklist check asks the in-process filter first
+    (users.blacklist) and only queries the blacklist on a hit.
+    """
+
+    def check_blacklist(self):
+        if settings.TOKEN_BLACKLIST_FILTER and not blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            return
+        super().check_blacklist()
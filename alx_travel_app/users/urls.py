@@ -1,12 +1,25 @@
+from django.conf import settings
 from django.urls import path, include
-from .views import RegisterUserView, LoginUserView, UpdateUserView, LogoutUserView, DeleteUserView
+from .views import (
+    AsyncLoginUserView, AsyncRegisterUserView, RegisterUserView, LoginUserView, UpdateUserView, LogoutUserView,
+    DeleteUserView,
+)
 from rest_framework_simplejwt.views import TokenRefreshView
 
-urlpatterns = [
-    path("register/", RegisterUserView.as_view(), name="register"),
-    path("login/", LoginUserView.as_view(), name="login"),
-    path("logout/", LogoutUserView.as_view(), name="logout"),
-    path("update/", UpdateUserView.as_view(), name="update"),
-    path("delete/", DeleteUserView.as_view(), name="delete"),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-]
\ No newline at end of file
+
+def build_urlpatterns(async_views=False):
+    """
+    The auth routes. With `async_views`, registration and login are served by
+    their async variants.
+    """
+    return [
+        path("register/", (AsyncRegisterUserView if async_views else RegisterUserView).as_view(), name="register"),
+        path("login/", (AsyncLoginUserView if async_views else LoginUserView).as_view(), name="login"),
+        path("logout/", LogoutUserView.as_view(), name="logout"),
+        path("update/", UpdateUserView.as_view(), name="update"),
+        path("delete/", DeleteUserView.as_view(), name="delete"),
+        path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    ]
+
+
+urlpatterns = build_urlpatterns(settings.ASYNC_VIEWS)
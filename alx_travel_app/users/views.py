@@ -1,81 +1,155 @@
 from rest_framework import status, views
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from listings.analytics import batched_refresh
+from listings.async_views import AsyncAPIView, documented_like
+from .hashing import ahash_password, averify_password, hash_password, verify_password
+from .throttling import AuthIPThrottle, LoginAccountThrottle
 from .serializers import RegisterUserSerializer, UpdateUserSerializer, LoginUserSerializer, LogoutUserSerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RefreshToken
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
 User = get_user_model()  # Custom user model
 
+INVALID_CREDENTIALS = "Invalid email or password"
+
 # Handle user registration logic
 class RegisterUserView(views.APIView):
+    throttle_classes = [AuthIPThrottle]
+
     @swagger_auto_schema(
         operation_summary="Register a user",
         operation_description="Register a new user.",
         request_body=RegisterUserSerializer,
         responses={
             201: openapi.Response('User registered successfully'),
-            400: 'Validation error'
+            400: 'Validation error',
+            429: 'Too many attempts from this IP, retry after Retry-After seconds'
         }
     )
     def post(self, request):
         # Initialize the serializer with the provided request data
         serializer = RegisterUserSerializer(data=request.data)
-        
-        # Check if the data is valid according to the serializer's validation logic
+
+        # Check if the data is valid according to the serializer's validation logic (queries for a taken email)
         if serializer.is_valid():
-            # Save the new user to the database if the data is valid
-            serializer.save()
-            
-            # Return a success message with HTTP status 201 (Created)
-            return Response({"message": "User registered successfully"}, status=status.HTTP_201_CREATED)
+            # Hash the password in the hashing pool, then save the new user to the database
+            serializer.save(encoded_password=hash_password(serializer.validated_data['password']))
+            return self.registered_response()
         # If the serializer data is invalid, return the validation errors with HTTP status 400 (Bad Request)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def registered_response():
+        # Return a success message with HTTP status 201 (Created)
+        return Response({"message": "User registered successfully"}, status=status.HTTP_201_CREATED)
+
+class AsyncRegisterUserView(AsyncAPIView, RegisterUserView):
+    """
+    RegisterUserView for ASGI workers (ASYNC_VIEWS): the password is hashed
+    while the event loop serves other requests.
+    """
+
+    @documented_like(RegisterUserView.post)
+    async def post(self, request):
+        serializer = RegisterUserSerializer(data=request.data)
+
+        if await sync_to_async(serializer.is_valid)():
+            encoded_password = await ahash_password(serializer.validated_data['password'])
+            await sync_to_async(serializer.save)(encoded_password=encoded_password)
+            return self.registered_response()
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 # Handle user login logic
 class LoginUserView(views.APIView):
+    # Checked before the user is looked up or any password is hashed
+    throttle_classes = [AuthIPThrottle, LoginAccountThrottle]
+
     @swagger_auto_schema(
         operation_summary="User Login",
-        operation_description="Login a user and get JWT tokens.",
+        operation_description="Login a user and get JWT tokens. Attempts are limited per IP and per account.",
         request_body=LoginUserSerializer,
         responses={
             200: openapi.Response('JWT token returned'),
-            400: 'Invalid email or password'
+            400: 'Invalid email or password',
+            429: 'Too many attempts, retry after Retry-After seconds'
         }
     )
     def post(self, request):
+        credentials = self.credentials(request)
+        if credentials is None:
+            return self.invalid_credentials_response()
+        user_email, user_password = credentials
+
+        # Attempt to authenticate the user. Unknown emails still cost one hash and get the
+        # same answer as wrong passwords, so neither timing nor wording reveals accounts.
+        user = User.objects.filter(email=user_email).first()
+        is_correct, must_update = verify_password(user_password, user.password if user else None)
+        if user is None or not is_correct or not user.is_active:
+            return self.invalid_credentials_response()
+
+        if must_update:
+            # Stored with an outdated hasher or iteration count
+            user.password = hash_password(user_password)
+            user.save(update_fields=['password'])
+        LoginAccountThrottle().reset(user_email)
+
+        # Create JWT token
+        return self.token_response(user, RefreshToken.for_user(user))
+
+    @staticmethod
+    def credentials(request):
         # Initialize the login serializer with the provided request data
         serializer = LoginUserSerializer(data=request.data)
 
         # Check for data validation
         if not serializer.is_valid():
-            return Response({"error": "Invalid email or password"}, status=status.HTTP_400_BAD_REQUEST)
-    
-        user_email = serializer.validated_data['email']
-        user_password = serializer.validated_data['password']
-    
-        # Attempt to authenticate the user
-        try:
-            user = User.objects.get(email=user_email)
-            user_data = {
-                "email": user.email,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "role": user.role,
-            }
-
-            if user.check_password(user_password):
-                # Create JWT token
-                refresh = RefreshToken.for_user(user)
-                access_token = refresh.access_token
-                # Return the tokens
-                return Response({'user_data':user_data,'access': str(access_token),'refresh': str(refresh)})
-            return Response({"error": "Invalid password!"}, status=status.HTTP_400_BAD_REQUEST)
-
-        except User.DoesNotExist:
-            return Response({"error": "Invalid email!"}, status=status.HTTP_400_BAD_REQUEST)
+            return None
+        return serializer.validated_data['email'], serializer.validated_data['password']
+
+    @staticmethod
+    def invalid_credentials_response():
+        return Response({"error": INVALID_CREDENTIALS}, status=status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    def token_response(user, refresh):
+        user_data = {
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "role": user.role,
+        }
+        # Return the tokens
+        return Response({'user_data': user_data, 'access': str(refresh.access_token), 'refresh': str(refresh)})
+
+class AsyncLoginUserView(AsyncAPIView, LoginUserView):
+    """
+    LoginUserView for ASGI workers (ASYNC_VIEWS): the password check waits on
+    the event loop and the queries use the async ORM.
+    """
+
+    @documented_like(LoginUserView.post)
+    async def post(self, request):
+        credentials = self.credentials(request)
+        if credentials is None:
+            return self.invalid_credentials_response()
+        user_email, user_password = credentials
+
+        user = await User.objects.filter(email=user_email).afirst()
+        is_correct, must_update = await averify_password(user_password, user.password if user else None)
+        if user is None or not is_correct or not user.is_active:
+            return self.invalid_credentials_response()
+
+        if must_update:
+            user.password = await ahash_password(user_password)
+            await user.asave(update_fields=['password'])
+        await LoginAccountThrottle().areset(user_email)
+
+        return self.token_response(user, await sync_to_async(RefreshToken.for_user)(user))
 
 # Handle user update logic
 class UpdateUserView(views.APIView):
@@ -138,5 +212,7 @@ class DeleteUserView(views.APIView):
     )
     def delete(self, request):
         instance = request.user
-        instance.delete()  # Delete the user
+        # Cascades to the user's listings, bookings and payments
+        with transaction.atomic(), batched_refresh():
+            instance.delete()  # Delete the user
         return Response({"message": "User has been deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file